@@ -18,19 +18,52 @@ PORT = 3306                           # Default MySQL/MariaDB port
 
 # Application Settings
 SCRIPT_VERSION = "2.1.1"
-BATCH_SIZE = 1000                     # Number of rows per batch
+BATCH_SIZE = 1000                     # Number of rows per batch (initial size when adaptive)
+ADAPTIVE_BATCH_SIZE = True            # Auto-tune batch size per table (max_allowed_packet + commit latency)
+MIN_BATCH_SIZE = 50                   # Lower bound for adaptive batch size
+MAX_BATCH_SIZE = 20000                # Upper bound for adaptive batch size
+BATCH_TARGET_SECONDS = 2.0            # Batches slower than this halve the batch size
 MAX_WORKERS = 4                       # Maximum parallel processing threads
+DB_CONNECTION_BUDGET = 4              # Maximum concurrent database connections (shared by all jobs)
+QUERY_CHUNK_ROWS = 10000              # Rows per chunk when streaming query results (server-side cursor)
+LOAD_MODE = "upsert"                  # "upsert" (ON DUPLICATE KEY UPDATE) or "snapshot" (staging table + RENAME swap)
+AUTO_CREATE_TABLES = True             # Create missing tables/columns from the command registry (core/commands.py)
 
-# File Processing Settings
-SUPPORTED_FILE_TYPES = [
-    'LST CELL_*.txt',
-    'LST PDSCHCFG_*.txt',
-    'LST CELLDLPCPDSCHPA_*.txt',
-    'LST SECTORSPLITCELL_*.txt',
-    'LST SECTORSPLITGROUP_*.txt',
-    'DSP VSWR_*.txt',
-    'DSP RETSUBUNIT_*.txt'
-]
+# File Processing Settings (supported commands and file patterns live in core/commands.py)
+ENCODING_SAMPLE_BYTES = 65536         # Bytes sampled per file to detect its encoding
+READ_CHUNK_BYTES = 4 * 1024 * 1024    # Bytes read per chunk while parsing
+PARSE_CHUNK_ROWS = 50000              # Rows per parsed DataFrame chunk
+PARSE_CACHE_ENABLED = True            # Reuse parse output of unchanged files (keyed by content hash + parser version + spec)
+PARSE_CACHE_DIR = "parse_cache"       # Folder of the shared on-disk parse cache
+PARSE_CACHE_MAX_MB = 2048             # Least recently used entries are evicted beyond this size
+VALIDATION_ENABLED = True             # Reject rows with missing keys, empty NE, out-of-range IDs/VSWR or bad enum values
+VSWR_VALID_RANGE = (1.0, 10.0)        # Accepted VSWR values (inclusive)
+DEDUP_ENABLED = True                  # Keep only the newest row per primary key across files
+DEDUP_MAX_KEYS = 2000000              # Spill the de-dup key index to disk beyond this many keys
+RET_CHANGE_TRACKING = True            # Write only changed DSP RETSUBUNIT rows, logging old/new values to ret_change_log
+RET_STATE_PATH = "ret_state.sqlite3"  # Last known RET subunit states (change tracking index)
+VSWR_HISTORY_ENABLED = True           # Append DSP VSWR to date-partitioned vswr_history (+ daily rollups) instead of upserting
+
+# Memory Management
+MEMORY_BUDGET_MB = 4096               # Process-wide RAM for de-dup and enrichment (all workers); excess spills to disk
+SPILL_DIR = None                      # Folder for spill files (None = system temp folder)
+JOIN_PARTITIONS = 16                  # Enrichment joins run one NE-hash partition at a time
+ENRICHMENT_ENABLED = True             # Build lst_cell_enriched from LST CELL + auxiliary LST tables
+
+# Offline Export (python main.py --export FORMAT --source FOLDER)
+EXPORT_DIR = "exports"                # Default output location for parquet/csv/sqlite exports
+
+# Daemon Mode (python main.py --watch FOLDER [FOLDER ...])
+WATCH_QUEUE_PATH = "watch_queue.sqlite3"  # Persistent work queue of files to upload
+WATCH_POLL_INTERVAL = 5.0             # Seconds between scans when inotify is unavailable
+WATCH_SETTLE_SECONDS = 10.0           # File must be unchanged this long before upload
+
+# Job Server (python main.py --serve; GUI copies submit to JOB_SERVER_URL when set)
+JOB_SERVER_HOST = "127.0.0.1"         # Listen address (keep local unless behind a trusted network)
+JOB_SERVER_PORT = 8765
+JOB_SERVER_URL = None                 # e.g. "http://127.0.0.1:8765" to send GUI/CLI uploads to a shared server
+JOB_PROGRESS_INTERVAL = 1.0           # Seconds between streamed progress updates
+JOB_RETENTION_SECONDS = 3600          # Finished jobs (progress, error summary) are forgotten after this long
 
 # GUI Settings
 WINDOW_WIDTH = 1000
@@ -47,9 +80,14 @@ LOG_LEVEL = "INFO"
 LOG_FORMAT = "[{timestamp}] [{level}] {message}"
 
 # Error Handling
-MAX_RETRY_ATTEMPTS = 3
+MAX_RETRY_ATTEMPTS = 3                # Retries for deadlocks, lock wait timeouts and lost connections
+RETRY_BASE_DELAY = 0.5                # Seconds; backoff doubles per retry (with full jitter)
+RETRY_MAX_DELAY = 8.0                 # Upper bound for a single backoff delay
 ERROR_LOG_ENABLED = True
 SITE_ID_REPORTING = True
+ERROR_SAMPLE_ROWS = 3                 # Sample rows kept per SITE_ID / NE / error class
+ERROR_INDEX_MAX_KEYS = 10000          # Spill the error index to disk beyond this many keys
+ERROR_REPORT_DIR = "error_reports"    # Folder for the end-of-run error summary CSV
 
 # =============================================================================
 # Security Notes:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adaptive Batch Sizing for MML to DB Uploader
+Tunes the number of rows per batch for each table
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import time
+from typing import Optional, List, Tuple, Any
+
+# Import configuration
+try:
+    from config import BATCH_SIZE, MIN_BATCH_SIZE, MAX_BATCH_SIZE, BATCH_TARGET_SECONDS
+except ImportError:
+    BATCH_SIZE = 1000
+    MIN_BATCH_SIZE = 50
+    MAX_BATCH_SIZE = 20000
+    BATCH_TARGET_SECONDS = 2.0
+
+# Fraction of max_allowed_packet a single batch may use
+PACKET_SAFETY_FACTOR = 0.8
+
+# Rows sampled to estimate the encoded row size
+ROW_SAMPLE_SIZE = 100
+
+
+class AdaptiveBatchSizer:
+    """
+    AIMD (additive increase, multiplicative decrease) batch size controller
+
+    The batch size grows by a fixed step while batches commit faster than the
+    target latency and is halved when a batch is slow or fails. It never
+    exceeds the number of rows that fit in max_allowed_packet.
+    """
+
+    def __init__(self, max_allowed_packet: Optional[int] = None,
+                 initial_size: int = BATCH_SIZE,
+                 min_size: int = MIN_BATCH_SIZE,
+                 max_size: int = MAX_BATCH_SIZE,
+                 target_seconds: float = BATCH_TARGET_SECONDS):
+        self.max_allowed_packet = max_allowed_packet
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.target_seconds = target_seconds
+        self.increase_step = max(1, initial_size // 10)
+        self.row_size = None
+        self.packet_limit = self.max_size
+        self.batch_size = self._clamp(initial_size)
+
+        # Statistics
+        self.batches = 0
+        self.failures = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.best_throughput = 0.0
+
+    def calibrate(self, query: str, data: List[Tuple]):
+        """
+        Estimate the encoded row size and derive the packet row limit
+
+        Args:
+            query: SQL query template the rows will be sent with
+            data: Rows to be uploaded (a sample is inspected)
+        """
+        if not data:
+            return
+        sample = data[:ROW_SAMPLE_SIZE]
+        self.row_size = max(1, sum(self.estimate_row_size(row) for row in sample) // len(sample))
+
+        if self.max_allowed_packet:
+            budget = self.max_allowed_packet * PACKET_SAFETY_FACTOR - len(query)
+            self.packet_limit = max(self.min_size, int(budget // self.row_size))
+        self.batch_size = self._clamp(self.batch_size)
+
+    @staticmethod
+    def estimate_row_size(row: Tuple[Any, ...]) -> int:
+        """
+        Estimate the size of a row once encoded as a VALUES tuple
+
+        Args:
+            row: Data tuple
+
+        Returns:
+            int: Approximate encoded size in bytes
+        """
+        size = 2  # parentheses
+        for value in row:
+            if value is None:
+                size += 5  # NULL,
+            elif isinstance(value, (bytes, bytearray)):
+                size += 2 * len(value) + 4  # hex literal
+            else:
+                size += len(str(value).encode('utf-8')) + 3  # quotes and comma
+        return size
+
+    def record_success(self, rows: int, seconds: float):
+        """
+        Feed back a committed batch
+
+        Args:
+            rows: Rows in the batch
+            seconds: Measured execution/commit latency
+        """
+        self.batches += 1
+        self.rows += rows
+        self.seconds += seconds
+        if seconds > 0:
+            self.best_throughput = max(self.best_throughput, rows / seconds)
+
+        if seconds > self.target_seconds:
+            self.batch_size = self._clamp(self.batch_size // 2)
+        elif rows >= self.batch_size:
+            self.batch_size = self._clamp(self.batch_size + self.increase_step)
+
+    def record_failure(self) -> bool:
+        """
+        Feed back a failed batch
+
+        Returns:
+            bool: True if the batch size could be reduced and a retry is useful
+        """
+        self.failures += 1
+        previous = self.batch_size
+        self.batch_size = self._clamp(self.batch_size // 2)
+        return self.batch_size < previous
+
+    def get_stats(self) -> dict:
+        """
+        Get controller statistics
+
+        Returns:
+            Dict containing current size and throughput figures
+        """
+        return {
+            'batch_size': self.batch_size,
+            'packet_limit': self.packet_limit,
+            'row_size': self.row_size,
+            'batches': self.batches,
+            'failures': self.failures,
+            'rows': self.rows,
+            'rows_per_second': self.rows / self.seconds if self.seconds else 0.0,
+            'best_rows_per_second': self.best_throughput
+        }
+
+    def _clamp(self, size: int) -> int:
+        """Keep the batch size within configured and packet limits"""
+        upper = min(self.max_size, self.packet_limit)
+        return max(self.min_size, min(int(size), upper))
+
+
+def timed(func, *args) -> Tuple[Any, float]:
+    """
+    Call a function and measure its wall-clock duration
+
+    Returns:
+        Tuple of (result, seconds)
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Command Registry for MML to DB Uploader
+Declarative specs of the supported MML commands
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import re
+import json
+import hashlib
+import fnmatch
+from typing import Optional, Dict, List, Tuple, Set, Iterable
+
+import pandas as pd
+
+# Columns added to every row from the report header
+NE_COLUMN = 'NE'
+EXPORT_TIME_COLUMN = 'ExportTime'
+
+# Logical column types: (pandas dtype of parsed chunks, SQL type of created tables)
+# Types without a pandas dtype stay as parsed strings
+COLUMN_TYPE_MAP: Dict[str, Tuple[Optional[str], str]] = {
+    'int': ('Int64', 'BIGINT'),
+    'float': ('float64', 'DOUBLE'),
+    'str': (None, 'VARCHAR(64)'),
+    'text': (None, 'TEXT'),
+    'datetime': (None, 'DATETIME'),
+}
+DEFAULT_COLUMN_TYPE = 'text'
+
+# Types of columns shared by several commands (join keys must agree on both sides)
+COLUMN_TYPES: Dict[str, str] = {
+    NE_COLUMN: 'str',
+    EXPORT_TIME_COLUMN: 'datetime',
+    'LocalCellId': 'int',
+    'CellId': 'int',
+    'SectorSplitGroupId': 'int',
+    'CabinetNo': 'int',
+    'SubrackNo': 'int',
+    'SlotNo': 'int',
+    'TxBranchNo': 'int',
+    'DeviceNo': 'int',
+    'SubunitNo': 'int',
+}
+
+JOIN_ROLES = (None, 'base', 'aux')
+LOAD_MODES = ('upsert', 'history', 'changes')
+
+
+def table_name_for(command: str) -> str:
+    """
+    Get the database table name of an MML command
+
+    Args:
+        command: Command name such as 'LST CELL'
+
+    Returns:
+        str: Table name such as 'lst_cell'
+    """
+    return re.sub(r'[^0-9a-z]+', '_', command.lower()).strip('_')
+
+
+def _to_int(values: pd.Series) -> pd.Series:
+    """Convert parsed strings to nullable integers (non-integers become missing)"""
+    numbers = pd.to_numeric(values, errors='coerce')
+    if numbers.dtype.kind == 'f':
+        numbers = numbers.where(numbers % 1 == 0)
+    return numbers.astype('Int64')
+
+
+def _to_float(values: pd.Series) -> pd.Series:
+    """Convert parsed strings to floats (non-numbers become NaN)"""
+    return pd.to_numeric(values, errors='coerce').astype('float64')
+
+
+CONVERTERS = {'int': _to_int, 'float': _to_float}
+
+
+class CommandSpec:
+    """
+    Declaration of one supported MML command
+
+    Everything command-specific is derived from the spec: the file pattern
+    used by detection, the dtypes the parser casts chunks to (so they spill
+    and cache as native columns), the table and primary key used for
+    schema creation, de-duplication and upserts, the role of the command in
+    cell enrichment, its load mode and its validation rules.
+    """
+
+    def __init__(self, command: str, primary_key: List[str],
+                 columns: Optional[Dict[str, str]] = None,
+                 pattern: Optional[str] = None,
+                 table: Optional[str] = None,
+                 join_role: Optional[str] = None,
+                 join_keys: Optional[List[str]] = None,
+                 load_mode: str = 'upsert',
+                 enums: Optional[Dict[str, Set[str]]] = None,
+                 ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+                 description: str = ''):
+        """
+        Args:
+            command: MML command name such as 'LST CELL'
+            primary_key: Primary key columns (after normalize_column)
+            columns: Logical types of command-specific columns (see COLUMN_TYPE_MAP);
+                     shared columns default to COLUMN_TYPES, others to 'text'
+            pattern: File pattern (defaults to '<command>_*.txt')
+            table: Target table (defaults to table_name_for(command))
+            join_role: 'base' (the enriched table) or 'aux' (joined onto it)
+            join_keys: Join keys of an 'aux' command (defaults to primary_key)
+            load_mode: 'upsert', 'history' (append-only) or 'changes' (changed rows only)
+            enums: Allowed values per column, checked by validation
+            ranges: Inclusive integer ID range per column, checked by validation
+            description: Short description shown in the GUI and docs
+        """
+        if join_role not in JOIN_ROLES:
+            raise ValueError(f"Unknown join role for {command}: {join_role}")
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode for {command}: {load_mode}")
+        columns = dict(columns or {})
+        unknown = sorted({kind for kind in columns.values() if kind not in COLUMN_TYPE_MAP})
+        if unknown:
+            raise ValueError(f"Unknown column types for {command}: {', '.join(unknown)}")
+        self.command = command
+        self.primary_key = list(primary_key)
+        self.columns = columns
+        self.pattern = pattern or f"{command}_*.txt"
+        self.table = table or table_name_for(command)
+        self.join_role = join_role
+        self.join_keys = list(join_keys or primary_key)
+        self.load_mode = load_mode
+        self.enums = dict(enums or {})
+        self.ranges = dict(ranges or {})
+        self.description = description
+
+    def __repr__(self) -> str:
+        return f"CommandSpec({self.command!r})"
+
+    def matches(self, name: str) -> bool:
+        """Check whether a file name (or path) belongs to this command"""
+        return fnmatch.fnmatch(os.path.basename(name), self.pattern)
+
+    def column_type(self, column: str) -> str:
+        """Get the logical type of a column"""
+        return self.columns.get(column) or COLUMN_TYPES.get(column, DEFAULT_COLUMN_TYPE)
+
+    def apply_types(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Cast parsed string columns to their declared dtypes
+
+        Args:
+            frame: Parsed chunk (string columns)
+
+        Returns:
+            pd.DataFrame: Chunk with numeric columns converted
+        """
+        converted = {}
+        for column in frame.columns:
+            kind = self.column_type(column)
+            dtype = COLUMN_TYPE_MAP[kind][0]
+            if dtype is not None and str(frame[column].dtype) != dtype:
+                converted[column] = CONVERTERS[kind](frame[column])
+        if not converted:
+            return frame
+        return frame.assign(**converted)
+
+    def fingerprint(self) -> str:
+        """
+        Digest of everything that shapes this command's parsed chunks
+
+        Covers the declared and shared column types and the key columns, so
+        caches of parse output are invalidated when the spec changes.
+
+        Returns:
+            str: Short hex digest
+        """
+        shape = {
+            'command': self.command,
+            'primary_key': self.primary_key,
+            'columns': self.columns,
+            'shared_columns': COLUMN_TYPES,
+            'dtypes': {kind: dtype for kind, (dtype, _) in COLUMN_TYPE_MAP.items()},
+        }
+        return hashlib.sha256(json.dumps(shape, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    def sql_types(self, columns: Iterable[str]) -> Dict[str, str]:
+        """
+        Get the SQL column types of a table holding the given columns
+
+        Args:
+            columns: Column names
+
+        Returns:
+            Dict mapping column name to SQL type (TEXT keys become VARCHAR)
+        """
+        types = {}
+        for column in columns:
+            kind = self.column_type(column)
+            if kind == 'text' and column in self.primary_key:
+                kind = 'str'
+            types[column] = COLUMN_TYPE_MAP[kind][1]
+        return types
+
+
+_REGISTRY: Dict[str, CommandSpec] = {}
+
+
+def register(spec: CommandSpec) -> CommandSpec:
+    """
+    Add a command to the registry
+
+    Args:
+        spec: Command spec
+
+    Returns:
+        CommandSpec: The registered spec
+    """
+    if spec.command in _REGISTRY:
+        raise ValueError(f"Command already registered: {spec.command}")
+    if spec.join_role == 'base' and base_spec() is not None:
+        raise ValueError(f"Only one base command can be registered, not {spec.command}")
+    _REGISTRY[spec.command] = spec
+    return spec
+
+
+def get_spec(command: str) -> Optional[CommandSpec]:
+    """Get the spec of a command, or None if it is not registered"""
+    return _REGISTRY.get(command)
+
+
+def iter_specs() -> List[CommandSpec]:
+    """Get all registered specs in registration order"""
+    return list(_REGISTRY.values())
+
+
+def supported_file_types() -> List[str]:
+    """Get the file patterns of all registered commands (generated SUPPORTED_FILE_TYPES)"""
+    return [spec.pattern for spec in _REGISTRY.values()]
+
+
+def spec_for_file(name: str) -> Optional[CommandSpec]:
+    """
+    Get the spec of a file name
+
+    Args:
+        name: File name (or path)
+
+    Returns:
+        CommandSpec: Matching spec, or None if the file is not a supported type
+    """
+    return next((spec for spec in _REGISTRY.values() if spec.matches(name)), None)
+
+
+def spec_for_table(table_name: str) -> Optional[CommandSpec]:
+    """Get the spec whose target table is table_name"""
+    return next((spec for spec in _REGISTRY.values() if spec.table == table_name), None)
+
+
+def base_spec() -> Optional[CommandSpec]:
+    """Get the spec of the command other tables are joined onto"""
+    return next((spec for spec in _REGISTRY.values() if spec.join_role == 'base'), None)
+
+
+def enrichment_joins() -> List[Tuple[str, List[str]]]:
+    """Get the auxiliary commands joined onto the base command, in join order, with their keys"""
+    return [(spec.command, spec.join_keys) for spec in _REGISTRY.values() if spec.join_role == 'aux']
+
+
+# Cell ID ranges, checked wherever an LST command carries the column
+CELL_ID_RANGES: Dict[str, Tuple[float, float]] = {
+    'LocalCellId': (0, 255),
+    'CellId': (0, 255),
+}
+
+# Built-in commands
+register(CommandSpec('LST CELL', [NE_COLUMN, 'LocalCellId'], join_role='base',
+                     enums={'CellActiveState': {'Active', 'Inactive'},
+                            'CellFddTddIndication': {'CELL_FDD', 'CELL_TDD'}},
+                     ranges=CELL_ID_RANGES,
+                     description='Primary cell configuration data'))
+register(CommandSpec('LST PDSCHCFG', [NE_COLUMN, 'LocalCellId'], join_role='aux',
+                     ranges=CELL_ID_RANGES, description='PDSCH configuration data'))
+register(CommandSpec('LST CELLDLPCPDSCHPA', [NE_COLUMN, 'LocalCellId'], join_role='aux',
+                     ranges=CELL_ID_RANGES, description='Cell DLPC PDSCH PA data'))
+register(CommandSpec('LST SECTORSPLITCELL', [NE_COLUMN, 'LocalCellId'], join_role='aux',
+                     ranges=CELL_ID_RANGES, description='Sector split cell configuration'))
+register(CommandSpec('LST SECTORSPLITGROUP', [NE_COLUMN, 'SectorSplitGroupId'], join_role='aux',
+                     ranges=CELL_ID_RANGES, description='Sector split group settings'))
+register(CommandSpec('DSP VSWR', [NE_COLUMN, 'CabinetNo', 'SubrackNo', 'SlotNo', 'TxBranchNo'],
+                     columns={'Vswr': 'float'}, load_mode='history',
+                     description='VSWR measurement data'))
+register(CommandSpec('DSP RETSUBUNIT', [NE_COLUMN, 'DeviceNo', 'SubunitNo'], load_mode='changes',
+                     description='RET subunit information'))
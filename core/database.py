@@ -10,16 +10,38 @@ Version: 2.1.1
 
 import os
 import sys
-from typing import Optional, Dict, Any, List, Tuple
+import time
+import queue
+import random
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Set, Iterator
 import logging
 
+import numpy as np
+
 # Import configuration
 try:
-    from config import DB_NAME, HOST, USER, PASSWORD, PORT
+    from config import DB_NAME, HOST, USER, PASSWORD, PORT, BATCH_SIZE, LOAD_MODE, ADAPTIVE_BATCH_SIZE
+    from config import MAX_RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, DB_CONNECTION_BUDGET
+    from config import QUERY_CHUNK_ROWS
 except ImportError:
     print("Error: config.py not found")
     sys.exit(1)
 
+from core.batching import AdaptiveBatchSizer, timed
+from core.commands import EXPORT_TIME_COLUMN
+
+# MySQL/MariaDB error codes worth retrying; everything else fails fast
+TRANSIENT_ERROR_CODES = {
+    1205: "lock wait timeout",
+    1213: "deadlock",
+    1040: "too many connections",
+    2003: "can't connect to server",
+    2006: "server has gone away",
+    2013: "lost connection during query",
+}
+
 class DatabaseManager:
     """
     Manages database connections and operations
@@ -29,6 +51,18 @@ class DatabaseManager:
         self.connection = None
         self.engine = None
         self.is_connected = False
+        self.max_allowed_packet = None
+        self.batch_sizers: Dict[str, AdaptiveBatchSizer] = {}
+        self.table_columns: Dict[str, Set[str]] = {}
+        self.in_bulk_session = False
+        self.last_error: Optional[Exception] = None
+        self.metrics: Dict[str, Any] = {
+            'retries': 0,
+            'retries_by_code': {},
+            'retries_exhausted': 0,
+            'transient_errors': 0,
+            'permanent_errors': 0
+        }
         
         # Configure logging
         logging.basicConfig(level=logging.INFO)
@@ -98,21 +132,112 @@ class DatabaseManager:
             List of tuples containing query results, or None if failed
         """
         try:
-            # This is a placeholder implementation
-            # In production, implement actual query execution
-            
-            if not self.is_connected:
-                self.logger.error("No database connection")
-                return None
-                
-            self.logger.info(f"Executing query: {query[:100]}...")
+            return self._run_with_retry(self._execute_query_once, query, params)
+        except Exception as e:
+            self.logger.error(f"Query execution failed: {e}")
+            return None
+    
+    def _execute_query_once(self, query: str, params: Optional[Dict] = None) -> Optional[List[Tuple]]:
+        """Single query attempt; database errors propagate to the retry layer"""
+        # This is a placeholder implementation
+        # In production, implement actual query execution
+        
+        if not self.is_connected:
+            self.logger.error("No database connection")
+            return None
             
-            # For demonstration purposes, return empty result
-            return []
+        self.logger.info(f"Executing query: {query[:100]}...")
+        
+        # For demonstration purposes, return empty result
+        return []
+    
+    def iter_query(self, query: str, params: Optional[Dict] = None,
+                   chunk_size: Optional[int] = None, as_arrays: bool = False,
+                   dtypes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Stream a query result through an unbuffered server-side cursor
+        
+        Rows are fetched from the server as they are consumed, so memory use
+        stays constant and the first rows arrive before the query finishes.
+        The connection is busy until the iterator is exhausted or closed;
+        use a separate connection for writes made while reading. Only
+        opening the stream is retried: a result cannot be replayed midway.
+        
+        Unlike execute_query(), failures are not swallowed: a query that
+        still fails after retries, or a stream that breaks while rows are
+        being fetched, raises RuntimeError (chained to the driver error), so
+        a caller never mistakes a failed read for a short or empty result.
+        
+        Args:
+            query: SQL query to execute
+            params: Query parameters
+            chunk_size: Yield lists of this many rows instead of single rows
+            as_arrays: Yield each chunk as a dict of column name -> numpy array
+            dtypes: numpy dtype per column for as_arrays (others stay object;
+                    use float for nullable numeric columns)
+        
+        Yields:
+            Row tuples, lists of row tuples, or column array dicts
             
+        Raises:
+            RuntimeError: If the query fails or the stream breaks midway
+        """
+        if as_arrays:
+            chunk_size = chunk_size or QUERY_CHUNK_ROWS
+        try:
+            cursor = self._run_with_retry(self._open_stream, query, params)
         except Exception as e:
-            self.logger.error(f"Query execution failed: {e}")
+            self.logger.error(f"Streaming query failed: {e}")
+            raise RuntimeError(f"Streaming query failed: {e}") from e
+        if cursor is None:
+            return
+        try:
+            names = [description[0] for description in cursor.description or ()]
+            if not chunk_size:
+                yield from cursor.fetchall_unbuffered()
+                return
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if not as_arrays:
+                    yield rows
+                    continue
+                dtypes = dtypes or {}
+                yield {name: np.asarray(values, dtype=dtypes.get(name, object))
+                       for name, values in zip(names, zip(*rows))}
+        except Exception as e:
+            # Only fetching can raise here (closing the iterator raises GeneratorExit)
+            self.logger.error(f"Streaming query broke off: {e}")
+            raise RuntimeError(f"Streaming query broke off: {e}") from e
+        finally:
+            # Closing an unbuffered cursor drains any unread rows
+            try:
+                cursor.close()
+            except Exception as e:
+                self.logger.warning(f"Closing streaming cursor failed: {e}")
+    
+    def _open_stream(self, query: str, params: Optional[Dict] = None):
+        """Execute a query on a server-side cursor; database errors propagate to the retry layer"""
+        if not self.is_connected:
+            self.logger.error("No database connection")
+            return None
+        
+        self.logger.info(f"Streaming query: {query[:100]}...")
+        
+        # This is a placeholder implementation: without a real connection
+        # there is nothing to stream
+        if self.connection is None:
             return None
+        
+        import pymysql.cursors
+        cursor = self.connection.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(query, params)
+        except Exception:
+            cursor.close()
+            raise
+        return cursor
     
     def execute_batch(self, query: str, data: List[Tuple]) -> bool:
         """
@@ -126,21 +251,681 @@ class DatabaseManager:
             bool: True if batch execution successful
         """
         try:
-            # This is a placeholder implementation
-            # In production, implement actual batch execution
+            return self._run_with_retry(self._execute_batch_once, query, data)
+        except Exception as e:
+            self.last_error = e
+            self.logger.error(f"Batch execution failed: {e}")
+            return False
+    
+    def _execute_batch_once(self, query: str, data: List[Tuple]) -> bool:
+        """Single batch attempt; database errors propagate to the retry layer"""
+        # This is a placeholder implementation
+        # In production, implement actual batch execution
+        
+        if not self.is_connected:
+            self.logger.error("No database connection")
+            return False
             
-            if not self.is_connected:
-                self.logger.error("No database connection")
-                return False
+        self.logger.info(f"Executing batch operation with {len(data)} rows")
+        
+        # For demonstration purposes, simulate successful execution
+        return True
+    
+    def _run_with_retry(self, operation, *args):
+        """
+        Run a database operation, retrying transient MySQL errors
+        
+        Deadlocks, lock wait timeouts and lost connections are retried up to
+        MAX_RETRY_ATTEMPTS times with jittered exponential backoff, each time
+        on a fresh connection. Permanent errors (syntax, data, constraint)
+        are raised immediately. Inside a bulk session the open transaction
+        cannot be replayed, so nothing is retried there.
+        
+        Args:
+            operation: Callable performing a single attempt
+            *args: Arguments for the operation
+            
+        Returns:
+            The operation's result
+        """
+        attempt = 0
+        while True:
+            try:
+                return operation(*args)
+            except Exception as e:
+                code = self.get_error_code(e)
+                transient = code in TRANSIENT_ERROR_CODES
+                self.metrics['transient_errors' if transient else 'permanent_errors'] += 1
+                
+                if not transient or self.in_bulk_session or attempt >= MAX_RETRY_ATTEMPTS:
+                    if transient:
+                        self.metrics['retries_exhausted'] += 1
+                    raise
                 
-            self.logger.info(f"Executing batch operation with {len(data)} rows")
+                attempt += 1
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+                self.metrics['retries'] += 1
+                self.metrics['retries_by_code'][code] = self.metrics['retries_by_code'].get(code, 0) + 1
+                self.logger.warning(f"Transient error {code} ({TRANSIENT_ERROR_CODES[code]}), "
+                                    f"retry {attempt}/{MAX_RETRY_ATTEMPTS} in {delay:.2f}s")
+                time.sleep(delay)
+                self._refresh_connection()
+    
+    def _refresh_connection(self):
+        """Replace the current connection with a fresh one before a retry"""
+        self.disconnect()
+        self.connect()
+    
+    @staticmethod
+    def get_error_code(error: Exception) -> Optional[int]:
+        """
+        Extract the MySQL error code from a driver exception
+        
+        Args:
+            error: Exception raised by the driver
             
-            # For demonstration purposes, simulate successful execution
+        Returns:
+            int: MySQL error code, or None if not a MySQL error
+        """
+        args = getattr(error, 'args', ())
+        if args and isinstance(args[0], int):
+            return args[0]
+        return None
+    
+    @classmethod
+    def is_data_error(cls, error: Optional[Exception]) -> bool:
+        """
+        Check whether an error was caused by the rows sent (and not by the server)
+        
+        Args:
+            error: Exception raised by the driver
+            
+        Returns:
+            bool: True for a permanent MySQL error, False for transient,
+                  connection or non-MySQL errors
+        """
+        code = cls.get_error_code(error) if error is not None else None
+        return code is not None and code not in TRANSIENT_ERROR_CODES
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get retry and error metrics
+        
+        Returns:
+            Dict containing retry counts and error classification totals
+        """
+        metrics = dict(self.metrics)
+        metrics['retries_by_code'] = dict(self.metrics['retries_by_code'])
+        return metrics
+    
+    def ensure_table(self, table_name: str, column_types: Dict[str, str],
+                     primary_key: List[str]) -> bool:
+        """
+        Create a table, or add the columns it is missing
+        
+        Column types and primary key come from the command registry. The
+        known columns of each table are cached, so only chunks bringing new
+        columns (e.g. after an NE software upgrade) cost a round trip.
+        Existing columns are never altered.
+        
+        Args:
+            table_name: Target table name
+            column_types: SQL type per column of the chunk to load
+            primary_key: Primary key columns
+            
+        Returns:
+            bool: True if the table has all the columns
+        """
+        known = self.table_columns.get(table_name)
+        if known is not None and all(column.lower() in known for column in column_types):
+            return True
+        
+        q = self._quote_identifier
+        if known is None:
+            definitions = [f"{q(column)} {sql_type}" + (" NOT NULL" if column in primary_key else "")
+                           for column, sql_type in column_types.items()]
+            keys = [column for column in primary_key if column in column_types]
+            if keys:
+                definitions.append(f"PRIMARY KEY ({', '.join(q(column) for column in keys)})")
+            if self.execute_query(f"CREATE TABLE IF NOT EXISTS {q(table_name)} "
+                                  f"({', '.join(definitions)})") is None:
+                return False
+            rows = self.execute_query(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %(table)s",
+                {'table': table_name})
+            if rows is None:
+                return False
+            known = {str(name).lower() for (name,) in rows}
+        
+        missing = [column for column in column_types if column.lower() not in known]
+        if missing:
+            # IF NOT EXISTS: another connection may add the same column concurrently
+            adds = ", ".join(f"ADD COLUMN IF NOT EXISTS {q(column)} {column_types[column]}"
+                             for column in missing)
+            if self.execute_query(f"ALTER TABLE {q(table_name)} {adds}") is None:
+                return False
+            self.logger.info(f"Added columns to {table_name}: {', '.join(missing)}")
+            known.update(column.lower() for column in missing)
+        self.table_columns[table_name] = known
+        return True
+    
+    def upload_table(self, table_name: str, columns: List[str], data: List[Tuple],
+                     mode: Optional[str] = None, error_index=None) -> bool:
+        """
+        Upload rows into a table using the configured load mode
+        
+        Args:
+            table_name: Target table name
+            columns: Column names, in the order used by the data tuples
+            data: List of data tuples
+            mode: 'upsert' (INSERT...ON DUPLICATE KEY UPDATE into the live table),
+                  'newest' (upsert that keeps stored rows with a newer ExportTime)
+                  or 'snapshot' (staging table + atomic RENAME swap).
+                  Defaults to LOAD_MODE from config.
+            error_index: Optional SiteErrorIndex collecting rows rejected
+                         by the row-by-row fallback
+            
+        Returns:
+            bool: True if all rows were loaded or reported as rejected
+        """
+        mode = (mode or LOAD_MODE).lower()
+        if mode == 'snapshot':
+            return self.load_snapshot(table_name, columns, data, error_index)
+        if mode not in ('upsert', 'newest'):
+            self.logger.error(f"Unknown load mode: {mode}")
+            return False
+        
+        query = self._build_insert_query(table_name, columns, upsert=True, keep_newest=mode == 'newest')
+        return self.execute_batches(query, data, table_name, columns, error_index)
+    
+    def execute_batches(self, query: str, data: List[Tuple], table_name: Optional[str] = None,
+                        columns: Optional[List[str]] = None, error_index=None) -> bool:
+        """
+        Execute a large row set as a sequence of batches
+        
+        With ADAPTIVE_BATCH_SIZE enabled, the batch size is tuned per table:
+        it is capped by max_allowed_packet and the estimated encoded row size,
+        grows while batches commit quickly and is halved on slow or failed
+        batches (a failed batch is retried with the smaller size).
+        
+        When an error_index is given, a batch that still fails with a
+        permanent data error (bad value, constraint) is replayed row by row
+        and the rejected rows are recorded in the index instead of aborting
+        the upload. A transient or connection error that outlived its
+        retries fails the upload at once: replaying every remaining row
+        against a lost server would stall for hours and report every row
+        as a site error.
+        
+        Inside a bulk session nothing is retried or replayed: a failed
+        statement (e.g. a deadlock) may have rolled back the whole open
+        transaction, so replaying the batch would silently lose every
+        earlier row. The first failed batch raises RuntimeError instead,
+        which makes bulk_session() roll back.
+        
+        Args:
+            query: SQL query template
+            data: List of data tuples
+            table_name: Table the rows are written to (keys the tuning state)
+            columns: Column names of the data tuples (used for error reporting)
+            error_index: Optional SiteErrorIndex collecting rejected rows
+            
+        Returns:
+            bool: True if every batch executed (or its rejects were recorded)
+        """
+        if not ADAPTIVE_BATCH_SIZE:
+            for start in range(0, len(data), BATCH_SIZE):
+                batch = data[start:start + BATCH_SIZE]
+                if not self.execute_batch(query, batch):
+                    self._check_bulk_session_batch(table_name, len(batch))
+                    if error_index is None or not self.is_data_error(self.last_error):
+                        return False
+                    if not self._execute_rows(query, batch, columns, error_index):
+                        return False
             return True
+        
+        sizer = self.get_batch_sizer(table_name or query)
+        sizer.calibrate(query, data)
+        
+        start = 0
+        while start < len(data):
+            batch = data[start:start + sizer.batch_size]
+            success, seconds = timed(self.execute_batch, query, batch)
+            if success:
+                sizer.record_success(len(batch), seconds)
+                start += len(batch)
+                continue
+            self._check_bulk_session_batch(table_name, len(batch))
+            if self.get_error_code(self.last_error) in TRANSIENT_ERROR_CODES:
+                self.logger.error(f"Batch for {table_name or 'query'} failed after retries: {self.last_error}")
+                return False
+            if not sizer.record_failure():
+                self.logger.error(f"Batch failed at minimum size {len(batch)} for {table_name or 'query'}")
+                if error_index is None or not self.is_data_error(self.last_error):
+                    return False
+                if not self._execute_rows(query, batch, columns, error_index):
+                    return False
+                start += len(batch)
+            else:
+                self.logger.warning(f"Batch of {len(batch)} rows failed, retrying with {sizer.batch_size}")
+        
+        if table_name:
+            stats = sizer.get_stats()
+            self.logger.info(f"{table_name}: batch size {stats['batch_size']}, "
+                             f"{stats['rows_per_second']:.0f} rows/s")
+        return True
+    
+    def _check_bulk_session_batch(self, table_name: Optional[str], rows: int):
+        """Fail a bulk session on its first failed batch (its transaction cannot be replayed)"""
+        if self.in_bulk_session:
+            raise RuntimeError(f"Batch of {rows} rows failed inside bulk session for "
+                               f"{table_name or 'query'}: {self.last_error}")
+    
+    def _execute_rows(self, query: str, data: List[Tuple], columns: Optional[List[str]],
+                      error_index) -> bool:
+        """
+        Row-by-row fallback for a batch that failed with a data error
+        
+        Args:
+            query: SQL query template
+            data: Rows of the failed batch
+            columns: Column names of the data tuples
+            error_index: SiteErrorIndex receiving the rejected rows
+            
+        Returns:
+            bool: False if a row failed with an error that is not about its data
+        """
+        rejected = 0
+        for row in data:
+            if self.execute_batch(query, [row]):
+                continue
+            if not self.is_data_error(self.last_error):
+                self.logger.error(f"Row-by-row fallback stopped: {self.last_error}")
+                return False
+            rejected += 1
+            error_index.add_row(columns or [], row, f"MySQL {self.get_error_code(self.last_error)}")
+        self.logger.warning(f"Row-by-row fallback: {rejected}/{len(data)} rows rejected")
+        return True
+    
+    def get_batch_sizer(self, key: str) -> AdaptiveBatchSizer:
+        """
+        Get (or create) the batch size controller for a table
+        
+        Args:
+            key: Table name
+            
+        Returns:
+            AdaptiveBatchSizer: Controller that persists across uploads
+        """
+        if key not in self.batch_sizers:
+            self.batch_sizers[key] = AdaptiveBatchSizer(self.get_max_allowed_packet())
+        return self.batch_sizers[key]
+    
+    def get_max_allowed_packet(self) -> Optional[int]:
+        """
+        Get the server's max_allowed_packet (cached)
+        
+        Returns:
+            int: Packet limit in bytes, or None if unknown
+        """
+        if self.max_allowed_packet is None:
+            result = self.execute_query("SELECT @@max_allowed_packet")
+            if result:
+                self.max_allowed_packet = int(result[0][0])
+        return self.max_allowed_packet
+    
+    def load_snapshot(self, table_name: str, columns: List[str], data: List[Tuple],
+                      error_index=None) -> bool:
+        """
+        Replace the full contents of a table with a new snapshot
+        
+        Convenience wrapper for a snapshot that fits in one row list; large
+        snapshots are streamed with begin_snapshot(), append_snapshot() and
+        finish_snapshot() instead.
+        
+        Args:
+            table_name: Live table to replace
+            columns: Column names, in the order used by the data tuples
+            data: List of data tuples forming the complete snapshot
+            error_index: Optional SiteErrorIndex collecting rejected rows
+            
+        Returns:
+            bool: True if the snapshot was loaded and swapped in
+        """
+        indexes = self.begin_snapshot(table_name)
+        if indexes is None:
+            return False
+        if not self.append_snapshot(table_name, columns, data, error_index):
+            self.abort_snapshot(table_name)
+            return False
+        return self.finish_snapshot(table_name, indexes)
+    
+    @staticmethod
+    def snapshot_staging_table(table_name: str) -> str:
+        """Name of the staging table a snapshot of table_name is loaded into"""
+        return f"{table_name}_staging"
+    
+    def begin_snapshot(self, table_name: str) -> Optional[Dict[str, str]]:
+        """
+        Start a snapshot load: create a fresh staging copy of the live table
+        
+        Rows are then bulk-loaded into `<table>_staging` without secondary
+        indexes by append_snapshot() (any number of chunks), the indexes are
+        built once by finish_snapshot() and the staging table is swapped with
+        the live table in a single atomic RENAME TABLE, so readers never see
+        a partially loaded table and the snapshot never has to fit in memory.
+        
+        Args:
+            table_name: Live table to replace
+            
+        Returns:
+            Dict of dropped secondary indexes (pass to finish_snapshot),
+            or None if the staging table could not be prepared
+        """
+        staging_table = self.snapshot_staging_table(table_name)
+        live = self._quote_identifier(table_name)
+        staging = self._quote_identifier(staging_table)
+        old = self._quote_identifier(f"{table_name}_old")
+        self.table_columns.pop(staging_table, None)
+        
+        try:
+            # Fresh staging copy with the live table's structure
+            for statement in (f"DROP TABLE IF EXISTS {staging}",
+                              f"DROP TABLE IF EXISTS {old}",
+                              f"CREATE TABLE {staging} LIKE {live}"):
+                if self.execute_query(statement) is None:
+                    raise RuntimeError(f"Failed to prepare staging table {staging_table}")
+            
+            # Drop secondary indexes so the bulk insert only maintains the primary key
+            indexes = self._get_secondary_indexes(staging_table)
+            if indexes:
+                drops = ", ".join(f"DROP INDEX {self._quote_identifier(name)}" for name in indexes)
+                if self.execute_query(f"ALTER TABLE {staging} {drops}") is None:
+                    raise RuntimeError(f"Failed to drop secondary indexes on {staging_table}")
+            
+            self.logger.info(f"Snapshot load into {table_name} started")
+            return indexes
             
         except Exception as e:
-            self.logger.error(f"Batch execution failed: {e}")
+            self.logger.error(f"Snapshot load failed: {e}")
+            self.abort_snapshot(table_name)
+            return None
+    
+    def append_snapshot(self, table_name: str, columns: List[str], data: List[Tuple],
+                        error_index=None) -> bool:
+        """
+        Load one chunk of a snapshot into the staging table
+        
+        Args:
+            table_name: Live table being replaced
+            columns: Column names, in the order used by the data tuples
+            data: Rows of the chunk
+            error_index: Optional SiteErrorIndex collecting rejected rows
+            
+        Returns:
+            bool: True if the chunk was loaded (or its rejects were recorded)
+        """
+        # Plain INSERT: the staging table starts empty, no upsert evaluation needed
+        query = self._build_insert_query(self.snapshot_staging_table(table_name), columns, upsert=False)
+        if not self.execute_batches(query, data, table_name, columns, error_index):
+            self.logger.error(f"Batch load into {self.snapshot_staging_table(table_name)} failed")
             return False
+        return True
+    
+    def finish_snapshot(self, table_name: str, indexes: Dict[str, str]) -> bool:
+        """
+        Rebuild secondary indexes on the staging table and swap it in
+        
+        Args:
+            table_name: Live table to replace
+            indexes: Result of begin_snapshot()
+            
+        Returns:
+            bool: True if the snapshot was swapped in
+        """
+        staging_table = self.snapshot_staging_table(table_name)
+        live = self._quote_identifier(table_name)
+        staging = self._quote_identifier(staging_table)
+        old = self._quote_identifier(f"{table_name}_old")
+        
+        try:
+            # Build all secondary indexes in a single pass
+            if indexes:
+                adds = ", ".join(indexes.values())
+                if self.execute_query(f"ALTER TABLE {staging} {adds}") is None:
+                    raise RuntimeError(f"Failed to rebuild secondary indexes on {staging_table}")
+            
+            # Atomic swap, then discard the previous snapshot
+            if self.execute_query(f"RENAME TABLE {live} TO {old}, {staging} TO {live}") is None:
+                raise RuntimeError(f"Failed to swap {staging_table} into {table_name}")
+            self.execute_query(f"DROP TABLE IF EXISTS {old}")
+            self.table_columns.pop(table_name, None)
+            self.table_columns.pop(staging_table, None)
+            
+            self.logger.info(f"Snapshot swapped into {table_name}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Snapshot load failed: {e}")
+            self.abort_snapshot(table_name)
+            return False
+    
+    def abort_snapshot(self, table_name: str):
+        """Drop the staging table of an unfinished snapshot (the live table is untouched)"""
+        staging_table = self.snapshot_staging_table(table_name)
+        self.table_columns.pop(staging_table, None)
+        self.execute_query(f"DROP TABLE IF EXISTS {self._quote_identifier(staging_table)}")
+    
+    @contextmanager
+    def bulk_session(self, tables: Optional[List[str]] = None) -> Iterator['DatabaseManager']:
+        """
+        Opt-in session tuning for large execute_batch runs
+        
+        Inside the block unique and foreign key checks are deferred, autocommit
+        is off so batches accumulate into one large transaction, and key
+        maintenance is disabled on MyISAM/Aria tables. On exit the constraints
+        of the given tables are verified before COMMIT; any violation (or an
+        exception/cancel inside the block) rolls the transaction back, as does
+        a failed SET SESSION or COMMIT, which raise RuntimeError. Session
+        settings and keys are always restored.
+        
+        Args:
+            tables: Tables that will be written inside the session
+            
+        Yields:
+            DatabaseManager: this manager
+        """
+        tables = tables or []
+        saved = self.execute_query("SELECT @@SESSION.unique_checks, @@SESSION.foreign_key_checks, "
+                                   "@@SESSION.autocommit")
+        unique_checks, foreign_key_checks, autocommit = saved[0] if saved else (1, 1, 1)
+        
+        keyed_tables = [table for table, engine in self._get_table_engines(tables).items()
+                        if engine.upper() in ('MYISAM', 'ARIA')]
+        committed = False
+        try:
+            if self.execute_query("SET SESSION unique_checks = 0, foreign_key_checks = 0, "
+                                  "autocommit = 0") is None:
+                # With autocommit still on, every batch would commit on its own
+                raise RuntimeError("Failed to start bulk session (SET SESSION failed)")
+            self.in_bulk_session = True
+            for table in keyed_tables:
+                self.execute_query(f"ALTER TABLE {self._quote_identifier(table)} DISABLE KEYS")
+            self.logger.info(f"Bulk session started for: {', '.join(tables) or 'all tables'}")
+            
+            yield self
+            
+            violations = self.verify_constraints(tables)
+            if violations:
+                raise RuntimeError("Constraint violations after bulk load: " + "; ".join(violations))
+            if self.execute_query("COMMIT") is None:
+                raise RuntimeError("Bulk session COMMIT failed")
+            committed = True
+            
+        finally:
+            self.in_bulk_session = False
+            if not committed:
+                self.logger.warning("Bulk session rolled back")
+                self.execute_query("ROLLBACK")
+            for table in keyed_tables:
+                self.execute_query(f"ALTER TABLE {self._quote_identifier(table)} ENABLE KEYS")
+            self.execute_query("SET SESSION unique_checks = %(unique_checks)s, "
+                               "foreign_key_checks = %(foreign_key_checks)s, "
+                               "autocommit = %(autocommit)s",
+                               {'unique_checks': unique_checks,
+                                'foreign_key_checks': foreign_key_checks,
+                                'autocommit': autocommit})
+            self.logger.info("Bulk session settings restored")
+    
+    def verify_constraints(self, tables: List[str]) -> List[str]:
+        """
+        Check unique keys and foreign keys of tables loaded with checks disabled
+        
+        Args:
+            tables: Tables to verify
+            
+        Returns:
+            List of human-readable violation descriptions (empty if clean)
+        """
+        violations = []
+        
+        for table in tables:
+            quoted_table = self._quote_identifier(table)
+            
+            # Unique keys: any duplicated non-NULL key value is a violation. InnoDB
+            # enforces the PRIMARY key even with unique_checks = 0, so it is not scanned.
+            unique_keys: Dict[str, List[Tuple[int, str]]] = {}
+            for row in self.execute_query(f"SHOW INDEX FROM {quoted_table}") or []:
+                if not int(row[1]) and row[2] != 'PRIMARY':
+                    unique_keys.setdefault(row[2], []).append((int(row[3]), row[4]))
+            for key_name, key_columns in unique_keys.items():
+                quoted = [self._quote_identifier(c) for _, c in sorted(key_columns)]
+                # NULLs never collide under UNIQUE
+                not_null = " AND ".join(f"{c} IS NOT NULL" for c in quoted)
+                result = self.execute_query(
+                    f"SELECT COUNT(*) FROM (SELECT 1 FROM {quoted_table} WHERE {not_null} "
+                    f"GROUP BY {', '.join(quoted)} HAVING COUNT(*) > 1) AS duplicates")
+                if result and result[0][0]:
+                    violations.append(f"{table}.{key_name}: {result[0][0]} duplicated keys")
+            
+            # Foreign keys: child rows whose parent row does not exist
+            references: Dict[str, Dict[str, Any]] = {}
+            rows = self.execute_query(
+                "SELECT CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+                "FROM information_schema.KEY_COLUMN_USAGE "
+                "WHERE TABLE_SCHEMA = %(schema)s AND TABLE_NAME = %(table)s "
+                "AND REFERENCED_TABLE_NAME IS NOT NULL ORDER BY ORDINAL_POSITION",
+                {'schema': DB_NAME, 'table': table}) or []
+            for constraint, column, parent, parent_column in rows:
+                reference = references.setdefault(constraint, {'parent': parent, 'pairs': []})
+                reference['pairs'].append((self._quote_identifier(column),
+                                           self._quote_identifier(parent_column)))
+            for constraint, reference in references.items():
+                join = " AND ".join(f"c.{c} = p.{p}" for c, p in reference['pairs'])
+                first_parent = reference['pairs'][0][1]
+                not_null = " AND ".join(f"c.{c} IS NOT NULL" for c, _ in reference['pairs'])
+                result = self.execute_query(
+                    f"SELECT COUNT(*) FROM {quoted_table} c "
+                    f"LEFT JOIN {self._quote_identifier(reference['parent'])} p ON {join} "
+                    f"WHERE {not_null} AND p.{first_parent} IS NULL")
+                if result and result[0][0]:
+                    violations.append(f"{table}.{constraint}: {result[0][0]} orphaned rows")
+        
+        return violations
+    
+    def _get_table_engines(self, tables: List[str]) -> Dict[str, str]:
+        """
+        Get storage engine of the given tables
+        
+        Args:
+            tables: Table names
+            
+        Returns:
+            Dict mapping table name to engine name
+        """
+        if not tables:
+            return {}
+        rows = self.execute_query(
+            "SELECT TABLE_NAME, ENGINE FROM information_schema.TABLES WHERE TABLE_SCHEMA = %(schema)s",
+            {'schema': DB_NAME}) or []
+        return {name: engine or '' for name, engine in rows if name in tables}
+    
+    def _get_secondary_indexes(self, table_name: str) -> Dict[str, str]:
+        """
+        Get secondary index definitions of a table
+        
+        Args:
+            table_name: Name of the table
+            
+        Returns:
+            Dict mapping index name to its ALTER TABLE ADD clause
+        """
+        rows = self.execute_query(f"SHOW INDEX FROM {self._quote_identifier(table_name)}") or []
+        
+        # SHOW INDEX columns: Table, Non_unique, Key_name, Seq_in_index,
+        # Column_name, Collation, Cardinality, Sub_part, Packed, Null, Index_type
+        definitions: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            key_name = row[2]
+            if key_name == 'PRIMARY':
+                continue
+            index = definitions.setdefault(key_name, {
+                'unique': not int(row[1]),
+                'type': row[10],
+                'columns': []
+            })
+            column = self._quote_identifier(row[4])
+            if row[7]:
+                column += f"({row[7]})"
+            index['columns'].append((int(row[3]), column))
+        
+        clauses = {}
+        for key_name, index in definitions.items():
+            columns = ", ".join(column for _, column in sorted(index['columns']))
+            if index['type'] in ('FULLTEXT', 'SPATIAL'):
+                kind = f"{index['type']} INDEX"
+            elif index['unique']:
+                kind = "UNIQUE INDEX"
+            else:
+                kind = "INDEX"
+            clauses[key_name] = f"ADD {kind} {self._quote_identifier(key_name)} ({columns})"
+        return clauses
+    
+    def _build_insert_query(self, table_name: str, columns: List[str], upsert: bool = True,
+                            keep_newest: bool = False) -> str:
+        """
+        Build a parameterized INSERT query for batch execution
+        
+        Args:
+            table_name: Target table name
+            columns: Column names
+            upsert: Append ON DUPLICATE KEY UPDATE for all columns
+            keep_newest: Only overwrite a stored row whose ExportTime is not newer
+                         (ignored if the rows have no ExportTime column)
+            
+        Returns:
+            str: SQL query template
+        """
+        quoted = [self._quote_identifier(column) for column in columns]
+        query = (f"INSERT INTO {self._quote_identifier(table_name)} ({', '.join(quoted)}) "
+                 f"VALUES ({', '.join(['%s'] * len(columns))})")
+        if upsert:
+            updates = [f"{column} = VALUES({column})" for column in quoted]
+            if keep_newest and EXPORT_TIME_COLUMN in columns:
+                # Assignments run left to right and see the values already assigned,
+                # so the export time is compared by every column and assigned last
+                version = self._quote_identifier(EXPORT_TIME_COLUMN)
+                newer = f"{version} IS NULL OR VALUES({version}) >= {version}"
+                updates = [f"{column} = IF({newer}, VALUES({column}), {column})"
+                           for column in quoted if column != version]
+                updates.append(f"{version} = IF({newer}, VALUES({version}), {version})")
+            query += f" ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+        return query
+    
+    @staticmethod
+    def _quote_identifier(name: str) -> str:
+        """Quote a table/column/index name for MySQL/MariaDB"""
+        return "`" + str(name).replace("`", "``") + "`"
     
     def get_table_info(self, table_name: str) -> Optional[Dict[str, Any]]:
         """
@@ -193,3 +978,84 @@ class DatabaseManager:
             'user': USER,
             'connected': self.is_connected
         }
+
+
+class ConnectionPool:
+    """
+    Fixed budget of DatabaseManager connections shared by worker threads
+    """
+    
+    def __init__(self, size: int = DB_CONNECTION_BUDGET, factory=DatabaseManager):
+        self.size = max(1, size)
+        self.factory = factory
+        self._idle: "queue.Queue[DatabaseManager]" = queue.Queue()
+        self._managers: List[DatabaseManager] = []
+        self._created = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+    
+    @contextmanager
+    def connection(self) -> Iterator[DatabaseManager]:
+        """
+        Borrow a connected DatabaseManager, blocking while the budget is exhausted
+        
+        Yields:
+            DatabaseManager: Connection reserved for the caller
+        """
+        manager = self._acquire()
+        try:
+            yield manager
+        finally:
+            self._idle.put(manager)
+    
+    def _acquire(self) -> DatabaseManager:
+        """Take an idle connection or open a new one within the budget"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get()
+        manager = self.factory()
+        if not manager.connect():
+            with self._lock:
+                self._created -= 1
+            raise RuntimeError("Unable to open pooled database connection")
+        with self._lock:
+            self._managers.append(manager)
+        return manager
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get retry metrics summed over all pooled connections
+        
+        Connections currently borrowed by running jobs are included, so
+        the counters never drop while uploads are in progress.
+        
+        Returns:
+            Dict containing pool size and aggregated retry counts
+        """
+        with self._lock:
+            managers = list(self._managers)
+        totals: Dict[str, Any] = {'connections': self._created, 'idle': self._idle.qsize()}
+        for manager in managers:
+            for key, value in manager.get_metrics().items():
+                if isinstance(value, int):
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+    
+    def close(self):
+        """Disconnect all idle connections"""
+        while True:
+            try:
+                manager = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            manager.disconnect()
+            with self._lock:
+                self._created -= 1
+                self._managers.remove(manager)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cross-file De-duplication for MML to DB Uploader
+Keeps only the newest version of each primary key across overlapping exports
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import sqlite3
+import logging
+import tempfile
+from typing import Optional, List
+
+import numpy as np
+import pandas as pd
+
+from core.mml_parser import EXPORT_TIME_COLUMN
+from core.spill import MemoryBudget, get_memory_budget
+
+# Import configuration
+try:
+    from config import DEDUP_MAX_KEYS
+except ImportError:
+    DEDUP_MAX_KEYS = 2000000
+
+# Export time of rows without one: older than any real export
+MISSING_TIME = np.iinfo(np.int64).min
+
+# Bytes held per key by the in-memory index (digest, time, file, row)
+INDEX_BYTES_PER_KEY = 8 + 8 + 4 + 8
+
+
+def hash_keys(frame: pd.DataFrame, key_columns: List[str]) -> np.ndarray:
+    """
+    Hash primary key columns to compact 64-bit digests (vectorized)
+
+    Args:
+        frame: Parsed rows
+        key_columns: Primary key columns
+
+    Returns:
+        np.ndarray: int64 digest per row
+    """
+    keys = frame.reindex(columns=key_columns).astype(str)
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy().view(np.int64)
+
+
+def export_times(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Convert the export time column to int64 nanoseconds (vectorized)
+
+    Args:
+        frame: Parsed rows
+
+    Returns:
+        np.ndarray: int64 time per row (MISSING_TIME where absent or unparsable)
+    """
+    if EXPORT_TIME_COLUMN not in frame.columns:
+        return np.full(len(frame), MISSING_TIME, dtype=np.int64)
+    times = pd.to_datetime(frame[EXPORT_TIME_COLUMN], errors='coerce')
+    return times.to_numpy(dtype='datetime64[ns]').view(np.int64).copy()
+
+
+def is_newer(times: np.ndarray, files: np.ndarray, rows: np.ndarray,
+             other_times: np.ndarray, other_files: np.ndarray, other_rows: np.ndarray) -> np.ndarray:
+    """Element-wise (time, file, row) > (other_time, other_file, other_row)"""
+    return (times > other_times) | ((times == other_times) & (
+        (files > other_files) | ((files == other_files) & (rows > other_rows))))
+
+
+class KeyDeduplicator:
+    """
+    Two-pass streaming de-duplication by primary key
+
+    Pass 1 (observe) streams every file and keeps, per 64-bit key digest,
+    only the version (export time, file, row) of the newest row. The index
+    is four parallel numpy arrays sorted by digest (28 bytes per key,
+    accounted in the MemoryBudget) and each chunk is merged into it with
+    searchsorted, without a per-key Python loop. Ties are broken by file
+    order and then row order, so the result is deterministic. Beyond
+    DEDUP_MAX_KEYS keys, or when the budget (shared with everything else the
+    process holds, unless one is given) is exceeded, the index spills
+    into a temporary SQLite file. Pass 2 (filter) keeps only the winning
+    rows of each file.
+    """
+
+    def __init__(self, key_columns: List[str], max_keys: int = DEDUP_MAX_KEYS,
+                 budget: Optional[MemoryBudget] = None):
+        self.key_columns = key_columns
+        self.max_keys = max_keys
+        self.budget = budget or get_memory_budget()
+        self.keys = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0, dtype=np.int64)
+        self.files = np.empty(0, dtype=np.int32)
+        self.rows = np.empty(0, dtype=np.int64)
+        self.rows_seen = 0
+        self.spill_path: Optional[str] = None
+        self.spill: Optional[sqlite3.Connection] = None
+        self.logger = logging.getLogger(__name__)
+
+    def observe(self, frame: pd.DataFrame, file_index: int, first_row: int,
+                rows: Optional[np.ndarray] = None):
+        """
+        Pass 1: record the key versions of a parsed chunk
+
+        Args:
+            frame: Parsed rows of one chunk
+            file_index: Position of the file in processing order
+            first_row: Row index of the chunk's first row within its file
+            rows: Row index within the file of every row of frame, when
+                  frame is a filtered chunk (defaults to consecutive rows)
+        """
+        if frame.empty:
+            return
+        self.rows_seen += len(frame)
+        keys = hash_keys(frame, self.key_columns)
+        times = export_times(frame)
+        if rows is None:
+            rows = np.arange(first_row, first_row + len(frame), dtype=np.int64)
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+
+        # Newest version per key inside the chunk first (the file is the same for every row)
+        order = np.lexsort((rows, times, keys))
+        keys, times, rows = keys[order], times[order], rows[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        keys, times, rows = keys[last], times[last], rows[last]
+        files = np.full(len(keys), file_index, dtype=np.int32)
+        self._merge(keys, times, files, rows)
+
+        if len(self.keys) > self.max_keys or self.budget.exceeded():
+            self._spill()
+
+    def _merge(self, keys: np.ndarray, times: np.ndarray, files: np.ndarray, rows: np.ndarray):
+        """Merge a chunk's unique, sorted key versions into the in-memory index"""
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+
+        # Known keys: replace the version where the chunk's is newer
+        at = positions[found]
+        newer = is_newer(times[found], files[found], rows[found],
+                         self.times[at], self.files[at], self.rows[at])
+        at = at[newer]
+        self.times[at] = times[found][newer]
+        self.files[at] = files[found][newer]
+        self.rows[at] = rows[found][newer]
+
+        # New keys: insert in digest order
+        new = ~found
+        if new.any():
+            at = positions[new]
+            self.keys = np.insert(self.keys, at, keys[new])
+            self.times = np.insert(self.times, at, times[new])
+            self.files = np.insert(self.files, at, files[new])
+            self.rows = np.insert(self.rows, at, rows[new])
+            self.budget.reserve(int(new.sum()) * INDEX_BYTES_PER_KEY)
+
+    def _clear_index(self):
+        """Drop the in-memory index and release its bytes"""
+        self.budget.release(len(self.keys) * INDEX_BYTES_PER_KEY)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0, dtype=np.int64)
+        self.files = np.empty(0, dtype=np.int32)
+        self.rows = np.empty(0, dtype=np.int64)
+
+    def _spill(self):
+        """Merge the in-memory index into the SQLite spill file"""
+        if self.spill is None:
+            handle, self.spill_path = tempfile.mkstemp(prefix="mml_dedup_", suffix=".sqlite3")
+            os.close(handle)
+            self.spill = sqlite3.connect(self.spill_path)
+            self.spill.execute("PRAGMA journal_mode=OFF")
+            self.spill.execute("PRAGMA synchronous=OFF")
+            self.spill.execute("CREATE TABLE winners (key INTEGER PRIMARY KEY, ts INTEGER, "
+                               "file INTEGER, row INTEGER)")
+            self.logger.info(f"De-dup index spilled to {self.spill_path}")
+        self.spill.executemany(
+            "INSERT INTO winners VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "ts = excluded.ts, file = excluded.file, row = excluded.row "
+            "WHERE (excluded.ts, excluded.file, excluded.row) > (winners.ts, winners.file, winners.row)",
+            zip(self.keys.tolist(), self.times.tolist(), self.files.tolist(), self.rows.tolist()))
+        self.spill.commit()
+        self._clear_index()
+
+    def _finish_spill(self):
+        """Flush the in-memory index and index the spill file by file for pass 2"""
+        if len(self.keys):
+            self._spill()
+        self.spill.execute("CREATE INDEX IF NOT EXISTS winners_file ON winners (file)")
+
+    def winning_rows(self, file_index: int) -> np.ndarray:
+        """
+        Get the row indexes of a file that hold the newest version of their key
+
+        Fetch once per file at the start of pass 2.
+
+        Args:
+            file_index: Position of the file in processing order
+
+        Returns:
+            np.ndarray: Sorted row indexes
+        """
+        if self.spill is not None:
+            self._finish_spill()
+            rows = np.fromiter((row for (row,) in self.spill.execute(
+                "SELECT row FROM winners WHERE file = ?", (file_index,))), dtype=np.int64)
+        else:
+            rows = self.rows[self.files == file_index]
+        return np.sort(rows)
+
+    @staticmethod
+    def filter(frame: pd.DataFrame, first_row: int, winning_rows: np.ndarray) -> pd.DataFrame:
+        """
+        Pass 2: keep only the rows that won pass 1
+
+        Args:
+            frame: Parsed rows of one chunk (same chunking as pass 1)
+            first_row: Row index of the chunk's first row within its file
+            winning_rows: Result of winning_rows() for the chunk's file
+
+        Returns:
+            pd.DataFrame: Rows to upload
+        """
+        rows = np.arange(first_row, first_row + len(frame))
+        return frame[np.isin(rows, winning_rows, assume_unique=True)]
+
+    @property
+    def unique_keys(self) -> int:
+        """Number of distinct primary keys observed"""
+        if self.spill is not None:
+            self._finish_spill()
+            return self.spill.execute("SELECT COUNT(*) FROM winners").fetchone()[0]
+        return len(self.keys)
+
+    @property
+    def duplicates_dropped(self) -> int:
+        """Number of rows superseded by a newer version of their key"""
+        return self.rows_seen - self.unique_keys
+
+    def close(self):
+        """Release the index and delete the spill file"""
+        self._clear_index()
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
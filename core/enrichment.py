@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cell Enrichment for MML to DB Uploader
+Joins LST CELL with its auxiliary LST tables partition by partition
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import logging
+from typing import Optional, Dict, Any, List, Iterator
+
+import pandas as pd
+
+from core.mml_parser import parse_file, NE_COLUMN, EXPORT_TIME_COLUMN
+from core.commands import base_spec, enrichment_joins
+from core.spill import MemoryBudget, PartitionedTable, get_memory_budget
+from core.validation import FrameValidator
+
+# Import configuration
+try:
+    from config import JOIN_PARTITIONS
+except ImportError:
+    JOIN_PARTITIONS = 16
+
+ENRICHED_TABLE = 'lst_cell_enriched'
+
+
+class CellEnricher:
+    """
+    Builds the enriched cell table within the process memory budget
+
+    The base command (LST CELL) and the auxiliary commands joined onto it
+    come from the command registry (join_role 'base' / 'aux'). Every join
+    key starts with NE, so all tables are hash-partitioned by NE: matching
+    rows always land in the same partition number. Tables are loaded into
+    PartitionedTables sharing the run's MemoryBudget (spilling to memory-mapped
+    .npy files when over budget) and the joins then run one partition at a
+    time, so peak memory is roughly one partition of each table instead of
+    all of them. With a validator, rows failing validation are dropped
+    while loading (they were already reported when their command was
+    uploaded, so they are not reported again).
+    """
+
+    def __init__(self, budget: Optional[MemoryBudget] = None, partitions: int = JOIN_PARTITIONS,
+                 validator: Optional[FrameValidator] = None):
+        self.budget = budget or get_memory_budget()
+        self.validator = validator
+        self.partitions = partitions
+        self.tables: Dict[str, PartitionedTable] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def load(self, command: str, files: List[Dict[str, Any]]):
+        """
+        Parse the files of a command into a partitioned table
+
+        Args:
+            command: MML command name
+            files: File dicts from detect_files()
+        """
+        name = command.split()[-1].lower()
+        table = PartitionedTable(name, [NE_COLUMN], self.budget, self.partitions)
+        for file_info in files:
+            for frame in parse_file(file_info):
+                if self.validator is not None and not frame.empty:
+                    frame = frame[pd.isna(self.validator.check(command, frame))]
+                table.append(frame)
+        self.tables[command] = table
+        self.logger.info(f"Loaded {command}: {table.rows} rows, "
+                         f"{self.budget.used / 1048576:.0f} MB held in memory")
+
+    def iter_enriched(self) -> Iterator[pd.DataFrame]:
+        """
+        Join LST CELL with the loaded auxiliary tables, partition by partition
+
+        Yields:
+            pd.DataFrame: Enriched cells of one partition
+        """
+        base = base_spec()
+        cells = self.tables.get(base.command) if base else None
+        if cells is None:
+            return
+        joins = enrichment_joins()
+        for partition in range(self.partitions):
+            frame = cells.get_partition(partition)
+            if frame.empty:
+                continue
+            cell_keys = base.primary_key
+            if set(cell_keys) <= set(frame.columns):
+                frame = (frame.sort_values(EXPORT_TIME_COLUMN, kind='mergesort')
+                         .drop_duplicates(cell_keys, keep='last'))
+            for command, keys in joins:
+                table = self.tables.get(command)
+                if table is None or not set(keys) <= set(frame.columns):
+                    continue
+                aux = table.get_partition(partition)
+                if aux.empty or not set(keys) <= set(aux.columns):
+                    continue
+                # One row per key on the right so the join cannot multiply cells
+                aux = aux.drop(columns=[EXPORT_TIME_COLUMN], errors='ignore')
+                aux = aux.drop_duplicates(keys, keep='last')
+                suffix = "_" + command.split()[-1]
+                frame = frame.merge(aux, on=keys, how='left', suffixes=('', suffix))
+            yield frame
+
+    def close(self):
+        """Delete partitions and spill files"""
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+
+
+def enrich_cells(detected: Dict[str, List[Dict[str, Any]]],
+                 budget: Optional[MemoryBudget] = None,
+                 validator: Optional[FrameValidator] = None) -> Optional[CellEnricher]:
+    """
+    Load the base command (LST CELL) and its auxiliary tables for enrichment
+
+    Args:
+        detected: Result of detect_files()
+        budget: Memory budget (defaults to the process-wide budget)
+        validator: Drops rows failing validation (None loads every row)
+
+    Returns:
+        CellEnricher ready for iter_enriched(), or None if there is no base command data
+    """
+    base = base_spec()
+    if base is None or not detected.get(base.command):
+        return None
+    enricher = CellEnricher(budget, validator=validator)
+    enricher.load(base.command, detected[base.command])
+    for command, _ in enrichment_joins():
+        if detected.get(command):
+            enricher.load(command, detected[command])
+    return enricher
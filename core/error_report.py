@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Error Report for MML to DB Uploader
+Aggregates rejected rows per SITE_ID / NE and error class
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import csv
+import json
+import tempfile
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Sequence
+
+# Import configuration
+try:
+    from config import SITE_ID_REPORTING, ERROR_SAMPLE_ROWS, ERROR_INDEX_MAX_KEYS
+except ImportError:
+    SITE_ID_REPORTING = True
+    ERROR_SAMPLE_ROWS = 3
+    ERROR_INDEX_MAX_KEYS = 10000
+
+# Columns tried, in order, to find the site of a rejected row
+SITE_ID_COLUMNS = ('SITE_ID', 'SiteId', 'NE')
+
+ErrorKey = Tuple[str, str, str]
+
+
+class SiteErrorIndex:
+    """
+    In-memory index of rejected rows keyed by (SITE_ID, NE, error class)
+
+    Recording an error only bumps a counter and keeps a few sample rows, so
+    thousands of rejections cost almost nothing in the upload loop. When the
+    number of distinct keys grows past ERROR_INDEX_MAX_KEYS the index is
+    spilled to a temporary file and merged back when the summary is built.
+    """
+
+    def __init__(self, max_keys: int = ERROR_INDEX_MAX_KEYS, sample_rows: int = ERROR_SAMPLE_ROWS):
+        self.max_keys = max_keys
+        self.sample_rows = sample_rows
+        self.counts: Dict[ErrorKey, int] = {}
+        self.samples: Dict[ErrorKey, List[Any]] = {}
+        self.total_errors = 0
+        self.spill_files: List[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, site_id: Optional[str], ne: Optional[str], error_class: str,
+            row: Any = None):
+        """
+        Record a rejected row
+
+        Args:
+            site_id: SITE_ID of the row (ignored if SITE_ID_REPORTING is off)
+            ne: NE name of the row
+            error_class: Short error class (e.g. 'MySQL 1366', 'invalid LocalCellId')
+            row: Rejected row, kept as a sample for the first few occurrences
+        """
+        self.add_count(site_id, ne, error_class, 1, [] if row is None else [row])
+
+    def add_count(self, site_id: Optional[str], ne: Optional[str], error_class: str,
+                  count: int, rows: Sequence[Any] = ()):
+        """
+        Record several rejected rows of the same key at once
+
+        Args:
+            site_id: SITE_ID of the rows (ignored if SITE_ID_REPORTING is off)
+            ne: NE name of the rows
+            error_class: Short error class
+            count: Number of rejected rows
+            rows: Sample rows (only the first few are kept)
+        """
+        key = (str(site_id or '') if SITE_ID_REPORTING else '', str(ne or ''), error_class)
+        with self._lock:
+            self.total_errors += count
+            seen = self.counts.get(key, 0)
+            self.counts[key] = seen + count
+            if rows and seen < self.sample_rows:
+                self.samples.setdefault(key, []).extend(rows[:self.sample_rows - seen])
+            if len(self.counts) > self.max_keys:
+                self._spill()
+
+    def add_row(self, columns: Sequence[str], row: Sequence[Any], error_class: str):
+        """
+        Record a rejected data tuple, locating SITE_ID/NE from its columns
+
+        Args:
+            columns: Column names of the tuple
+            row: Rejected data tuple
+            error_class: Short error class
+        """
+        values = dict(zip(columns, row))
+        site_id = next((values[c] for c in SITE_ID_COLUMNS if values.get(c)), None)
+        self.add(site_id, values.get('NE'), error_class, values)
+
+    def _spill(self):
+        """Write the in-memory index to a temporary file and clear it"""
+        handle, path = tempfile.mkstemp(prefix="mml_errors_", suffix=".jsonl")
+        with os.fdopen(handle, 'w', encoding='utf-8') as spill:
+            for key, count in self.counts.items():
+                spill.write(json.dumps([list(key), count, self.samples.get(key, [])],
+                                       default=str) + "\n")
+        self.spill_files.append(path)
+        self.counts.clear()
+        self.samples.clear()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Build the aggregated error summary
+
+        Returns:
+            List of dicts (site_id, ne, error_class, count, samples) sorted by count
+        """
+        with self._lock:
+            counts = dict(self.counts)
+            samples = {key: list(rows) for key, rows in self.samples.items()}
+            for path in self.spill_files:
+                with open(path, encoding='utf-8') as spill:
+                    for line in spill:
+                        key, count, rows = json.loads(line)
+                        key = tuple(key)
+                        counts[key] = counts.get(key, 0) + count
+                        kept = samples.setdefault(key, [])
+                        kept.extend(rows[:self.sample_rows - len(kept)])
+
+        return [
+            {'site_id': key[0], 'ne': key[1], 'error_class': key[2],
+             'count': count, 'samples': samples.get(key, [])}
+            for key, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        ]
+
+    def write_csv(self, path: str) -> str:
+        """
+        Write the summary as CSV (one line per site / NE / error class)
+
+        Args:
+            path: Output file path
+
+        Returns:
+            str: The written path
+        """
+        with open(path, 'w', newline='', encoding='utf-8') as output:
+            writer = csv.writer(output)
+            writer.writerow(['SITE_ID', 'NE', 'Error Class', 'Count', 'Sample Row'])
+            for entry in self.summary():
+                sample = json.dumps(entry['samples'][0], default=str) if entry['samples'] else ''
+                writer.writerow([entry['site_id'], entry['ne'], entry['error_class'],
+                                 entry['count'], sample])
+        return path
+
+    def clear(self):
+        """Reset the index and delete spill files"""
+        with self._lock:
+            self.counts.clear()
+            self.samples.clear()
+            self.total_errors = 0
+            for path in self.spill_files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.spill_files = []
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Reader for MML to DB Uploader
+Handles MML file detection, encoding detection and chunked reading
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import codecs
+from typing import Optional, Dict, Any, List, Iterator
+
+from core.commands import CommandSpec, iter_specs, spec_for_file
+
+# Import configuration
+try:
+    from config import ENCODING_SAMPLE_BYTES, READ_CHUNK_BYTES
+except ImportError:
+    ENCODING_SAMPLE_BYTES = 65536
+    READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Encodings tried for non-ASCII content, in order
+FALLBACK_ENCODINGS = ('utf-8', 'gbk')
+
+# Encodings whose ASCII range is byte-identical, so lines can be parsed as bytes
+ASCII_COMPATIBLE = ('ascii', 'utf-8', 'utf-8-sig', 'gbk')
+
+
+def detect_encoding(path: str, sample_size: int = ENCODING_SAMPLE_BYTES) -> str:
+    """
+    Detect the text encoding of an OSS export from a small sample
+
+    Args:
+        path: File path
+        sample_size: Number of leading bytes to inspect
+
+    Returns:
+        str: 'ascii', 'utf-8', 'utf-8-sig', 'utf-16', 'utf-16-le',
+             'utf-16-be', 'gbk' or 'latin-1' (lossless last resort)
+    """
+    with open(path, 'rb') as file:
+        sample = file.read(sample_size)
+    truncated = len(sample) == sample_size
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    if sample.count(b'\x00') > len(sample) // 4:
+        # UTF-16 without BOM: ASCII characters leave NUL bytes on one side
+        odd_zeros = sample[1::2].count(b'\x00')
+        even_zeros = sample[0::2].count(b'\x00')
+        return 'utf-16-le' if odd_zeros >= even_zeros else 'utf-16-be'
+    if sample.isascii():
+        return 'ascii'
+
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut by the sample boundary is not an error
+            if truncated and e.start >= len(sample) - 3:
+                try:
+                    sample[:e.start].decode(encoding)
+                    return encoding
+                except UnicodeDecodeError:
+                    pass
+    return 'latin-1'
+
+
+def detect_files(folder: str, specs: Optional[List[CommandSpec]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Detect supported MML files in a folder
+
+    The encoding of every file is detected once here and cached in the
+    result, so parsers never need to guess or retry decodes.
+
+    Args:
+        folder: Folder to scan
+        specs: Commands to detect (defaults to every registered command)
+
+    Returns:
+        Dict mapping command name to a list of file dicts
+        (path, name, size, mtime, encoding, command)
+    """
+    specs = specs or iter_specs()
+    results: Dict[str, List[Dict[str, Any]]] = {spec.command: [] for spec in specs}
+
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not os.path.isfile(path):
+            continue
+        spec = next((spec for spec in specs if spec.matches(name)), None)
+        if spec is not None:
+            results[spec.command].append(describe_file(path))
+    return results
+
+
+def describe_file(path: str) -> Dict[str, Any]:
+    """
+    Build the detection record of a single file
+
+    Args:
+        path: File path
+
+    Returns:
+        Dict containing path, name, size, mtime, detected encoding and
+        command (None if the file is not a supported type)
+    """
+    stat = os.stat(path)
+    spec = spec_for_file(path)
+    return {
+        'path': path,
+        'name': os.path.basename(path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'encoding': detect_encoding(path),
+        'command': spec.command if spec else None
+    }
+
+
+def iter_byte_lines(path: str, encoding: str, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Read a file in large chunks and yield ASCII-compatible byte lines
+
+    ASCII, UTF-8 and GBK files are split into lines without decoding at
+    all; UTF-16 files are transcoded chunk by chunk to UTF-8 first. Field
+    values are decoded later with decode_field(), and only when needed.
+
+    Args:
+        path: File path
+        encoding: Encoding from detect_encoding()
+        chunk_size: Bytes read per chunk
+
+    Yields:
+        bytes: One line without its line terminator
+    """
+    decoder = None
+    if encoding not in ASCII_COMPATIBLE and encoding != 'latin-1':
+        decoder = codecs.getincrementaldecoder(encoding)()
+
+    remainder = b''
+    first = True
+    with open(path, 'rb') as file:
+        while True:
+            # The first read is long enough to hold a whole UTF-8 BOM
+            chunk = file.read(max(chunk_size, len(codecs.BOM_UTF8)) if first else chunk_size)
+            final = not chunk
+            if decoder is not None:
+                chunk = decoder.decode(chunk, final=final).encode('utf-8')
+            elif first and chunk.startswith(codecs.BOM_UTF8):
+                chunk = chunk[len(codecs.BOM_UTF8):]
+            first = False
+
+            data = remainder + chunk
+            if final:
+                if data:
+                    yield from data.splitlines()
+                return
+
+            # Keep the trailing partial line (and a lone CR) for the next chunk
+            cut = data.rfind(b'\n')
+            if cut == -1:
+                remainder = data
+                continue
+            remainder = data[cut + 1:]
+            # Split up to and including the newline, so a blank line is kept
+            yield from data[:cut + 1].splitlines()
+
+
+def decode_field(raw: bytes, encoding: str) -> str:
+    """
+    Decode one field value read by iter_byte_lines()
+
+    Args:
+        raw: Raw field bytes
+        encoding: Encoding from detect_encoding()
+
+    Returns:
+        str: Decoded value
+    """
+    if raw.isascii():
+        return raw.decode('ascii')
+    if encoding in ('ascii', 'utf-8', 'utf-8-sig', 'latin-1') or encoding.startswith('utf-16'):
+        # Non-ASCII bytes past the detection sample, or transcoded UTF-16
+        candidates = ('utf-8', 'gbk') if encoding != 'latin-1' else ('latin-1',)
+    else:
+        candidates = (encoding, 'utf-8')
+    for candidate in candidates:
+        try:
+            return raw.decode(candidate)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('latin-1')
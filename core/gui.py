@@ -9,15 +9,23 @@ Version: 2.1.1
 """
 
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import webbrowser
 import os
 import sys
+import time
 from typing import Optional, List, Dict, Any
 
+from core.error_report import SiteErrorIndex
+from core.file_reader import detect_files
+from core.commands import iter_specs
+from core.job_server import JobClient, JobServerError, FINISHED_STATUSES
+from core.pipeline import UploadPipeline
+
 # Import configuration
 try:
     from config import SCRIPT_VERSION, THEME_COLORS, WINDOW_WIDTH, WINDOW_HEIGHT
+    from config import ERROR_LOG_ENABLED, ERROR_REPORT_DIR, JOB_SERVER_URL
 except ImportError:
     SCRIPT_VERSION = "2.1.1"
     THEME_COLORS = {
@@ -28,6 +36,9 @@ except ImportError:
     }
     WINDOW_WIDTH = 1000
     WINDOW_HEIGHT = 750
+    ERROR_LOG_ENABLED = True
+    ERROR_REPORT_DIR = "error_reports"
+    JOB_SERVER_URL = None
 
 class MMLUploaderGUI:
     """
@@ -50,6 +61,9 @@ class MMLUploaderGUI:
         self.processing = False
         self.upload_thread = None
         self.should_stop = False
+        self.error_index = SiteErrorIndex()
+        self.detected_files: Dict[str, List[Dict[str, Any]]] = {}
+        self.job_client = JobClient(JOB_SERVER_URL) if JOB_SERVER_URL else None
         
         # Setup GUI
         self.setup_styles()
@@ -267,16 +281,8 @@ class MMLUploaderGUI:
                             style="Modern.TLabel")
         req_desc.pack(anchor="w", pady=(0, 10))
         
-        # Required files list
-        required_files = [
-            "LST CELL: 1 files",
-            "LST PDSCHCFG: 1 files", 
-            "LST CELLDLPCPDSCHPA: 1 files",
-            "LST SECTORSPLITCELL: 1 files",
-            "LST SECTORSPLITGROUP: 1 files",
-            "DSP VSWR: 1 files",
-            "DSP RETSUBUNIT: 1 files"
-        ]
+        # Required files list (one per registered command)
+        required_files = [f"{spec.command}: 1 files ({spec.pattern})" for spec in iter_specs()]
         
         for file_req in required_files:
             file_label = ttk.Label(req_frame, 
@@ -377,20 +383,35 @@ class MMLUploaderGUI:
             # Auto detect files and show in logs
             self.log_text.insert(tk.END, f"🔍 Selected folder: {folder}\n\n")
             
-            # Simulate file detection (placeholder)
-            self.log_text.insert(tk.END, "=== 📊 FILE DETECTION RESULTS ===\n\n")
-            self.log_text.insert(tk.END, "📋 LST Command Files:\n")
-            self.log_text.insert(tk.END, "  ✅ LST CELL: 1 files\n")
-            self.log_text.insert(tk.END, "  ✅ LST PDSCHCFG: 1 files\n")
-            self.log_text.insert(tk.END, "  ✅ LST CELLDLPCPDSCHPA: 1 files\n")
-            self.log_text.insert(tk.END, "  ✅ LST SECTORSPLITCELL: 1 files\n")
-            self.log_text.insert(tk.END, "  ✅ LST SECTORSPLITGROUP: 1 files\n\n")
+            # Detect files (encoding is detected once per file and cached)
+            try:
+                self.detected_files = detect_files(folder)
+            except OSError as e:
+                messagebox.showerror("Error", f"Cannot read folder: {e}")
+                return
             
-            self.log_text.insert(tk.END, "📈 DSP Data Files:\n")
-            self.log_text.insert(tk.END, "  ✅ DSP VSWR: 1 files\n")
-            self.log_text.insert(tk.END, "  ✅ DSP RETSUBUNIT: 1 files\n\n")
+            self.log_text.insert(tk.END, "=== 📊 FILE DETECTION RESULTS ===\n\n")
+            # One section per command verb (LST, DSP, ...) of the registered commands
+            titles = {"LST": "📋 LST Command Files:", "DSP": "📈 DSP Data Files:"}
+            verbs = list(dict.fromkeys(command.split()[0] for command in self.detected_files))
+            for verb in verbs:
+                self.log_text.insert(tk.END, f"{titles.get(verb, f'📄 {verb} Files:')}\n")
+                for command, files in self.detected_files.items():
+                    if command.split()[0] != verb:
+                        continue
+                    encodings = ", ".join(sorted({f['encoding'] for f in files}))
+                    status = "✅" if files else "❌"
+                    detail = f" ({encodings})" if encodings else ""
+                    self.log_text.insert(tk.END, f"  {status} {command}: {len(files)} files{detail}\n")
+                self.log_text.insert(tk.END, "\n")
             
-            self.log_text.insert(tk.END, "📊 SUMMARY: 7 total files detected\n")
+            total = sum(len(files) for files in self.detected_files.values())
+            self.log_text.insert(tk.END, f"📊 SUMMARY: {total} total files detected\n")
+            if not total:
+                self.log_text.insert(tk.END, "\n⚠️ No supported MML files found in this folder.\n")
+                self.upload_btn.config(state="disabled")
+                self.log_text.see(tk.END)
+                return
             self.log_text.insert(tk.END, "\n🎉 Ready for processing! Click 'Start Upload Process' button.\n")
             
             self.upload_btn.config(state="normal")
@@ -416,48 +437,96 @@ class MMLUploaderGUI:
         self.log_text.see(tk.END)
         
         self.processing = True
+        self.should_stop = False
+        self.error_index.clear()
         self.upload_btn.config(state="disabled")
         self.cancel_btn.config(state="normal")
         self.progress_var.set("Preparing upload...")
         self.progress_bar.config(mode='indeterminate')
         self.progress_bar.start()
         
-        # Simulate upload process (placeholder)
-        self.simulate_upload()
+        if self.job_client:
+            self.submit_to_server(folder)
+            return
+        
+        self.run_upload()
+    
+    def submit_to_server(self, folder):
+        """Queue the folder on the shared job server and follow its progress"""
+        import threading
+        
+        user, password = None, None
+        if not self.job_client.token:
+            user = self.auth_manager.get_current_user() or ""
+            password = simpledialog.askstring("Job Server", f"Password for {user} on {JOB_SERVER_URL}:",
+                                              show="*", parent=self.root)
+            if password is None:
+                self.finish_upload("Upload cancelled by user.")
+                return
+        
+        def server_worker():
+            try:
+                if not self.job_client.token:
+                    self.job_client.login(user, password)
+                job = self.job_client.submit(folder)
+                self.root.after(0, lambda: self.log_text.insert(
+                    tk.END, f"🖧 Queued as job {job['id']} on {JOB_SERVER_URL}\n"))
+                cancelled = False
+                progress = None
+                for progress in self.job_client.stream(job['id']):
+                    if self.should_stop and not cancelled:
+                        self.job_client.cancel(job['id'])
+                        cancelled = True
+                    text = (f"{progress['status']}: {progress['files_done']}/{progress['files_total']} files, "
+                            f"{progress['rows']} rows ({progress['percent']:.0f}%)")
+                    self.root.after(0, lambda t=text: self.progress_var.set(t))
+                if progress is None or progress['status'] not in FINISHED_STATUSES:
+                    # The stream ended before the job did (server restarted or job forgotten)
+                    self.root.after(0, lambda: self.finish_upload(
+                        f"Upload failed: lost track of job {job['id']} on {JOB_SERVER_URL}"))
+                    return
+                for entry in self.job_client.get_errors(job['id']):
+                    self.error_index.add_count(entry['site_id'], entry['ne'], entry['error_class'],
+                                               entry['count'], entry['samples'])
+                message = {"done": "Upload completed successfully!",
+                           "cancelled": "Upload cancelled by user."}.get(
+                    progress['status'], f"Upload failed: {'; '.join(progress['errors'])}")
+                self.root.after(0, lambda: self.finish_upload(message))
+            except (JobServerError, OSError) as e:
+                if getattr(e, 'status', None) == 401:
+                    self.job_client.token = None
+                self.root.after(0, lambda: self.finish_upload(f"Upload failed: job server error: {e}"))
+        
+        self.upload_thread = threading.Thread(target=server_worker, daemon=True)
+        self.upload_thread.start()
     
-    def simulate_upload(self):
-        """Simulate upload process for demonstration"""
+    def run_upload(self):
+        """Upload the detected files through the pipeline in a worker thread"""
         import threading
-        import time
+        
+        detected = self.detected_files
+        
+        def log(message):
+            self.root.after(0, lambda: self.progress_var.set(message))
+            self.root.after(0, lambda: self.log_text.insert(tk.END, f"{message}\n"))
+            self.root.after(0, lambda: self.log_text.see(tk.END))
         
         def upload_worker():
             try:
-                # Simulate processing steps
-                steps = [
-                    "Processing LST CELL files...",
-                    "Processing VSWR data...",
-                    "Processing RET data...",
-                    "Uploading to database...",
-                    "Finalizing process..."
-                ]
-                
-                for i, step in enumerate(steps):
-                    if self.should_stop:
-                        break
-                    
-                    self.root.after(0, lambda s=step: self.progress_var.set(s))
-                    self.root.after(0, lambda: self.log_text.insert(tk.END, f"✅ {step}\n"))
-                    self.root.after(0, lambda: self.log_text.see(tk.END))
-                    
-                    time.sleep(1)  # Simulate processing time
+                pipeline = UploadPipeline(self.db_manager, self.error_index,
+                                          log_callback=log,
+                                          should_stop=lambda: self.should_stop)
+                rows = pipeline.process_detected(detected)
                 
                 if not self.should_stop:
-                    self.root.after(0, lambda: self.finish_upload("Upload completed successfully!"))
+                    self.root.after(0, lambda: self.finish_upload(
+                        f"Upload completed successfully! {rows} rows uploaded."))
                 else:
                     self.root.after(0, lambda: self.finish_upload("Upload cancelled by user."))
                     
             except Exception as e:
-                self.root.after(0, lambda: self.finish_upload(f"Upload failed: {str(e)}"))
+                message = f"Upload failed: {str(e)}"
+                self.root.after(0, lambda: self.finish_upload(message))
         
         # Start upload in separate thread
         self.upload_thread = threading.Thread(target=upload_worker, daemon=True)
@@ -499,12 +568,49 @@ class MMLUploaderGUI:
         self.progress_var.set("Complete")
         self.progress_bar.config(value=self.progress_bar['maximum'])
         
+        if ERROR_LOG_ENABLED and self.error_index.total_errors:
+            self.show_error_summary()
+        
         # Show result message
         if "failed" in message.lower() or "error" in message.lower():
             messagebox.showerror("Upload Failed", message)
         else:
             messagebox.showinfo("Upload Complete", message)
     
+    def show_error_summary(self):
+        """Write the aggregated error report to CSV and show it in a table"""
+        summary = self.error_index.summary()
+        
+        os.makedirs(ERROR_REPORT_DIR, exist_ok=True)
+        csv_path = os.path.join(ERROR_REPORT_DIR, f"upload_errors_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        self.error_index.write_csv(csv_path)
+        
+        self.log_text.insert(tk.END, f"\n⚠️ {self.error_index.total_errors} rows rejected "
+                                     f"across {len(summary)} site/error groups\n")
+        self.log_text.insert(tk.END, f"📄 Error report saved: {csv_path}\n")
+        self.log_text.see(tk.END)
+        
+        window = tk.Toplevel(self.root)
+        window.title("Upload Error Summary")
+        window.geometry("700x400")
+        window.configure(bg=THEME_COLORS['off_white'])
+        
+        columns = ("site_id", "ne", "error_class", "count")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, heading, width in zip(columns,
+                                          ("SITE_ID", "NE", "Error Class", "Rows"),
+                                          (150, 200, 250, 80)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor="e" if column == "count" else "w")
+        for entry in summary:
+            tree.insert("", tk.END, values=(entry['site_id'], entry['ne'],
+                                            entry['error_class'], entry['count']))
+        
+        scrollbar = ttk.Scrollbar(window, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", fill="both", expand=True, padx=(10, 0), pady=10)
+        scrollbar.pack(side="right", fill="y", pady=10)
+    
     def clear_logs(self):
         """Clear the log display"""
         self.log_text.delete(1.0, tk.END)
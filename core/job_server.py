@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job Server for MML to DB Uploader
+Local HTTP server queuing upload jobs from several GUI/CLI users on one scheduler
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import json
+import time
+import itertools
+import threading
+import logging
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any, List, Iterator
+
+from core.auth import AuthenticationManager
+from core.scheduler import UploadScheduler
+
+# Import configuration
+try:
+    from config import JOB_SERVER_HOST, JOB_SERVER_PORT, JOB_PROGRESS_INTERVAL
+except ImportError:
+    JOB_SERVER_HOST = "127.0.0.1"
+    JOB_SERVER_PORT = 8765
+    JOB_PROGRESS_INTERVAL = 1.0
+
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+
+class JobServerError(Exception):
+    """Error returned by the job server (carries the HTTP status)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class JobServer:
+    """
+    Serializes uploads of several users through one UploadScheduler
+
+    Every user logs in with their own AuthenticationManager session; jobs
+    from all users share the scheduler's worker pool, connection pool and
+    per-table write locks, so concurrent GUI copies no longer write to the
+    same tables at the same time.
+
+    Endpoints (JSON; all but /login need "Authorization: Bearer <token>"):
+        POST   /login              {"username", "password"} -> {"token", "user"}
+        POST   /logout
+        GET    /jobs               progress of all jobs
+        POST   /jobs               {"folder", "priority", "name"} -> job progress
+        GET    /jobs/<id>          job progress
+        DELETE /jobs/<id>          cancel (owner only)
+        GET    /jobs/<id>/events   newline-delimited progress until the job finishes
+                                   (empty heartbeat lines while it does not change)
+        GET    /jobs/<id>/errors   rejected-row summary per SITE_ID / NE / error class
+    """
+
+    def __init__(self, host: str = JOB_SERVER_HOST, port: int = JOB_SERVER_PORT,
+                 scheduler: Optional[UploadScheduler] = None):
+        self.scheduler = scheduler or UploadScheduler()
+        self.sessions: Dict[str, AuthenticationManager] = {}
+        self.owners: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'JobServer':
+        """Serve in a background thread"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.info(f"Job server listening on {self.url}")
+        return self
+
+    def serve_forever(self):
+        """Serve in the calling thread until interrupted"""
+        self.logger.info(f"Job server listening on {self.url}")
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """Stop serving and shut the scheduler down"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.scheduler.shutdown()
+
+    # Sessions
+
+    def login(self, username: str, password: str) -> Dict[str, Any]:
+        """Start a session for a user"""
+        auth_manager = AuthenticationManager()
+        if not auth_manager.authenticate_user(username, password):
+            raise JobServerError(401, "Invalid credentials")
+        with self._lock:
+            self.sessions[auth_manager.session_token] = auth_manager
+        return {'token': auth_manager.session_token, 'user': username,
+                'expires_in': auth_manager.max_session_duration}
+
+    def authenticate(self, token: Optional[str]) -> AuthenticationManager:
+        """Resolve a bearer token to its valid session"""
+        with self._lock:
+            auth_manager = self.sessions.get(token or '')
+            if auth_manager is None or not auth_manager.validate_session(token):
+                self.sessions.pop(token or '', None)
+                raise JobServerError(401, "Invalid or expired session")
+        auth_manager.refresh_session()
+        return auth_manager
+
+    def logout(self, token: str):
+        """End a session"""
+        with self._lock:
+            auth_manager = self.sessions.pop(token, None)
+        if auth_manager:
+            auth_manager.logout()
+
+    # Jobs
+
+    def submit(self, user: str, folder: str, priority: int = 1,
+               name: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a source folder on the shared scheduler"""
+        if not folder or not os.path.isdir(folder):
+            raise JobServerError(400, f"Folder not found on server: {folder}")
+        job = self.scheduler.add_job(folder, int(priority or 1), name)
+        with self._lock:
+            self.owners[job.id] = user
+            # Owners of jobs the scheduler has forgotten (past JOB_RETENTION_SECONDS)
+            for job_id in [job_id for job_id in self.owners if job_id not in self.scheduler.jobs]:
+                del self.owners[job_id]
+        self.logger.info(f"{user} submitted job {job.id} ({folder})")
+        return self.job_progress(job.id)
+
+    def job_progress(self, job_id: int) -> Dict[str, Any]:
+        """Progress of one job, with its owner"""
+        job = self.scheduler.jobs.get(job_id)
+        if job is None:
+            raise JobServerError(404, f"Unknown job {job_id}")
+        progress = job.get_progress()
+        progress['user'] = self.owners.get(job_id)
+        return progress
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Progress of all jobs"""
+        jobs = []
+        for job_id in list(self.scheduler.jobs):
+            try:
+                jobs.append(self.job_progress(job_id))
+            except JobServerError:
+                # Pruned by a concurrent submit
+                continue
+        return jobs
+
+    def cancel(self, user: str, job_id: int) -> Dict[str, Any]:
+        """Cancel a job of the user"""
+        progress = self.job_progress(job_id)
+        if progress['user'] != user:
+            raise JobServerError(403, "Only the job owner can cancel it")
+        self.scheduler.cancel_job(job_id)
+        return self.job_progress(job_id)
+
+    def job_errors(self, job_id: int) -> List[Dict[str, Any]]:
+        """Rejected-row summary of a job"""
+        job = self.scheduler.jobs.get(job_id)
+        if job is None:
+            raise JobServerError(404, f"Unknown job {job_id}")
+        return job.error_index.summary()
+
+    def iter_progress(self, job_id: int,
+                      interval: float = JOB_PROGRESS_INTERVAL) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Yield job progress whenever it changes until the job finishes
+
+        While nothing changes, None is yielded every interval as a heartbeat
+        (streamed as an empty line), so a client's read timeout only fires
+        when the server is really gone, not during a long quiet file.
+        """
+        last = None
+        sent_at = 0.0
+        while True:
+            progress = self.job_progress(job_id)
+            if progress != last:
+                yield progress
+                last = progress
+                sent_at = time.monotonic()
+            elif time.monotonic() - sent_at >= interval:
+                yield None
+                sent_at = time.monotonic()
+            if progress['status'] in FINISHED_STATUSES:
+                return
+            with self.scheduler.condition:
+                self.scheduler.condition.wait(timeout=interval)
+
+
+def _make_handler(server: JobServer):
+    """Build the request handler class bound to a JobServer"""
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        server_version = "MMLJobServer/1.0"
+
+        def log_message(self, format, *args):
+            server.logger.debug("%s - %s" % (self.address_string(), format % args))
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+        def do_DELETE(self):
+            self._dispatch('DELETE')
+
+        def _dispatch(self, method: str):
+            parts = [part for part in self.path.split('?')[0].split('/') if part]
+            try:
+                if method == 'POST' and parts == ['login']:
+                    body = self._read_json()
+                    return self._send(200, server.login(body.get('username', ''), body.get('password', '')))
+
+                token = self.headers.get('Authorization', '').replace('Bearer ', '', 1).strip()
+                user = server.authenticate(token).current_user
+                if method == 'POST' and parts == ['logout']:
+                    server.logout(token)
+                    return self._send(200, {'user': user})
+                if parts == ['jobs'] and method == 'GET':
+                    return self._send(200, server.list_jobs())
+                if parts == ['jobs'] and method == 'POST':
+                    body = self._read_json()
+                    return self._send(201, server.submit(user, body.get('folder', ''),
+                                                         body.get('priority', 1), body.get('name')))
+                if len(parts) >= 2 and parts[0] == 'jobs' and parts[1].isdigit():
+                    job_id = int(parts[1])
+                    action = parts[2] if len(parts) > 2 else None
+                    if method == 'GET' and action is None:
+                        return self._send(200, server.job_progress(job_id))
+                    if method == 'DELETE' and action is None:
+                        return self._send(200, server.cancel(user, job_id))
+                    if method == 'GET' and action == 'errors':
+                        return self._send(200, server.job_errors(job_id))
+                    if method == 'GET' and action == 'events':
+                        return self._stream(server.iter_progress(job_id))
+                raise JobServerError(404, f"No route for {method} {self.path}")
+            except JobServerError as e:
+                self._send(e.status, {'error': str(e)})
+            except (ValueError, TypeError) as e:
+                self._send(400, {'error': f"Bad request: {e}"})
+            except Exception as e:
+                server.logger.error(f"Job server error on {method} {self.path}: {e}")
+                self._send(500, {'error': str(e)})
+
+        def _read_json(self) -> Dict[str, Any]:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("JSON object expected")
+            return body
+
+        def _send(self, status: int, payload: Any):
+            data = json.dumps(payload, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, events: Iterator[Dict[str, Any]]):
+            # Validate the job before committing to a 200 response
+            first = next(events)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for progress in itertools.chain([first], events):
+                    # None is a heartbeat: an empty line the client skips
+                    line = b"" if progress is None else json.dumps(progress).encode('utf-8')
+                    self.wfile.write(line + b"\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return JobRequestHandler
+
+
+class JobClient:
+    """
+    Client for JobServer, used by the GUI and the CLI
+    """
+
+    def __init__(self, base_url: str = f"http://{JOB_SERVER_HOST}:{JOB_SERVER_PORT}",
+                 token: Optional[str] = None, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None):
+        """Open a request and return the response (raises JobServerError on HTTP errors)"""
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+        if self.token:
+            request.add_header('Authorization', f"Bearer {self.token}")
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise JobServerError(e.code, message)
+
+    def _call(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Any:
+        with self._request(method, path, payload) as response:
+            return json.loads(response.read())
+
+    def login(self, username: str, password: str) -> str:
+        """Log in and keep the session token"""
+        self.token = self._call('POST', '/login', {'username': username, 'password': password})['token']
+        return self.token
+
+    def logout(self):
+        """End the session"""
+        if self.token:
+            self._call('POST', '/logout')
+            self.token = None
+
+    def submit(self, folder: str, priority: int = 1, name: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a folder (path as seen by the server)"""
+        return self._call('POST', '/jobs', {'folder': folder, 'priority': priority, 'name': name})
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Progress of all jobs"""
+        return self._call('GET', '/jobs')
+
+    def get_job(self, job_id: int) -> Dict[str, Any]:
+        """Progress of one job"""
+        return self._call('GET', f"/jobs/{job_id}")
+
+    def cancel(self, job_id: int) -> Dict[str, Any]:
+        """Cancel one of your jobs"""
+        return self._call('DELETE', f"/jobs/{job_id}")
+
+    def get_errors(self, job_id: int) -> List[Dict[str, Any]]:
+        """Rejected-row summary of a job"""
+        return self._call('GET', f"/jobs/{job_id}/errors")
+
+    def stream(self, job_id: int) -> Iterator[Dict[str, Any]]:
+        """Yield job progress as the server streams it, until the job finishes (heartbeats skipped)"""
+        with self._request('GET', f"/jobs/{job_id}/events") as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
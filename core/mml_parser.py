@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MML Parser for MML to DB Uploader
+Parses Huawei MML report files (LST/DSP output) into column blocks
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import re
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+
+import pandas as pd
+
+from core.file_reader import iter_byte_lines, decode_field
+from core.parse_cache import get_parse_cache
+from core.commands import CommandSpec, get_spec, spec_for_file, NE_COLUMN, EXPORT_TIME_COLUMN
+
+# Import configuration
+try:
+    from config import PARSE_CHUNK_ROWS, PARSE_CACHE_ENABLED
+except ImportError:
+    PARSE_CHUNK_ROWS = 50000
+    PARSE_CACHE_ENABLED = True
+
+# Bumped whenever the parse output changes
+PARSER_VERSION = "2"
+
+# Column separator in fixed-width tables: two or more spaces
+_COLUMN_GAP = re.compile(rb'\S+(?: \S+)*')
+_KEY_VALUE = re.compile(rb'^\s*(.+?)\s+=\s+(.*?)\s*$')
+
+Block = Tuple[List[str], List[List[str]]]
+
+
+def normalize_column(name: str) -> str:
+    """
+    Convert an MML column title to a database column name
+
+    Args:
+        name: Column title such as 'Local Cell ID'
+
+    Returns:
+        str: Column name such as 'LocalCellId'
+    """
+    words = re.split(r'[^0-9A-Za-z]+', name)
+    return ''.join(word[:1].upper() + word[1:].lower() for word in words if word)
+
+
+class MMLParser:
+    """
+    Streaming parser for Huawei MML report files
+
+    Lines are parsed as bytes: report markers and table headers are ASCII in
+    every export, so only field values are decoded, and pure-ASCII values
+    take the fast ascii path. Tables are fixed-width; column boundaries come
+    from the header line. Single-record output (key = value lines) is
+    handled as well. With a CommandSpec, every chunk is cast to the
+    command's declared column types.
+    """
+
+    def __init__(self, encoding: str = 'ascii', spec: Optional[CommandSpec] = None):
+        self.encoding = encoding
+        self.spec = spec
+
+    def iter_blocks(self, lines: Iterator[bytes]) -> Iterator[Block]:
+        """
+        Parse report lines into column blocks (one per NE result table)
+
+        Args:
+            lines: Byte lines from iter_byte_lines()
+
+        Yields:
+            Tuple of (column names, rows); NE and ExportTime are appended
+        """
+        ne = ''
+        export_time = ''
+        retcode_ok = True
+        state = None           # None, 'header', 'table', 'vertical'
+        columns: List[str] = []
+        spans: List[Tuple[int, int]] = []
+        header_line = b''
+        rows: List[List[str]] = []
+        record: Dict[str, str] = {}
+
+        def flush() -> Optional[Block]:
+            if state == 'table' and rows:
+                return columns + [NE_COLUMN, EXPORT_TIME_COLUMN], rows
+            if state == 'vertical' and record:
+                return (list(record) + [NE_COLUMN, EXPORT_TIME_COLUMN],
+                        [list(record.values()) + [ne, export_time]])
+            return None
+
+        for line in lines:
+            stripped = line.strip()
+
+            if stripped.startswith(b'+++'):
+                parts = stripped.split()
+                ne = decode_field(parts[1], self.encoding) if len(parts) > 1 else ''
+                export_time = (b' '.join(parts[2:4]).decode('ascii', 'replace')
+                               if len(parts) > 3 else '')
+                retcode_ok = True
+                continue
+            if stripped.startswith(b'RETCODE'):
+                retcode_ok = stripped.split(b'=', 1)[-1].split()[0:1] == [b'0']
+                continue
+            if not retcode_ok:
+                continue
+
+            if stripped.startswith(b'(Number of results') or stripped.startswith(b'---    END'):
+                block = flush()
+                if block:
+                    yield block
+                state, rows, record = None, [], {}
+                continue
+            if stripped.startswith(b'To be continued') or stripped.startswith(b'%%'):
+                continue
+
+            if state is None:
+                if stripped and set(stripped) == {ord('-')}:
+                    state = 'header'
+                continue
+
+            if not stripped:
+                continue
+
+            if state == 'header':
+                match = _KEY_VALUE.match(line)
+                if match:
+                    state = 'vertical'
+                else:
+                    state = 'table'
+                    header_line = line.rstrip()
+                    spans = [m.span() for m in _COLUMN_GAP.finditer(header_line)]
+                    columns = [normalize_column(header_line[a:b].decode('ascii', 'replace'))
+                               for a, b in spans]
+                    continue
+
+            if state == 'vertical':
+                match = _KEY_VALUE.match(line)
+                if match:
+                    key = normalize_column(match.group(1).decode('ascii', 'replace'))
+                    record[key] = decode_field(match.group(2), self.encoding)
+                continue
+
+            # Table row; continued pages repeat the header
+            if line.rstrip() == header_line:
+                continue
+            row = self._split_row(line, spans)
+            row.extend((ne, export_time))
+            rows.append(row)
+
+        block = flush()
+        if block:
+            yield block
+
+    def _split_row(self, line: bytes, spans: List[Tuple[int, int]]) -> List[str]:
+        """
+        Slice a fixed-width row using header column starts
+
+        Args:
+            line: Raw row bytes
+            spans: Header column spans
+
+        Returns:
+            List of decoded field values
+        """
+        if not line.isascii():
+            # Multi-byte values may shift the layout; fall back to gap splitting
+            fields = re.split(rb'\s{2,}', line.strip())
+            if len(fields) == len(spans):
+                return [decode_field(field, self.encoding) for field in fields]
+
+        starts = [start for start, _ in spans] + [len(line)]
+        return [decode_field(line[starts[i]:starts[i + 1]].strip(), self.encoding)
+                for i in range(len(spans))]
+
+    def parse_file(self, path: str, chunk_rows: int = PARSE_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        Parse a file into DataFrame chunks
+
+        Args:
+            path: File path
+            chunk_rows: Approximate number of rows per DataFrame
+
+        Yields:
+            pd.DataFrame: Parsed rows (string columns unless typed by the spec)
+        """
+        frames: List[pd.DataFrame] = []
+        pending = 0
+        for columns, rows in self.iter_blocks(iter_byte_lines(path, self.encoding)):
+            frames.append(pd.DataFrame(rows, columns=columns, dtype=object))
+            pending += len(rows)
+            if pending >= chunk_rows:
+                yield self._typed(pd.concat(frames, ignore_index=True, sort=False))
+                frames, pending = [], 0
+        if frames:
+            yield self._typed(pd.concat(frames, ignore_index=True, sort=False))
+
+    def _typed(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Cast a chunk to the spec's column types"""
+        return self.spec.apply_types(frame) if self.spec is not None else frame
+
+
+def parse_file(file_info: Dict[str, Any], chunk_rows: int = PARSE_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Parse a detected file using its cached encoding and command spec
+
+    With PARSE_CACHE_ENABLED, files whose content was parsed before by the
+    same PARSER_VERSION and command spec are read back from the parse cache
+    instead.
+
+    Args:
+        file_info: File dict from detect_files()
+        chunk_rows: Approximate number of rows per DataFrame
+
+    Yields:
+        pd.DataFrame: Parsed rows
+    """
+    spec = get_spec(file_info['command']) if file_info.get('command') else spec_for_file(file_info['path'])
+    parser = MMLParser(file_info['encoding'], spec)
+    if not PARSE_CACHE_ENABLED:
+        return parser.parse_file(file_info['path'], chunk_rows)
+    cache = get_parse_cache()
+    key = cache.entry_key(file_info['path'], PARSER_VERSION, file_info['encoding'], chunk_rows,
+                          spec.fingerprint() if spec is not None else 'none')
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    return cache.parse_through(key, lambda: parser.parse_file(file_info['path'], chunk_rows))
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parse Cache for MML to DB Uploader
+Content-addressed on-disk cache of parsed DataFrame chunks
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Callable
+
+import pandas as pd
+
+from core.spill import SpilledFrame
+
+# Import configuration
+try:
+    from config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB, READ_CHUNK_BYTES
+except ImportError:
+    PARSE_CACHE_DIR = "parse_cache"
+    PARSE_CACHE_MAX_MB = 2048
+    READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Entries used this recently are never evicted (another worker may be reading them)
+EVICTION_GRACE_SECONDS = 300
+
+COMPLETE_MARKER = "complete"
+
+
+class ParseCache:
+    """
+    Parsed chunks stored per (file content hash, parser version, encoding, chunk size,
+    command spec)
+
+    Each entry is a directory of SpilledFrames (one per chunk, columnar
+    .npy files read back memory-mapped). Entries are written under a
+    unique temporary name and published with an atomic rename, so any
+    number of threads and processes can share the cache: readers only
+    ever see complete entries and a concurrent duplicate write is simply
+    discarded. Hits refresh the entry's mtime, which drives LRU eviction
+    once the cache grows past PARSE_CACHE_MAX_MB.
+    """
+
+    def __init__(self, directory: str = PARSE_CACHE_DIR, max_mb: int = PARSE_CACHE_MAX_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._hashes: Dict[Tuple[str, int, float], str] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(directory, exist_ok=True)
+
+    def content_hash(self, path: str) -> str:
+        """
+        SHA-256 of a file's content (memoized per path, size and mtime)
+
+        Args:
+            path: File path
+
+        Returns:
+            str: Hex digest
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            digest = self._hashes.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(READ_CHUNK_BYTES), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            with self._lock:
+                self._hashes[memo_key] = digest
+        return digest
+
+    def entry_key(self, path: str, version: str, encoding: str, chunk_rows: int,
+                  spec_fingerprint: str = 'none') -> str:
+        """
+        Cache key of a file's parse output
+
+        Args:
+            path: File path
+            version: Parser version
+            encoding: Encoding the file is parsed with
+            chunk_rows: Rows per parsed chunk
+            spec_fingerprint: CommandSpec.fingerprint() of the command (column
+                              types and keys), so spec edits never return stale chunks
+
+        Returns:
+            str: Entry name
+        """
+        return f"{self.content_hash(path)[:40]}-v{version}-{encoding}-{chunk_rows}-{spec_fingerprint}"
+
+    def get(self, key: str) -> Optional[Iterator[pd.DataFrame]]:
+        """
+        Look up an entry
+
+        Args:
+            key: Result of entry_key()
+
+        Returns:
+            Iterator over the cached chunks, or None on a miss
+        """
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, COMPLETE_MARKER), encoding='utf-8') as marker:
+                chunks = int(marker.read().split()[0])
+            os.utime(entry)
+        except (OSError, ValueError, IndexError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (SpilledFrame(os.path.join(entry, f"{index:05d}")).read() for index in range(chunks))
+
+    def parse_through(self, key: str, parse: Callable[[], Iterator[pd.DataFrame]]) -> Iterator[pd.DataFrame]:
+        """
+        Parse on a miss, yielding chunks while writing them to the cache
+
+        The entry is published only if the parse runs to the end; a consumer
+        that stops early leaves nothing behind.
+
+        Args:
+            key: Result of entry_key()
+            parse: Callable returning the parsed chunks
+
+        Yields:
+            pd.DataFrame: Parsed chunks
+        """
+        temporary = os.path.join(self.directory, f".tmp-{key}-{uuid.uuid4().hex}")
+        size = 0
+        chunks = 0
+        try:
+            for frame in parse():
+                SpilledFrame.write(frame, os.path.join(temporary, f"{chunks:05d}"))
+                chunks += 1
+                yield frame
+            os.makedirs(temporary, exist_ok=True)
+            size = _directory_size(temporary)
+            with open(os.path.join(temporary, COMPLETE_MARKER), 'w', encoding='utf-8') as marker:
+                marker.write(f"{chunks} {size}\n")
+            try:
+                os.replace(temporary, os.path.join(self.directory, key))
+            except OSError:
+                # Another worker published the same entry first
+                pass
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+        if size:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits PARSE_CACHE_MAX_MB"""
+        entries: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            try:
+                with open(os.path.join(entry, COMPLETE_MARKER), encoding='utf-8') as marker:
+                    size = int(marker.read().split()[1])
+                entries.append((os.stat(entry).st_mtime, size, name))
+            except (OSError, ValueError, IndexError):
+                continue
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if now - mtime < EVICTION_GRACE_SECONDS:
+                break
+            # Rename first so readers never see a half-deleted entry
+            trash = os.path.join(self.directory, f".trash-{name}-{uuid.uuid4().hex}")
+            try:
+                os.replace(os.path.join(self.directory, name), trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+            self.logger.info(f"Evicted parse cache entry {name} ({size / 1048576:.1f} MB)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dict containing hit/miss counts
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def _directory_size(path: str) -> int:
+    """Total size of the files below a directory"""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+_default_cache: Optional[ParseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_parse_cache() -> ParseCache:
+    """
+    Get the process-wide parse cache
+
+    Returns:
+        ParseCache: Cache in PARSE_CACHE_DIR
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ParseCache()
+        return _default_cache
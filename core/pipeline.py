@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Upload Pipeline for MML to DB Uploader
+Connects file detection, parsing and database upload
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Callable, ContextManager, Iterable, Iterator
+
+import pandas as pd
+
+from core.commands import CommandSpec, get_spec, spec_for_file, spec_for_table, base_spec
+from core.file_reader import describe_file
+from core.mml_parser import parse_file
+from core.dedup import KeyDeduplicator
+from core.spill import MemoryBudget, get_memory_budget
+from core.enrichment import enrich_cells, ENRICHED_TABLE
+from core.vswr_history import VswrHistoryStore
+from core.validation import FrameValidator
+from core.ret_changes import RetChangeTracker, ensure_change_log, CHANGE_LOG_TABLE
+
+# Import configuration
+try:
+    from config import (LOAD_MODE, DEDUP_ENABLED, ENRICHMENT_ENABLED, VSWR_HISTORY_ENABLED,
+                        RET_CHANGE_TRACKING, VALIDATION_ENABLED, AUTO_CREATE_TABLES)
+except ImportError:
+    LOAD_MODE = "upsert"
+    DEDUP_ENABLED = True
+    ENRICHMENT_ENABLED = True
+    VSWR_HISTORY_ENABLED = True
+    RET_CHANGE_TRACKING = True
+    VALIDATION_ENABLED = True
+    AUTO_CREATE_TABLES = True
+
+
+def command_for_file(name: str) -> Optional[str]:
+    """
+    Get the MML command of a file name
+
+    Args:
+        name: File name (or path)
+
+    Returns:
+        str: Command name, or None if the file is not a supported type
+    """
+    spec = spec_for_file(name)
+    return spec.command if spec else None
+
+
+def load_mode_for(spec: Optional[CommandSpec], mode: str) -> str:
+    """
+    Get the effective load mode of a command
+
+    'history' and 'changes' commands fall back to the requested mode when
+    their feature (VSWR_HISTORY_ENABLED / RET_CHANGE_TRACKING) is off;
+    change tracking does not apply to snapshot loads.
+
+    Args:
+        spec: Command spec (None for derived tables such as the enriched cells)
+        mode: Requested load mode
+
+    Returns:
+        str: 'history', 'changes' or the requested mode
+    """
+    if spec is not None and spec.load_mode == 'history' and VSWR_HISTORY_ENABLED:
+        return 'history'
+    if spec is not None and spec.load_mode == 'changes' and RET_CHANGE_TRACKING and mode != 'snapshot':
+        return 'changes'
+    return mode
+
+
+def frame_to_rows(frame: pd.DataFrame) -> Tuple[List[str], List[Tuple]]:
+    """
+    Convert a DataFrame to column names and DB-ready tuples (NaN -> None)
+
+    Args:
+        frame: Parsed data
+
+    Returns:
+        Tuple of (columns, rows)
+    """
+    frame = frame.astype(object).where(frame.notna(), None)
+    return list(frame.columns), list(frame.itertuples(index=False, name=None))
+
+
+class UploadPipeline:
+    """
+    Parses MML files and uploads them through a DatabaseManager (or an OutputSink)
+    """
+
+    def __init__(self, db_manager, error_index=None,
+                 log_callback: Optional[Callable[[str], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 write_guard: Optional[Callable[[str], ContextManager]] = None,
+                 budget: Optional[MemoryBudget] = None):
+        self.db_manager = db_manager
+        self.error_index = error_index
+        self.log_callback = log_callback
+        self.should_stop = should_stop or (lambda: False)
+        self.write_guard = write_guard or self._default_write_guard
+        self.budget = budget or get_memory_budget()
+        self.duplicates_dropped = 0
+        self.vswr_stores: Dict[int, VswrHistoryStore] = {}
+        self.ret_tracker: Optional[RetChangeTracker] = None
+        self.validator = FrameValidator(error_index) if VALIDATION_ENABLED else None
+        self.logger = logging.getLogger(__name__)
+
+    @contextmanager
+    def _default_write_guard(self, table_name: str):
+        """Write directly through the pipeline's own DatabaseManager"""
+        yield self.db_manager
+
+    def upload(self, table_name: str, frame: pd.DataFrame, mode: str) -> bool:
+        """
+        Upload a parsed chunk inside the write guard of the table
+
+        The guard yields the target to write to: a DatabaseManager (the
+        scheduler's guard borrows a pooled connection and holds the table's
+        write lock) or an offline OutputSink, which takes the DataFrame as is.
+        The table's command spec selects the load: 'history' commands (DSP
+        VSWR) are appended to the VSWR history store instead of upserted,
+        'changes' commands (DSP RETSUBUNIT) write only changed rows. With
+        AUTO_CREATE_TABLES, missing tables and columns are created first.
+
+        Returns:
+            bool: True if the upload succeeded
+        """
+        spec = spec_for_table(table_name)
+        with self.write_guard(table_name) as target:
+            if hasattr(target, 'write_frame'):
+                return target.write_frame(table_name, frame, mode)
+            load_mode = load_mode_for(spec, mode)
+            if load_mode == 'history':
+                return self._append_vswr_history(target, frame)
+            if not self._ensure_table(target, table_name, spec, frame):
+                return False
+            if load_mode == 'changes':
+                return self._upload_ret_changes(target, table_name, frame, mode)
+            columns, rows = frame_to_rows(frame)
+            return target.upload_table(table_name, columns, rows, mode, self.error_index)
+
+    @staticmethod
+    def _ensure_table(target, table_name: str, spec: Optional[CommandSpec],
+                      frame: pd.DataFrame) -> bool:
+        """Create the target table (or its new columns) from the command spec"""
+        if not AUTO_CREATE_TABLES:
+            return True
+        if spec is None and table_name == ENRICHED_TABLE:
+            # Enriched cells are keyed like the base command
+            spec = base_spec()
+        if spec is None:
+            return True
+        return target.ensure_table(table_name, spec.sql_types(frame.columns), spec.primary_key)
+
+    def _append_vswr_history(self, target, frame: pd.DataFrame) -> bool:
+        """Append a DSP VSWR chunk to the history store of the target connection"""
+        store = self.vswr_stores.get(id(target))
+        if store is None:
+            store = self.vswr_stores[id(target)] = VswrHistoryStore(target, self.error_index)
+        try:
+            store.append(frame)
+        except (ValueError, RuntimeError) as e:
+            self.logger.error(f"VSWR history append failed: {e}")
+            return False
+        return True
+
+    def _upload_ret_changes(self, target, table_name: str, frame: pd.DataFrame, mode: str) -> bool:
+        """Upsert changed RET subunits and log their old/new values"""
+        if self.ret_tracker is None:
+            self.ret_tracker = RetChangeTracker()
+        rows, changes, states = self.ret_tracker.diff(frame)
+        if rows.empty:
+            return True
+        if not changes.empty:
+            if not ensure_change_log(target):
+                return False
+            columns, data = frame_to_rows(changes)
+            query = target._build_insert_query(CHANGE_LOG_TABLE, columns, upsert=False)
+            if not target.execute_batches(query.replace("INSERT INTO", "INSERT IGNORE INTO", 1),
+                                          data, CHANGE_LOG_TABLE):
+                return False
+        columns, data = frame_to_rows(rows)
+        if not target.upload_table(table_name, columns, data, mode, self.error_index):
+            return False
+        self.ret_tracker.commit(states)
+        self.log(f"🔧 {table_name}: {len(rows)} of {len(frame)} subunits changed or new, "
+                 f"{len(changes)} values logged")
+        return True
+
+    def validate(self, command: str, frame: pd.DataFrame) -> pd.DataFrame:
+        """Drop rows failing validation (rejects go to the error index)"""
+        if self.validator is None:
+            return frame
+        return self.validator.validate(command, frame)
+
+    def log(self, message: str):
+        """Send a progress message to the log callback (or the logger)"""
+        if self.log_callback:
+            self.log_callback(message)
+        else:
+            self.logger.info(message)
+
+    def process_file(self, file_info: Dict[str, Any], mode: str = 'upsert',
+                     frames: Optional[Iterable[pd.DataFrame]] = None) -> int:
+        """
+        Parse one file and upload it chunk by chunk
+
+        Args:
+            file_info: File dict from detect_files()/describe_file()
+            mode: Load mode passed to DatabaseManager.upload_table
+            frames: Pre-processed chunks of the file, already validated
+                    (defaults to parsing and validating it)
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        spec = spec_for_file(file_info['name'])
+        if spec is None:
+            raise ValueError(f"Unsupported file type: {file_info['name']}")
+        command, table_name = spec.command, spec.table
+
+        validate = frames is None
+        uploaded = 0
+        for frame in (parse_file(file_info) if frames is None else frames):
+            if self.should_stop():
+                break
+            if validate:
+                frame = self.validate(command, frame)
+            if frame.empty:
+                continue
+            if not self.upload(table_name, frame, mode):
+                raise RuntimeError(f"Upload of {file_info['name']} into {table_name} failed")
+            uploaded += len(frame)
+        self.log(f"✅ {file_info['name']}: {uploaded} rows → {table_name}")
+        return uploaded
+
+    def process_path(self, path: str) -> int:
+        """
+        Detect and process a single file path (used by the watch daemon)
+
+        Files arrive one at a time, in any order, so there is no cross-file
+        de-dup: the 'newest' upsert keeps stored rows whose ExportTime is
+        newer, and a late older export cannot overwrite them.
+
+        Args:
+            path: File path
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        return self.process_file(describe_file(path), mode='newest')
+
+    def process_command(self, command: str, files: List[Dict[str, Any]],
+                        mode: Optional[str] = None) -> int:
+        """
+        Process all files of one command
+
+        In snapshot mode all files of the command are streamed into a single
+        snapshot, since each snapshot load replaces the table.
+
+        Args:
+            command: MML command name
+            files: File dicts of the command
+            mode: Load mode (defaults to LOAD_MODE)
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        mode = (mode or LOAD_MODE).lower()
+        spec = get_spec(command)
+        if spec is None:
+            raise ValueError(f"Unsupported command: {command}")
+        load_mode = load_mode_for(spec, mode)
+        if load_mode == 'history':
+            # History is append-only: every export is kept, so no de-dup or snapshot
+            return sum(self.process_file(file_info, mode) for file_info in files
+                       if not self.should_stop())
+        if load_mode == 'changes':
+            # Every export is diffed in order, so intermediate changes are logged too
+            ordered = sorted(files, key=lambda file_info: file_info.get('mtime', 0))
+            return sum(self.process_file(file_info, mode) for file_info in ordered
+                       if not self.should_stop())
+        key_columns = spec.primary_key if DEDUP_ENABLED else None
+        if mode == 'snapshot':
+            return self._process_snapshot(spec, files, key_columns)
+        if key_columns:
+            return self._process_deduplicated(files, mode, key_columns)
+        return sum(self.process_file(file_info, mode) for file_info in files
+                   if not self.should_stop())
+
+    def _process_snapshot(self, spec: CommandSpec, files: List[Dict[str, Any]],
+                          key_columns: Optional[List[str]]) -> int:
+        """
+        Replace a command's table with all its files, streamed chunk by chunk
+
+        Chunks are validated, de-duplicated with the same two-pass key index
+        as upserts and appended to the snapshot's staging table, so memory
+        stays bounded by one chunk however large the snapshot is. The table's
+        write guard is held for the whole load.
+
+        Returns:
+            int: Number of rows loaded
+        """
+        command, table_name = spec.command, spec.table
+        dedup = KeyDeduplicator(key_columns, budget=self.budget) if key_columns else None
+        try:
+            if dedup is not None and not self._observe_files(command, files, dedup):
+                return 0
+            loaded = self._load_snapshot(spec, self._iter_snapshot_frames(command, files, dedup))
+            if dedup is not None:
+                self._report_duplicates(command, dedup.duplicates_dropped)
+        finally:
+            if dedup is not None:
+                dedup.close()
+        if loaded:
+            self.log(f"✅ {command}: {loaded} rows → {table_name} (snapshot)")
+        return loaded
+
+    def _observe_files(self, command: str, files: List[Dict[str, Any]],
+                       dedup: KeyDeduplicator) -> bool:
+        """
+        De-dup pass 1: validate every file and record the newest version of each key
+
+        Only rows passing validation compete, so an invalid newer row never
+        hides a valid older version of its key.
+
+        Returns:
+            bool: False if stopped
+        """
+        for index, file_info in enumerate(files):
+            first_row = 0
+            for frame in parse_file(file_info):
+                if self.should_stop():
+                    return False
+                valid = self.validate(command, frame)
+                rows = first_row + frame.index.get_indexer(valid.index)
+                dedup.observe(valid, index, first_row, rows)
+                first_row += len(frame)
+        return True
+
+    def _iter_snapshot_frames(self, command: str, files: List[Dict[str, Any]],
+                              dedup: Optional[KeyDeduplicator]) -> Iterator[pd.DataFrame]:
+        """Yield the validated (and de-duplicated) chunks of a snapshot"""
+        for index, file_info in enumerate(files):
+            if dedup is None:
+                for frame in parse_file(file_info):
+                    yield self.validate(command, frame)
+            else:
+                # Winning rows passed validation in pass 1
+                yield from self._winning_frames(file_info, dedup, dedup.winning_rows(index))
+
+    def _load_snapshot(self, spec: CommandSpec, frames: Iterable[pd.DataFrame]) -> int:
+        """
+        Stream chunks into a snapshot of the command's table and swap it in
+
+        Returns:
+            int: Number of rows loaded (0 if stopped or empty; the live table is then untouched)
+        """
+        table_name = spec.table
+        loaded = 0
+        with self.write_guard(table_name) as target:
+            if hasattr(target, 'write_frame'):
+                for frame in frames:
+                    if self.should_stop():
+                        break
+                    if frame.empty:
+                        continue
+                    if not target.write_frame(table_name, frame, 'snapshot'):
+                        raise RuntimeError(f"Snapshot export of {spec.command} into {table_name} failed")
+                    loaded += len(frame)
+                return loaded
+
+            indexes = None
+            staging_table = target.snapshot_staging_table(table_name)
+            try:
+                for frame in frames:
+                    if self.should_stop():
+                        break
+                    if frame.empty:
+                        continue
+                    if indexes is None:
+                        if not self._ensure_table(target, table_name, spec, frame):
+                            raise RuntimeError(f"Unable to create {table_name}")
+                        indexes = target.begin_snapshot(table_name)
+                        if indexes is None:
+                            raise RuntimeError(f"Unable to start snapshot of {table_name}")
+                    # Columns first seen in a later chunk are added to the staging table
+                    if not self._ensure_table(target, staging_table, spec, frame):
+                        raise RuntimeError(f"Unable to add columns to {staging_table}")
+                    columns, rows = frame_to_rows(frame)
+                    if not target.append_snapshot(table_name, columns, rows, self.error_index):
+                        raise RuntimeError(f"Snapshot load of {spec.command} into {table_name} failed")
+                    loaded += len(frame)
+                if indexes is None:
+                    return 0
+                if self.should_stop():
+                    target.abort_snapshot(table_name)
+                    return 0
+                if not target.finish_snapshot(table_name, indexes):
+                    raise RuntimeError(f"Snapshot swap of {spec.command} into {table_name} failed")
+            except Exception:
+                if indexes is not None:
+                    target.abort_snapshot(table_name)
+                raise
+        return loaded
+
+    def _process_deduplicated(self, files: List[Dict[str, Any]], mode: str,
+                              key_columns: List[str]) -> int:
+        """
+        Upload files keeping only the newest row of each primary key
+
+        Pass 1 streams and validates all files to find the newest valid
+        version of every key, pass 2 re-streams them and uploads only the
+        winning rows.
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        command = command_for_file(files[0]['name'])
+        dedup = KeyDeduplicator(key_columns, budget=self.budget)
+        try:
+            if not self._observe_files(command, files, dedup):
+                return 0
+
+            uploaded = 0
+            for index, file_info in enumerate(files):
+                if self.should_stop():
+                    break
+                # Winning rows passed validation in pass 1
+                frames = self._winning_frames(file_info, dedup, dedup.winning_rows(index))
+                uploaded += self.process_file(file_info, mode, frames)
+            self._report_duplicates(command, dedup.duplicates_dropped)
+            return uploaded
+        finally:
+            dedup.close()
+
+    @staticmethod
+    def _winning_frames(file_info: Dict[str, Any], dedup: KeyDeduplicator,
+                        winning_rows) -> Iterator[pd.DataFrame]:
+        """Re-parse a file and yield only the rows that won de-duplication"""
+        first_row = 0
+        for frame in parse_file(file_info):
+            yield dedup.filter(frame, first_row, winning_rows)
+            first_row += len(frame)
+
+    def _report_duplicates(self, command: Optional[str], dropped: int):
+        """Count and log rows dropped as older duplicates"""
+        self.duplicates_dropped += dropped
+        if dropped:
+            self.log(f"🧹 {command}: {dropped} duplicate rows dropped (newer version kept)")
+
+    def process_detected(self, detected: Dict[str, List[Dict[str, Any]]],
+                         mode: Optional[str] = None) -> int:
+        """
+        Process every detected command
+
+        Args:
+            detected: Result of detect_files()
+            mode: Load mode (defaults to LOAD_MODE)
+
+        Returns:
+            int: Total number of rows uploaded
+        """
+        total = 0
+        for command, files in detected.items():
+            if files and not self.should_stop():
+                self.log(f"Processing {command} ({len(files)} files)...")
+                total += self.process_command(command, files, mode)
+        if ENRICHMENT_ENABLED and not self.should_stop():
+            total += self.process_enrichment(detected)
+        if self.validator is not None and self.validator.rows_rejected:
+            stats = self.validator.get_stats()
+            self.log(f"⚠️ Validation rejected {stats['rows_rejected']} of {stats['rows_checked']} rows "
+                     f"({stats['seconds']:.1f}s)")
+        return total
+
+    def process_enrichment(self, detected: Dict[str, List[Dict[str, Any]]]) -> int:
+        """
+        Build and upload the enriched cell table within the memory budget
+
+        Args:
+            detected: Result of detect_files()
+
+        Returns:
+            int: Number of enriched rows uploaded
+        """
+        # Rows rejected by validation must not reach the enriched table either
+        enricher = enrich_cells(detected, self.budget, validator=self.validator)
+        if enricher is None:
+            return 0
+        self.log(f"Enriching {base_spec().command}...")
+        uploaded = 0
+        try:
+            for frame in enricher.iter_enriched():
+                if self.should_stop():
+                    break
+                if frame.empty:
+                    continue
+                if not self.upload(ENRICHED_TABLE, frame, 'upsert'):
+                    raise RuntimeError(f"Upload into {ENRICHED_TABLE} failed")
+                uploaded += len(frame)
+        finally:
+            enricher.close()
+        self.log(f"✅ Enriched cells: {uploaded} rows → {ENRICHED_TABLE}")
+        return uploaded
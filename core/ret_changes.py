@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RET Change Tracking for MML to DB Uploader
+Writes only changed DSP RETSUBUNIT rows, with an old/new value change log
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from contextlib import closing
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.commands import get_spec, EXPORT_TIME_COLUMN
+from core.dedup import hash_keys
+
+# Import configuration
+try:
+    from config import RET_STATE_PATH
+except ImportError:
+    RET_STATE_PATH = "ret_state.sqlite3"
+
+RET_COMMAND = 'DSP RETSUBUNIT'
+CHANGE_LOG_TABLE = 'ret_change_log'
+SUBUNIT_COLUMNS = get_spec(RET_COMMAND).primary_key
+CHANGE_LOG_COLUMNS = SUBUNIT_COLUMNS + [EXPORT_TIME_COLUMN, 'PreviousExportTime',
+                                        'ColumnName', 'OldValue', 'NewValue']
+
+# SQLite allows 999 bound parameters per statement
+LOOKUP_BATCH = 900
+
+
+def _as_text(values: np.ndarray) -> np.ndarray:
+    """Normalize cell values to str (None for missing) for comparison and logging"""
+    return np.array([[None if pd.isna(value) else str(value) for value in row] for row in values],
+                    dtype=object).reshape(values.shape)
+
+
+class RetStateIndex:
+    """
+    Last known state of every RET subunit, kept in a local SQLite file
+
+    One row per (NE, DeviceNo, SubunitNo) digest: the 64-bit digest of the
+    subunit's values, its export time and the values themselves (a JSON
+    object keyed by column name, for the old side of the change log).
+    Connections are opened per call with a busy timeout, so scheduler
+    workers and separate processes can share it.
+    """
+
+    def __init__(self, path: str = RET_STATE_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS state (key INTEGER PRIMARY KEY, "
+                               "digest INTEGER, export_time TEXT, payload TEXT)")
+            connection.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def lookup(self, keys: np.ndarray) -> pd.DataFrame:
+        """
+        Get the stored state of subunits
+
+        Args:
+            keys: Subunit key digests
+
+        Returns:
+            pd.DataFrame: Columns key, digest, export_time, payload (known keys only)
+        """
+        keys = [int(key) for key in keys]
+        rows = []
+        with closing(self._connect()) as connection:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                rows.extend(connection.execute(
+                    f"SELECT key, digest, export_time, payload FROM state "
+                    f"WHERE key IN ({', '.join('?' * len(batch))})", batch))
+        return pd.DataFrame(rows, columns=['key', 'digest', 'export_time', 'payload'])
+
+    def store(self, states: List[Tuple[int, int, str, str]]):
+        """
+        Save new subunit states (call only after the DB write succeeded)
+
+        Args:
+            states: (key, digest, export time, payload) tuples
+        """
+        with closing(self._connect()) as connection:
+            connection.executemany("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)", states)
+            connection.commit()
+
+
+class RetChangeTracker:
+    """
+    Splits DSP RETSUBUNIT chunks into changed rows and change-log entries
+
+    Rows are compared by value digest, vectorized: within a chunk against
+    the previous export of the same subunit, and for a subunit's first row
+    in the chunk against the state index. Unchanged rows and rows older
+    than the known state are dropped before anything reaches the database.
+    Subunits seen for the first time are written as current state but not
+    logged, so the first run does not flood the change log.
+    """
+
+    def __init__(self, path: str = RET_STATE_PATH):
+        self.index = RetStateIndex(path)
+        self.logger = logging.getLogger(__name__)
+
+    def diff(self, frame: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, List[Tuple]]:
+        """
+        Compare a chunk with the last known state
+
+        Args:
+            frame: Parsed DSP RETSUBUNIT rows
+
+        Returns:
+            Tuple of (rows to upsert, change-log rows, pending states for commit())
+        """
+        value_columns = [c for c in frame.columns if c not in SUBUNIT_COLUMNS and c != EXPORT_TIME_COLUMN]
+        work = frame.reset_index(drop=True)
+        work['_key'] = hash_keys(work, SUBUNIT_COLUMNS)
+        work['_digest'] = hash_keys(work, value_columns)
+        work['_ts'] = work[EXPORT_TIME_COLUMN].fillna('').astype(str)
+        work = work.sort_values(['_key', '_ts'], kind='mergesort').reset_index(drop=True)
+
+        # object dtype keeps the 64-bit digests exact next to missing values (and
+        # stops set_index from turning two evenly spaced keys into an overflowing RangeIndex)
+        stored = self.index.lookup(work['_key'].unique()).astype(object).set_index('key')
+        stored_ts = work['_key'].map(stored['export_time'])
+        work = work[stored_ts.isna().to_numpy() | (work['_ts'] > stored_ts.fillna('')).to_numpy()]
+        work = work.reset_index(drop=True)
+        if work.empty:
+            return work, pd.DataFrame(columns=CHANGE_LOG_COLUMNS), []
+
+        # Previous version of each row: the row before it, or the stored state
+        keys = work['_key'].to_numpy()
+        first = np.r_[True, keys[1:] != keys[:-1]]
+        previous_digest = np.r_[[None], work['_digest'].to_numpy(dtype=object)[:-1]]
+        previous_digest[first] = work.loc[first, '_key'].map(stored['digest']).to_numpy()
+        previous_ts = np.r_[[None], work['_ts'].to_numpy(dtype=object)[:-1]]
+        previous_ts[first] = work.loc[first, '_key'].map(stored['export_time']).to_numpy()
+        known = pd.notna(previous_digest)
+        changed = known & (previous_digest != work['_digest'].to_numpy())
+        new = ~known
+
+        changes = self._change_rows(work, changed, first, stored, value_columns, previous_ts)
+        # Newest row per written subunit becomes its current state
+        written = work[changed | new]
+        latest = written.drop_duplicates('_key', keep='last')
+        payloads = latest[value_columns].astype(object).where(latest[value_columns].notna(), None)
+        states = [(int(key), int(digest), ts, json.dumps(dict(zip(value_columns, values))))
+                  for key, digest, ts, values in zip(latest['_key'], latest['_digest'], latest['_ts'],
+                                                     payloads.values.tolist())]
+        rows = latest.drop(columns=['_key', '_digest', '_ts'])
+        return rows, changes, states
+
+    def _change_rows(self, work: pd.DataFrame, changed: np.ndarray, first: np.ndarray,
+                     stored: pd.DataFrame, value_columns: List[str],
+                     previous_ts: np.ndarray) -> pd.DataFrame:
+        """
+        Build one change-log row per changed value of every changed row
+
+        Values are compared by column name. A column present on only one
+        side (added or dropped by a newer NE version) is not a value change
+        and is not logged; the row is still written with its new columns.
+        """
+        if not changed.any():
+            return pd.DataFrame(columns=CHANGE_LOG_COLUMNS)
+        # Rows are sorted by subunit, so the previous row holds the previous version
+        previous = work[value_columns].to_numpy(dtype=object)
+        previous = np.vstack([np.full((1, len(value_columns)), None, dtype=object), previous[:-1]])
+        comparable = np.ones(previous.shape, dtype=bool)
+        for position in np.flatnonzero(changed & first):
+            payload = json.loads(stored.at[work.at[position, '_key'], 'payload'])
+            if not isinstance(payload, dict):
+                # Positional payload of an older state file: column names unknown
+                payload = {}
+            previous[position] = [payload.get(column) for column in value_columns]
+            comparable[position] = [column in payload for column in value_columns]
+
+        comparable = comparable[changed]
+        old = _as_text(previous[changed])
+        new = _as_text(work.loc[changed, value_columns].to_numpy(dtype=object))
+        base = work.loc[changed, SUBUNIT_COLUMNS + [EXPORT_TIME_COLUMN]].reset_index(drop=True)
+        base['PreviousExportTime'] = previous_ts[changed]
+        entries = []
+        for index, column in enumerate(value_columns):
+            differs = comparable[:, index] & (old[:, index] != new[:, index])
+            if not differs.any():
+                continue
+            part = base[differs].copy()
+            part['ColumnName'] = column
+            part['OldValue'] = old[differs, index]
+            part['NewValue'] = new[differs, index]
+            entries.append(part)
+        if not entries:
+            return pd.DataFrame(columns=CHANGE_LOG_COLUMNS)
+        return pd.concat(entries, ignore_index=True)[CHANGE_LOG_COLUMNS]
+
+    def commit(self, states: List[Tuple]):
+        """Record states once their rows are in the database"""
+        if states:
+            self.index.store(states)
+
+
+def ensure_change_log(db_manager) -> bool:
+    """
+    Create the RET change-log table if needed
+
+    Args:
+        db_manager: Connected DatabaseManager
+
+    Returns:
+        bool: True if the table exists
+    """
+    q = db_manager._quote_identifier
+    key_types = get_spec(RET_COMMAND).sql_types(SUBUNIT_COLUMNS)
+    keys = ", ".join(f"{q(c)} {sql_type} NOT NULL" for c, sql_type in key_types.items())
+    key_list = ", ".join(q(c) for c in SUBUNIT_COLUMNS + [EXPORT_TIME_COLUMN, 'ColumnName'])
+    return db_manager.execute_query(
+        f"CREATE TABLE IF NOT EXISTS {q(CHANGE_LOG_TABLE)} ({keys}, "
+        f"{q(EXPORT_TIME_COLUMN)} DATETIME NOT NULL, {q('PreviousExportTime')} DATETIME NULL, "
+        f"{q('ColumnName')} VARCHAR(64) NOT NULL, {q('OldValue')} VARCHAR(255) NULL, "
+        f"{q('NewValue')} VARCHAR(255) NULL, PRIMARY KEY ({key_list}), "
+        f"KEY idx_export_time ({q(EXPORT_TIME_COLUMN)}))") is not None
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Upload Scheduler for MML to DB Uploader
+Runs many source folders (jobs) on one shared worker pool and connection budget
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+
+from core.commands import base_spec, iter_specs
+from core.database import ConnectionPool, DatabaseManager
+from core.error_report import SiteErrorIndex
+from core.file_reader import detect_files
+from core.pipeline import UploadPipeline
+from core.spill import MemoryBudget, get_memory_budget
+
+# Import configuration
+try:
+    from config import MAX_WORKERS, DB_CONNECTION_BUDGET, ENRICHMENT_ENABLED, JOB_RETENTION_SECONDS
+except ImportError:
+    MAX_WORKERS = 4
+    DB_CONNECTION_BUDGET = 4
+    ENRICHMENT_ENABLED = True
+    JOB_RETENTION_SECONDS = 3600
+
+
+class TableLockRegistry:
+    """
+    One write lock per table
+
+    Writers to the same table are serialized (concurrent upserts into one
+    table are the main source of deadlocks); different tables are written
+    in parallel.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def get(self, table_name: str) -> threading.Lock:
+        """Get the lock of a table"""
+        with self._guard:
+            return self._locks.setdefault(table_name, threading.Lock())
+
+    @contextmanager
+    def locked(self, table_name: str) -> Iterator[None]:
+        """Hold the write lock of a table"""
+        with self.get(table_name):
+            yield
+
+
+class UploadJob:
+    """
+    One source folder (e.g. one regional OSS export) scheduled for upload
+
+    A job is run as one work unit per command (all files of the command go
+    through UploadPipeline.process_command, so de-dup, snapshots and the
+    ordered RET diff see every file of the command) followed by one cell
+    enrichment unit once all its commands have finished.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, folder: str, priority: int = 1, name: Optional[str] = None):
+        self.id = next(self._ids)
+        self.folder = folder
+        self.name = name or os.path.basename(os.path.normpath(folder))
+        self.priority = max(1, int(priority))
+        self.status = 'queued'
+        self.detected: Dict[str, List[Dict[str, Any]]] = {}
+        self.pending: List[Tuple[str, List[Dict[str, Any]]]] = []
+        self.enrichment_pending = False
+        self.enrichment_bytes = 0
+        self.files_total = 0
+        self.files_done = 0
+        self.files_failed = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.rows = 0
+        self.running = 0
+        self.virtual_time = 0.0
+        self.errors: List[str] = []
+        self.error_index = SiteErrorIndex()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def get_progress(self) -> Dict[str, Any]:
+        """
+        Get job progress
+
+        Returns:
+            Dict containing counts, percentage and throughput
+        """
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            'id': self.id,
+            'name': self.name,
+            'folder': self.folder,
+            'priority': self.priority,
+            'status': self.status,
+            'files_total': self.files_total,
+            'files_done': self.files_done,
+            'files_failed': self.files_failed,
+            'percent': 100.0 * self.bytes_done / self.bytes_total if self.bytes_total else 100.0,
+            'rows': self.rows,
+            'rows_per_second': self.rows / elapsed if elapsed else 0.0,
+            'rejected_rows': self.error_index.total_errors,
+            'errors': list(self.errors[-5:])
+        }
+
+
+class UploadScheduler:
+    """
+    Shares one worker pool and one DB connection budget across many jobs
+
+    Commands are dispatched with stride scheduling: each job advances a
+    virtual clock by the size of a command's files / priority whenever
+    one of its commands is started, and the job with the smallest clock
+    goes next. Jobs therefore get worker time in proportion to their
+    priority, and a huge folder cannot starve a small one. Table writes
+    are serialized per table, and all workers share one memory budget.
+    Jobs finished longer than the retention period ago are forgotten when
+    a new job is added, so a long-running scheduler does not keep every
+    job's progress and error index forever.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS,
+                 connection_budget: int = DB_CONNECTION_BUDGET,
+                 db_factory=DatabaseManager,
+                 budget: Optional[MemoryBudget] = None,
+                 retention: float = JOB_RETENTION_SECONDS):
+        self.max_workers = max(1, max_workers)
+        self.retention = retention
+        self.pool = ConnectionPool(connection_budget, db_factory)
+        self.budget = budget or get_memory_budget()
+        self.table_locks = TableLockRegistry()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="upload-worker")
+        self.jobs: Dict[int, UploadJob] = {}
+        self.condition = threading.Condition()
+        self.running = 0
+        self.should_stop = False
+        self.dispatcher: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    def add_job(self, folder: str, priority: int = 1, name: Optional[str] = None) -> UploadJob:
+        """
+        Schedule a source folder
+
+        Args:
+            folder: Folder containing MML exports
+            priority: Relative share of workers (1 = normal, 2 = twice as much, ...)
+            name: Display name (defaults to the folder name)
+
+        Returns:
+            UploadJob: The scheduled job
+        """
+        job = UploadJob(folder, priority, name)
+        job.detected = detect_files(folder)
+        job.pending = [(command, files) for command, files in job.detected.items() if files]
+        files = [file_info for _, command_files in job.pending for file_info in command_files]
+        job.files_total = len(files)
+        job.bytes_total = sum(file_info['size'] for file_info in files)
+        base = base_spec()
+        if ENRICHMENT_ENABLED and base is not None and job.detected.get(base.command):
+            # Enrichment re-reads the files of the base and auxiliary commands
+            joined = {spec.command for spec in iter_specs() if spec.join_role}
+            job.enrichment_pending = True
+            job.enrichment_bytes = sum(file_info['size'] for command in joined
+                                       for file_info in job.detected.get(command, []))
+
+        with self.condition:
+            self._prune_jobs()
+            # New jobs start at the current minimum clock so they cannot
+            # claim all workers to "catch up" with older jobs
+            active = [j.virtual_time for j in self.jobs.values()
+                      if j.pending or j.enrichment_pending or j.running]
+            job.virtual_time = min(active) if active else 0.0
+            job.status = 'running' if files else 'done'
+            job.started_at = time.time()
+            if not files:
+                job.enrichment_pending = False
+                job.finished_at = job.started_at
+            self.jobs[job.id] = job
+            self.condition.notify_all()
+
+        self.logger.info(f"Job {job.id} '{job.name}': {job.files_total} files, priority {job.priority}")
+        self._ensure_dispatcher()
+        return job
+
+    def _prune_jobs(self) -> List[int]:
+        """Forget jobs finished more than the retention period ago (caller holds the condition)"""
+        cutoff = time.time() - self.retention
+        # A cancelled job may still have a command running until its current chunk ends
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff and not job.running]
+        for job_id in expired:
+            del self.jobs[job_id]
+        return expired
+
+    def _ensure_dispatcher(self):
+        """Start the dispatcher thread if needed"""
+        with self.condition:
+            if self.dispatcher is None or not self.dispatcher.is_alive():
+                self.dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+                self.dispatcher.start()
+
+    def _dispatch_loop(self):
+        """Hand commands to workers, fairest job first"""
+        while True:
+            with self.condition:
+                while not self.should_stop and (self.running >= self.max_workers
+                                                or not self._has_ready()):
+                    self.condition.wait(timeout=1.0)
+                if self.should_stop:
+                    return
+
+                job = min((j for j in self.jobs.values() if self._is_ready(j)),
+                          key=lambda j: (j.virtual_time, j.id))
+                if job.pending:
+                    command, files = job.pending.pop(0)
+                    size = sum(file_info['size'] for file_info in files)
+                else:
+                    command, files = None, []
+                    size = job.enrichment_bytes
+                    job.enrichment_pending = False
+                job.virtual_time += max(1, size) / job.priority
+                job.running += 1
+                self.running += 1
+
+            if command is None:
+                self.executor.submit(self._run_enrichment, job)
+            else:
+                self.executor.submit(self._run_command, job, command, files)
+
+    @staticmethod
+    def _is_ready(job: UploadJob) -> bool:
+        """Check whether a job has a unit that can start now (enrichment waits for its commands)"""
+        return bool(job.pending) or (job.enrichment_pending and not job.running)
+
+    def _has_ready(self) -> bool:
+        """Check whether any job has a unit that can start now (caller holds the condition)"""
+        return any(self._is_ready(job) for job in self.jobs.values())
+
+    def _has_pending(self) -> bool:
+        """Check whether any job still has work waiting (caller holds the condition)"""
+        return any(job.pending or job.enrichment_pending for job in self.jobs.values())
+
+    @contextmanager
+    def _write_guard(self, table_name: str):
+        """Borrow a pooled connection and hold the table's write lock"""
+        with self.table_locks.locked(table_name):
+            with self.pool.connection() as db_manager:
+                yield db_manager
+
+    def _pipeline(self, job: UploadJob) -> UploadPipeline:
+        """Create a pipeline writing through the shared pool on behalf of a job"""
+        return UploadPipeline(None, job.error_index,
+                              log_callback=lambda message: self.logger.info(f"[{job.name}] {message}"),
+                              should_stop=lambda: self.should_stop or job.status == 'cancelled',
+                              write_guard=self._write_guard,
+                              budget=self.budget)
+
+    def _run_command(self, job: UploadJob, command: str, files: List[Dict[str, Any]]):
+        """Worker: parse and upload all files of one command of a job"""
+        rows = 0
+        error = None
+        try:
+            rows = self._pipeline(job).process_command(command, files)
+        except Exception as e:
+            error = f"{command}: {e}"
+            self.logger.error(f"[{job.name}] {error}")
+
+        with self.condition:
+            job.rows += rows
+            job.bytes_done += sum(file_info['size'] for file_info in files)
+            if error:
+                job.files_failed += len(files)
+                job.errors.append(error)
+            else:
+                job.files_done += len(files)
+            self._finish_unit(job)
+
+    def _run_enrichment(self, job: UploadJob):
+        """Worker: build and upload the enriched cell table of a job"""
+        rows = 0
+        error = None
+        try:
+            rows = self._pipeline(job).process_enrichment(job.detected)
+        except Exception as e:
+            error = f"Enrichment: {e}"
+            self.logger.error(f"[{job.name}] {error}")
+
+        with self.condition:
+            job.rows += rows
+            if error:
+                job.errors.append(error)
+            self._finish_unit(job)
+
+    def _finish_unit(self, job: UploadJob):
+        """Release a worker and close the job if it has no work left (caller holds the condition)"""
+        job.running -= 1
+        self.running -= 1
+        if (not job.pending and not job.enrichment_pending and not job.running
+                and job.status == 'running'):
+            job.status = 'failed' if job.errors else 'done'
+            job.finished_at = time.time()
+        self.condition.notify_all()
+
+    def cancel_job(self, job_id: int) -> bool:
+        """
+        Cancel a job: queued commands are dropped, running commands stop after the current chunk
+
+        Returns:
+            bool: True if the job existed and was still active
+        """
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ('queued', 'running'):
+                return False
+            job.pending = []
+            job.enrichment_pending = False
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            self.condition.notify_all()
+            return True
+
+    def get_progress(self) -> Dict[str, Any]:
+        """
+        Get aggregate progress over all jobs
+
+        Returns:
+            Dict containing totals and a per-job list
+        """
+        with self.condition:
+            jobs = [job.get_progress() for job in self.jobs.values()]
+            bytes_total = sum(job.bytes_total for job in self.jobs.values())
+            bytes_done = sum(job.bytes_done for job in self.jobs.values())
+            running = self.running
+        return {
+            'jobs': jobs,
+            'files_total': sum(job['files_total'] for job in jobs),
+            'files_done': sum(job['files_done'] + job['files_failed'] for job in jobs),
+            'rows': sum(job['rows'] for job in jobs),
+            'rows_per_second': sum(job['rows_per_second'] for job in jobs if job['status'] == 'running'),
+            'percent': 100.0 * bytes_done / bytes_total if bytes_total else 100.0,
+            'running_files': running,
+            'db': self.pool.get_metrics()
+        }
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every job has finished
+
+        Returns:
+            bool: True if all jobs finished within the timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self._has_pending() or self.running:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(timeout=remaining if remaining is not None else 1.0)
+        return True
+
+    def shutdown(self):
+        """Stop dispatching, wait for running files and close pooled connections"""
+        with self.condition:
+            self.should_stop = True
+            self.condition.notify_all()
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+
+def format_progress(progress: Dict[str, Any]) -> str:
+    """
+    Render scheduler progress as a text table for the CLI view
+
+    Args:
+        progress: Result of UploadScheduler.get_progress()
+
+    Returns:
+        str: Multi-line progress report
+    """
+    lines = [f"{'Job':<20} {'Prio':>4} {'Status':<10} {'Files':>11} {'%':>6} {'Rows':>10} {'Rows/s':>9}"]
+    for job in progress['jobs']:
+        files = f"{job['files_done'] + job['files_failed']}/{job['files_total']}"
+        lines.append(f"{job['name'][:20]:<20} {job['priority']:>4} {job['status']:<10} {files:>11} "
+                     f"{job['percent']:>5.1f}% {job['rows']:>10} {job['rows_per_second']:>9.0f}")
+    lines.append(f"{'TOTAL':<20} {'':>4} {'':<10} "
+                 f"{str(progress['files_done']) + '/' + str(progress['files_total']):>11} "
+                 f"{progress['percent']:>5.1f}% {progress['rows']:>10} {progress['rows_per_second']:>9.0f}")
+    return "\n".join(lines)
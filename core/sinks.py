@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline Output Sinks for MML to DB Uploader
+Writes parsed data to Parquet, gzip CSV or SQLite instead of the database
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import glob
+import itertools
+import sqlite3
+import logging
+from contextlib import nullcontext
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import pandas as pd
+
+from core.mml_parser import EXPORT_TIME_COLUMN
+from core.commands import spec_for_table
+from core.pipeline import UploadPipeline, load_mode_for
+
+# Import configuration
+try:
+    from config import PARSE_CHUNK_ROWS
+except ImportError:
+    PARSE_CHUNK_ROWS = 50000
+
+NO_DATE_PARTITION = "unknown"
+
+
+class OutputSink:
+    """
+    Base class for offline outputs, used by UploadPipeline in place of a DatabaseManager
+
+    Sinks receive whole parsed DataFrame chunks and write them with
+    vectorized pandas writers; nothing goes through per-row tuples.
+    """
+
+    format_name = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows_written: Dict[str, int] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def write_frame(self, table_name: str, frame: pd.DataFrame, mode: Optional[str] = None) -> bool:
+        """
+        Write one chunk of a table
+
+        Args:
+            table_name: Target table name
+            frame: Parsed rows
+            mode: Load mode (ignored; exports are append-only)
+
+        Returns:
+            bool: True if written
+        """
+        if frame.empty:
+            return True
+        try:
+            self._write(table_name, frame)
+        except Exception as e:
+            self.logger.error(f"{self.format_name} export of {table_name} failed: {e}")
+            return False
+        self.rows_written[table_name] = self.rows_written.get(table_name, 0) + len(frame)
+        return True
+
+    def _write(self, table_name: str, frame: pd.DataFrame):
+        """Format-specific write of one non-empty chunk"""
+        raise NotImplementedError
+
+    def _next_part(self, directory: str, suffix: str) -> str:
+        """Get the next free part file name in a directory"""
+        os.makedirs(directory, exist_ok=True)
+        index = len(glob.glob(os.path.join(directory, f"part-*{suffix}")))
+        return os.path.join(directory, f"part-{index:05d}{suffix}")
+
+    def close(self):
+        """Finish writing"""
+        total = sum(self.rows_written.values())
+        self.logger.info(f"{self.format_name} export to {self.path}: {total} rows, "
+                         f"{len(self.rows_written)} tables")
+
+
+class ParquetSink(OutputSink):
+    """
+    Parquet files partitioned by table and export date
+
+    Layout: <path>/<table>/export_date=<YYYY-MM-DD>/part-NNNNN.parquet
+    Requires pyarrow (optional dependency).
+    """
+
+    format_name = "Parquet"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+
+    def _write(self, table_name: str, frame: pd.DataFrame):
+        if EXPORT_TIME_COLUMN in frame.columns:
+            dates = frame[EXPORT_TIME_COLUMN].fillna('').astype(str).str[:10].replace('', NO_DATE_PARTITION)
+        else:
+            dates = pd.Series(NO_DATE_PARTITION, index=frame.index)
+        for date, part in frame.groupby(dates.to_numpy(), sort=False):
+            directory = os.path.join(self.path, table_name, f"export_date={date}")
+            part.to_parquet(self._next_part(directory, ".parquet"), index=False)
+
+
+class CsvGzSink(OutputSink):
+    """
+    Gzip-compressed CSV, one file per chunk (each with its own header)
+
+    Layout: <path>/<table>/part-NNNNN.csv.gz
+    """
+
+    format_name = "CSV"
+
+    def _write(self, table_name: str, frame: pd.DataFrame):
+        path = self._next_part(os.path.join(self.path, table_name), ".csv.gz")
+        frame.to_csv(path, index=False, compression='gzip')
+
+
+class SQLiteSink(OutputSink):
+    """
+    Single-file SQLite database, one table per MML command
+
+    Columns that appear in later chunks (newer NE software versions) are
+    added to the table on the fly.
+    """
+
+    format_name = "SQLite"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.columns: Dict[str, List[str]] = {}
+
+    def _write(self, table_name: str, frame: pd.DataFrame):
+        existing = self.columns.get(table_name)
+        if existing is None:
+            existing = [row[1] for row in self.connection.execute(
+                f'PRAGMA table_info("{table_name}")')]
+        for column in frame.columns:
+            if existing and column not in existing:
+                self.connection.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{column}" TEXT')
+                existing.append(column)
+        frame.to_sql(table_name, self.connection, if_exists='append', index=False,
+                     chunksize=PARSE_CHUNK_ROWS)
+        self.columns[table_name] = existing or list(frame.columns)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+        super().close()
+
+
+SINKS = {
+    'parquet': ParquetSink,
+    'csv': CsvGzSink,
+    'sqlite': SQLiteSink,
+}
+
+
+def create_sink(format_name: str, path: str) -> OutputSink:
+    """
+    Create an output sink
+
+    Args:
+        format_name: 'parquet', 'csv' or 'sqlite'
+        path: Output folder (or .sqlite file)
+
+    Returns:
+        OutputSink: The sink
+    """
+    try:
+        return SINKS[format_name.lower()](path)
+    except KeyError:
+        raise ValueError(f"Unknown export format: {format_name} (use {', '.join(SINKS)})")
+
+
+def _export_parts(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (table name, part file) of a Parquet/CSV export folder in load order"""
+    for table_name in sorted(os.listdir(path)):
+        directory = os.path.join(path, table_name)
+        if not os.path.isdir(directory):
+            continue
+        for part in sorted(glob.glob(os.path.join(directory, "**", "part-*"), recursive=True)):
+            if part.endswith((".parquet", ".csv.gz")):
+                yield table_name, part
+
+
+def iter_exported(path: str) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Read back an offline export in chunks
+
+    Args:
+        path: Export folder (Parquet/CSV) or SQLite file
+
+    Yields:
+        Tuple of (table name, DataFrame chunk)
+    """
+    if os.path.isfile(path):
+        connection = sqlite3.connect(path)
+        try:
+            tables = [row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table_name in tables:
+                for frame in pd.read_sql_query(f'SELECT * FROM "{table_name}"', connection,
+                                               chunksize=PARSE_CHUNK_ROWS):
+                    yield table_name, frame
+        finally:
+            connection.close()
+        return
+
+    for table_name, part in _export_parts(path):
+        if part.endswith(".parquet"):
+            yield table_name, pd.read_parquet(part)
+        else:
+            for frame in pd.read_csv(part, dtype=str, keep_default_na=False,
+                                     na_values=[''], chunksize=PARSE_CHUNK_ROWS):
+                yield table_name, frame
+
+
+def exported_columns(path: str) -> Dict[str, List[str]]:
+    """
+    Get the union of the columns of every table in an offline export
+
+    Only schemas and headers are read: PRAGMA table_info for SQLite, the
+    Parquet schema and the CSV header line of every part.
+
+    Args:
+        path: Export folder (Parquet/CSV) or SQLite file
+
+    Returns:
+        Dict mapping table name to its columns, in first-seen order
+    """
+    columns: Dict[str, List[str]] = {}
+
+    def add(table_name: str, names: List[str]):
+        known = columns.setdefault(table_name, [])
+        known.extend(name for name in names if name not in known)
+
+    if os.path.isfile(path):
+        connection = sqlite3.connect(path)
+        try:
+            tables = [row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table_name in tables:
+                add(table_name, [row[1] for row in connection.execute(f'PRAGMA table_info("{table_name}")')])
+        finally:
+            connection.close()
+        return columns
+
+    for table_name, part in _export_parts(path):
+        if part.endswith(".parquet"):
+            import pyarrow.parquet
+            add(table_name, pyarrow.parquet.read_schema(part).names)
+        else:
+            add(table_name, list(pd.read_csv(part, nrows=0).columns))
+    return columns
+
+
+def load_exported(path: str, db_manager) -> Dict[str, Any]:
+    """
+    Load an offline export into the database at bulk speed
+
+    Chunks go through UploadPipeline.upload(), so tables are created from
+    their command spec and 'history' / 'changes' commands keep their load
+    modes. Upserted tables are created first, with the union of the columns
+    of all their parts (DDL inside the session would implicitly commit its
+    transaction), and then written inside a bulk session (deferred checks,
+    one transaction) using adaptive batches; history and change loads run
+    their own DDL and reads, so they are not wrapped in a session.
+
+    Args:
+        path: Export folder or SQLite file
+        db_manager: Connected DatabaseManager
+
+    Returns:
+        Dict mapping table name to loaded row count
+
+    Raises:
+        RuntimeError: If a table fails to load (its bulk session is rolled back)
+    """
+    pipeline = UploadPipeline(db_manager)
+    columns = exported_columns(path)
+    loaded: Dict[str, Any] = {}
+    for table_name, chunks in itertools.groupby(iter_exported(path), key=lambda item: item[0]):
+        spec = spec_for_table(table_name)
+        frames = (spec.apply_types(frame) if spec else frame for _, frame in chunks)
+        known = None
+        if load_mode_for(spec, 'upsert') == 'upsert':
+            known = set(columns.get(table_name, []))
+            if not pipeline._ensure_table(db_manager, table_name, spec,
+                                          pd.DataFrame(columns=columns.get(table_name, []))):
+                raise RuntimeError(f"Unable to create {table_name}")
+            session = db_manager.bulk_session([table_name])
+        else:
+            session = nullcontext(db_manager)
+        with session:
+            for frame in frames:
+                if known is not None and not set(frame.columns) <= known:
+                    new = ", ".join(sorted(set(frame.columns) - known))
+                    raise RuntimeError(f"Chunk of {table_name} brings new columns inside the "
+                                       f"bulk session: {new}")
+                if not pipeline.upload(table_name, frame, 'upsert'):
+                    raise RuntimeError(f"Loading {table_name} from {path} failed")
+                loaded[table_name] = loaded.get(table_name, 0) + len(frame)
+    return loaded
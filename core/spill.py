@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory-budgeted Storage for MML to DB Uploader
+Hash-partitioned tables that spill to memory-mapped .npy files
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+# Import configuration
+try:
+    from config import MEMORY_BUDGET_MB, SPILL_DIR, JOIN_PARTITIONS
+except ImportError:
+    MEMORY_BUDGET_MB = 4096
+    SPILL_DIR = None
+    JOIN_PARTITIONS = 16
+
+
+def frame_bytes(frame: pd.DataFrame) -> int:
+    """
+    Get the in-memory size of a DataFrame (including string payloads)
+
+    Args:
+        frame: DataFrame to measure
+
+    Returns:
+        int: Size in bytes
+    """
+    return int(frame.memory_usage(deep=True, index=False).sum())
+
+
+class MemoryBudget:
+    """
+    Byte budget shared by everything a process holds in memory
+
+    The de-dup index and every partitioned table reserve their bytes in the
+    same budget (see get_memory_budget()), so concurrent scheduler workers
+    together stay under MEMORY_BUDGET_MB instead of each getting all of it.
+    """
+
+    def __init__(self, limit_mb: int = MEMORY_BUDGET_MB):
+        self.limit = int(limit_mb) * 1024 * 1024
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int):
+        """Account for bytes now held in memory"""
+        with self._lock:
+            self.used += size
+
+    def release(self, size: int):
+        """Account for bytes freed (spilled or dropped)"""
+        with self._lock:
+            self.used = max(0, self.used - size)
+
+    def exceeded(self) -> bool:
+        """Check whether held bytes are over the limit"""
+        return self.used > self.limit
+
+
+_default_budget: Optional[MemoryBudget] = None
+_default_lock = threading.Lock()
+
+
+def get_memory_budget() -> MemoryBudget:
+    """
+    Get the process-wide memory budget
+
+    Returns:
+        MemoryBudget: Budget of MEMORY_BUDGET_MB
+    """
+    global _default_budget
+    with _default_lock:
+        if _default_budget is None:
+            _default_budget = MemoryBudget()
+        return _default_budget
+
+
+class SpilledFrame:
+    """
+    A DataFrame stored column by column as .npy files
+
+    String columns are written as one UTF-8 byte buffer plus int64 row
+    offsets (and a null mask), so the files hold only the actual string
+    bytes instead of rows x longest value x 4 bytes of a fixed-width
+    unicode array. Nullable numeric columns (Int64 from typed commands)
+    keep their native values plus a null mask and are restored to the same
+    dtype. Every file is memory-mapped back with np.load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def write(cls, frame: pd.DataFrame, path: str) -> 'SpilledFrame':
+        """
+        Write a DataFrame to a directory of .npy files
+
+        Args:
+            frame: Data to spill
+            path: Target directory (created)
+
+        Returns:
+            SpilledFrame: Handle for reading the data back
+        """
+        os.makedirs(path, exist_ok=True)
+        meta: Dict[str, Any] = {'columns': [], 'rows': len(frame)}
+        for index, column in enumerate(frame.columns):
+            series = frame[column]
+            if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and \
+                    pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                mask = series.isna().to_numpy()
+                np.save(os.path.join(path, f"{index}.npy"),
+                        series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0))
+                np.save(os.path.join(path, f"{index}.mask.npy"), mask)
+                meta['columns'].append({'name': column, 'kind': 'masked', 'dtype': str(series.dtype)})
+            elif pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                np.save(os.path.join(path, f"{index}.npy"), series.to_numpy())
+                meta['columns'].append({'name': column, 'kind': 'numeric'})
+            else:
+                mask = series.isna().to_numpy()
+                encoded = [value.encode('utf-8') for value in series.where(~mask, '').astype(str).tolist()]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+                np.save(os.path.join(path, f"{index}.npy"), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+                np.save(os.path.join(path, f"{index}.offsets.npy"), offsets)
+                np.save(os.path.join(path, f"{index}.mask.npy"), mask)
+                meta['columns'].append({'name': column, 'kind': 'utf8'})
+        with open(os.path.join(path, "meta.json"), 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        return cls(path)
+
+    def read(self) -> pd.DataFrame:
+        """
+        Load the data back through memory-mapped column files
+
+        Returns:
+            pd.DataFrame: The spilled data
+        """
+        with open(os.path.join(self.path, "meta.json"), encoding='utf-8') as file:
+            meta = json.load(file)
+        data = {}
+        for index, column in enumerate(meta['columns']):
+            values = np.load(os.path.join(self.path, f"{index}.npy"), mmap_mode='r')
+            if column['kind'] == 'numeric':
+                data[column['name']] = np.asarray(values)
+            elif column['kind'] == 'masked':
+                mask = np.load(os.path.join(self.path, f"{index}.mask.npy"), mmap_mode='r')
+                data[column['name']] = pd.Series(np.asarray(values), dtype=column['dtype']).mask(np.asarray(mask))
+            else:
+                mask = np.load(os.path.join(self.path, f"{index}.mask.npy"), mmap_mode='r')
+                if column['kind'] == 'utf8':
+                    offsets = np.load(os.path.join(self.path, f"{index}.offsets.npy"), mmap_mode='r')
+                    values = self._decode(values, offsets)
+                # 'string': fixed-width unicode array of entries written by earlier versions
+                series = pd.Series(values, dtype=object)
+                series[np.asarray(mask)] = None
+                data[column['name']] = series
+        return pd.DataFrame(data, columns=[c['name'] for c in meta['columns']])
+
+    @staticmethod
+    def _decode(buffer: np.ndarray, offsets: np.ndarray) -> List[str]:
+        """Split a UTF-8 byte buffer into strings at the given row offsets"""
+        data = buffer.tobytes()
+        bounds = offsets.tolist()
+        return [data[start:end].decode('utf-8') for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class PartitionedTable:
+    """
+    A table hash-partitioned by key columns, held in memory under a budget
+
+    When the shared MemoryBudget is exceeded, the largest in-memory
+    partition of the table is spilled to disk. Partitions of tables
+    partitioned on the same columns line up, so joins can run one
+    partition at a time.
+    """
+
+    def __init__(self, name: str, partition_columns: List[str], budget: MemoryBudget,
+                 partitions: int = JOIN_PARTITIONS, spill_dir: Optional[str] = None):
+        self.name = name
+        self.partition_columns = partition_columns
+        self.budget = budget
+        self.partitions = max(1, partitions)
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="mml_spill_", dir=SPILL_DIR)
+        self.memory: List[List[pd.DataFrame]] = [[] for _ in range(self.partitions)]
+        self.memory_bytes = [0] * self.partitions
+        self.spilled: List[List[SpilledFrame]] = [[] for _ in range(self.partitions)]
+        self.rows = 0
+        self.spill_count = 0
+        self.logger = logging.getLogger(__name__)
+
+    def partition_of(self, frame: pd.DataFrame) -> np.ndarray:
+        """
+        Compute the partition number of every row
+
+        Args:
+            frame: Rows to place
+
+        Returns:
+            np.ndarray: Partition index per row
+        """
+        keys = frame.reindex(columns=self.partition_columns).astype(str)
+        return (pd.util.hash_pandas_object(keys, index=False).to_numpy() % self.partitions).astype(np.int64)
+
+    def append(self, frame: pd.DataFrame):
+        """
+        Add rows, spilling partitions while the memory budget is exceeded
+
+        Args:
+            frame: Rows to add
+        """
+        if frame.empty:
+            return
+        self.rows += len(frame)
+        for partition, part in frame.groupby(self.partition_of(frame), sort=False):
+            part = part.reset_index(drop=True)
+            size = frame_bytes(part)
+            self.memory[partition].append(part)
+            self.memory_bytes[partition] += size
+            self.budget.reserve(size)
+
+        while self.budget.exceeded() and any(self.memory_bytes):
+            self.spill_partition(int(np.argmax(self.memory_bytes)))
+
+    def spill_partition(self, partition: int):
+        """
+        Move one in-memory partition to disk
+
+        Args:
+            partition: Partition index
+        """
+        frames = self.memory[partition]
+        if not frames:
+            return
+        frame = pd.concat(frames, ignore_index=True, sort=False)
+        path = os.path.join(self.spill_dir, f"{self.name}_{partition}_{self.spill_count}")
+        self.spilled[partition].append(SpilledFrame.write(frame, path))
+        self.spill_count += 1
+        self.budget.release(self.memory_bytes[partition])
+        self.memory[partition] = []
+        self.memory_bytes[partition] = 0
+        self.logger.info(f"Spilled {self.name} partition {partition} ({len(frame)} rows)")
+
+    def get_partition(self, partition: int) -> pd.DataFrame:
+        """
+        Get all rows of a partition (spilled parts are memory-mapped back)
+
+        Args:
+            partition: Partition index
+
+        Returns:
+            pd.DataFrame: Partition rows (empty if none)
+        """
+        frames = [spilled.read() for spilled in self.spilled[partition]] + self.memory[partition]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True, sort=False)
+
+    def close(self):
+        """Release memory accounting and delete spill files"""
+        self.budget.release(sum(self.memory_bytes))
+        self.memory = [[] for _ in range(self.partitions)]
+        self.memory_bytes = [0] * self.partitions
+        self.spilled = [[] for _ in range(self.partitions)]
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
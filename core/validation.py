@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Validation for MML to DB Uploader
+Vectorized pre-upload checks on parsed DataFrame chunks
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import time
+import logging
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.commands import get_spec, NE_COLUMN
+from core.error_report import SITE_ID_COLUMNS
+from core.vswr_history import VSWR_COMMAND, find_value_column
+
+# Import configuration
+try:
+    from config import VSWR_VALID_RANGE
+except ImportError:
+    VSWR_VALID_RANGE = (1.0, 10.0)
+
+
+class FrameValidator:
+    """
+    Runs validation rules as boolean masks over whole parsed chunks
+
+    Every rule is one vectorized pass over a column. Required columns (the
+    primary key), ID ranges and allowed values (enums, empty values not
+    checked) come from the command spec. Rows failing any rule are dropped
+    from the chunk and reported to the SiteErrorIndex, grouped per SITE_ID /
+    NE / first failed rule, so rejecting many rows costs one groupby rather
+    than a Python call per row.
+    """
+
+    def __init__(self, error_index=None):
+        self.error_index = error_index
+        self.rows_checked = 0
+        self.rows_rejected = 0
+        self.seconds = 0.0
+        self.logger = logging.getLogger(__name__)
+
+    def validate(self, command: str, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Validate a parsed chunk
+
+        Args:
+            command: MML command of the chunk
+            frame: Parsed rows
+
+        Returns:
+            pd.DataFrame: The rows that passed every rule
+        """
+        if frame.empty:
+            return frame
+        start = time.perf_counter()
+        errors = self.check(command, frame)
+        rejected = pd.notna(errors)
+        self.rows_checked += len(frame)
+        if rejected.any():
+            self.rows_rejected += int(rejected.sum())
+            self._report(frame[rejected], errors[rejected])
+            frame = frame[~rejected]
+        self.seconds += time.perf_counter() - start
+        return frame
+
+    def check(self, command: str, frame: pd.DataFrame) -> np.ndarray:
+        """
+        Evaluate all rules of a command
+
+        Args:
+            command: MML command of the chunk
+            frame: Parsed rows
+
+        Returns:
+            np.ndarray: Error class of the first failed rule per row (None if valid)
+        """
+        errors = np.full(len(frame), None, dtype=object)
+        spec = get_spec(command)
+        key_columns = spec.primary_key if spec else []
+        missing = [c for c in key_columns if c not in frame.columns]
+        value_column = find_value_column(list(frame.columns)) if command == VSWR_COMMAND else None
+        if command == VSWR_COMMAND and value_column is None:
+            missing.append('VSWR')
+        if missing:
+            errors[:] = f"missing column {', '.join(missing)}"
+            return errors
+
+        def fail(mask, error_class: str):
+            mask = np.asarray(mask, dtype=bool) & pd.isna(errors)
+            errors[mask] = error_class
+
+        if NE_COLUMN in frame.columns:
+            # The parser strips fields, so blank names arrive as '' or missing
+            ne = frame[NE_COLUMN]
+            fail(ne.isna() | ne.isin(['']), "empty NE")
+
+        for column in key_columns:
+            # Typed key columns hold missing values where the text was not a number
+            fail(frame[column].isna(), f"invalid {column}")
+
+        for column, (low, high) in (spec.ranges if spec else {}).items():
+            if column in frame.columns:
+                fail(~self._in_id_range(frame[column], low, high), f"invalid {column}")
+
+        for column, allowed in (spec.enums if spec else {}).items():
+            if column in frame.columns:
+                values = frame[column]
+                fail(values.notna() & ~values.isin(allowed), f"invalid {column}")
+
+        if value_column is not None:
+            low, high = VSWR_VALID_RANGE
+            values = pd.to_numeric(frame[value_column], errors='coerce')
+            fail(values.isna() | (values < low) | (values > high), "VSWR out of range")
+        return errors
+
+    @staticmethod
+    def _in_id_range(values: pd.Series, low: int, high: int) -> np.ndarray:
+        """
+        Check integer IDs against an inclusive range
+
+        Columns typed by the command spec are compared directly (missing
+        values fail). For string columns, matching the canonical strings is
+        a hash lookup, much cheaper than converting the whole column to
+        numbers; only the few values that are not canonical ('007', '3.0',
+        ...) are converted.
+        """
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            return ((values >= low) & (values <= high) & (values % 1 == 0)).fillna(False).to_numpy(dtype=bool)
+        valid = values.isin([str(number) for number in range(int(low), int(high) + 1)]).to_numpy(copy=True)
+        other = ~valid & values.notna().to_numpy()
+        if other.any():
+            numbers = pd.to_numeric(values[other], errors='coerce')
+            valid[other] = ((numbers >= low) & (numbers <= high) & (numbers % 1 == 0)).to_numpy()
+        return valid
+
+    def _report(self, rejected: pd.DataFrame, errors: np.ndarray):
+        """Send rejected rows to the error index, aggregated per site / NE / error class"""
+        if self.error_index is None:
+            return
+        site_column = next((c for c in SITE_ID_COLUMNS if c in rejected.columns), None)
+        keys = pd.DataFrame({
+            'site': rejected[site_column].to_numpy() if site_column else None,
+            'ne': rejected[NE_COLUMN].to_numpy() if NE_COLUMN in rejected.columns else None,
+            'error': errors,
+        }).fillna('')
+        groups = keys.groupby(['site', 'ne', 'error'], sort=False)
+        # Sample rows of every group converted in one pass
+        sampled = (groups.cumcount() < self.error_index.sample_rows).to_numpy()
+        samples: Dict[Tuple, List[Dict[str, Any]]] = {}
+        rows = rejected[sampled]
+        records = rows.astype(object).where(rows.notna(), None).to_dict('records')
+        for key, record in zip(keys[sampled].itertuples(index=False, name=None), records):
+            samples.setdefault(key, []).append(record)
+        for key, count in groups.size().items():
+            self.error_index.add_count(*key, int(count), samples.get(key, []))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get validation statistics
+
+        Returns:
+            Dict containing checked/rejected row counts and time spent
+        """
+        return {
+            'rows_checked': self.rows_checked,
+            'rows_rejected': self.rows_rejected,
+            'seconds': round(self.seconds, 3),
+        }
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VSWR History Store for MML to DB Uploader
+Append-only, date-partitioned DSP VSWR history with incremental daily rollups
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Optional, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.commands import get_spec, NE_COLUMN, EXPORT_TIME_COLUMN
+from core.error_report import SITE_ID_COLUMNS
+
+VSWR_COMMAND = 'DSP VSWR'
+HISTORY_TABLE = 'vswr_history'
+ROLLUP_TABLE = 'vswr_daily_rollup'
+DATE_COLUMN = 'ExportDate'
+VALUE_COLUMN = 'Vswr'
+
+# RRU port identity: primary key of DSP VSWR
+PORT_COLUMNS = get_spec(VSWR_COMMAND).primary_key
+
+
+def find_value_column(columns: List[str]) -> Optional[str]:
+    """
+    Find the VSWR measurement column (titles differ between NE versions)
+
+    Args:
+        columns: Parsed column names
+
+    Returns:
+        str: Column name, or None if the chunk has no VSWR value
+    """
+    return next((column for column in columns if column.lower().startswith('vswr')), None)
+
+
+class VswrHistoryStore:
+    """
+    Appends every DSP VSWR export instead of overwriting the last value
+
+    Raw rows go to a RANGE-partitioned table with one partition per export
+    day (new partitions are split off the MAXVALUE partition as dates
+    arrive, old days can be dropped with DROP PARTITION). While ingesting,
+    each chunk is aggregated per RRU port and day and merged into a small
+    rollup table (max, sum, count; avg is a generated column), so trend
+    queries never scan raw history. The history insert and the rollup merge
+    of a chunk run in one transaction, and re-ingesting an export already
+    stored is skipped, which keeps the rollups exact. Rows without a VSWR
+    value or export time are counted and reported to the error index.
+    """
+
+    def __init__(self, db_manager, error_index=None):
+        self.db_manager = db_manager
+        self.error_index = error_index
+        self.rows_dropped = 0
+        self.partition_days: Set[str] = set()
+        self.schema_ready = False
+        self.logger = logging.getLogger(__name__)
+
+    def ensure_schema(self) -> bool:
+        """
+        Create history and rollup tables if needed
+
+        Returns:
+            bool: True if the tables are ready
+        """
+        if self.schema_ready:
+            return True
+        q = self.db_manager._quote_identifier
+        port_types = get_spec(VSWR_COMMAND).sql_types(PORT_COLUMNS)
+        ports = ", ".join(f"{q(c)} {sql_type} NOT NULL" for c, sql_type in port_types.items())
+        port_keys = ", ".join(q(c) for c in PORT_COLUMNS)
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {q(HISTORY_TABLE)} ("
+            f"{ports}, {q(EXPORT_TIME_COLUMN)} DATETIME NOT NULL, {q(DATE_COLUMN)} DATE NOT NULL, "
+            f"{q(VALUE_COLUMN)} DECIMAL(8,2) NOT NULL, "
+            f"PRIMARY KEY ({port_keys}, {q(EXPORT_TIME_COLUMN)}, {q(DATE_COLUMN)})) "
+            f"PARTITION BY RANGE (TO_DAYS({q(DATE_COLUMN)})) "
+            f"(PARTITION p_future VALUES LESS THAN MAXVALUE)",
+            f"CREATE TABLE IF NOT EXISTS {q(ROLLUP_TABLE)} ("
+            f"{ports}, {q(DATE_COLUMN)} DATE NOT NULL, "
+            f"max_vswr DECIMAL(8,2) NOT NULL, sum_vswr DECIMAL(14,2) NOT NULL, "
+            f"sample_count INT NOT NULL, "
+            f"avg_vswr DECIMAL(8,2) AS (sum_vswr / sample_count) VIRTUAL, "
+            f"PRIMARY KEY ({port_keys}, {q(DATE_COLUMN)}), KEY idx_date ({q(DATE_COLUMN)}))",
+        ]
+        for statement in statements:
+            if self.db_manager.execute_query(statement) is None:
+                return False
+        self.schema_ready = self._load_partitions()
+        return self.schema_ready
+
+    def _load_partitions(self) -> bool:
+        """Read the existing daily partitions (pYYYYMMDD) of the history table"""
+        rows = self.db_manager.execute_query(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %(table)s",
+            {'table': HISTORY_TABLE})
+        if rows is None:
+            return False
+        self.partition_days = {name[1:] for (name,) in rows if name and name[1:].isdigit()}
+        return True
+
+    def ensure_partitions(self, days: List[str]) -> bool:
+        """
+        Split daily partitions off p_future for new export days
+
+        RANGE partitions must stay increasing, so only days after the newest
+        existing partition get their own partition; back-filled older days
+        land in the first partition whose range covers them.
+
+        Args:
+            days: Export days (YYYY-MM-DD)
+
+        Returns:
+            bool: True if partitions are in place
+        """
+        days = {day.replace('-', '') for day in days}
+        newest = max(self.partition_days, default='')
+        if all(day <= newest for day in days):
+            return True
+        # Another connection (scheduler job, daemon) may have added them meanwhile
+        if not self._load_partitions():
+            return False
+        newest = max(self.partition_days, default='')
+        new_days = sorted(day for day in days if day > newest)
+        if not new_days:
+            return True
+
+        definitions = []
+        for day in new_days:
+            upper = date(int(day[:4]), int(day[4:6]), int(day[6:8])) + timedelta(days=1)
+            definitions.append(f"PARTITION p{day} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))")
+        definitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+        statement = (f"ALTER TABLE {self.db_manager._quote_identifier(HISTORY_TABLE)} "
+                     f"REORGANIZE PARTITION p_future INTO ({', '.join(definitions)})")
+        if self.db_manager.execute_query(statement) is None:
+            return False
+        self.partition_days.update(new_days)
+        return True
+
+    def append(self, frame: pd.DataFrame) -> int:
+        """
+        Append a parsed DSP VSWR chunk and update the daily rollups
+
+        Args:
+            frame: Parsed DSP VSWR rows
+
+        Returns:
+            int: Number of history rows appended
+        """
+        value_column = find_value_column(list(frame.columns))
+        if value_column is None or not set(PORT_COLUMNS) <= set(frame.columns):
+            raise ValueError("DSP VSWR chunk has no VSWR value or port columns")
+        if not self.ensure_schema():
+            raise RuntimeError("Unable to create VSWR history tables")
+
+        history = frame[PORT_COLUMNS + [EXPORT_TIME_COLUMN]].astype(str).copy()
+        history[DATE_COLUMN] = history[EXPORT_TIME_COLUMN].str[:10]
+        history[VALUE_COLUMN] = pd.to_numeric(frame[value_column], errors='coerce')
+        errors = np.where(history[VALUE_COLUMN].isna(), "missing VSWR value",
+                          np.where(history[DATE_COLUMN].str.len() != 10, f"missing {EXPORT_TIME_COLUMN}", ''))
+        if errors.any():
+            self._report_dropped(frame[errors != ''], errors[errors != ''])
+            history = history[errors == '']
+        if history.empty:
+            return 0
+        history = self._drop_loaded_exports(history)
+        if history.empty:
+            return 0
+
+        if not self.ensure_partitions(history[DATE_COLUMN].unique().tolist()):
+            raise RuntimeError("Unable to add VSWR history partitions")
+
+        columns = PORT_COLUMNS + [EXPORT_TIME_COLUMN, DATE_COLUMN, VALUE_COLUMN]
+        query = self.db_manager._build_insert_query(HISTORY_TABLE, columns, upsert=False)
+        query = query.replace("INSERT INTO", "INSERT IGNORE INTO", 1)
+        rows = list(history[columns].itertuples(index=False, name=None))
+        # One transaction: a failed rollup merge must not leave its history rows
+        # behind, or the re-ingest skip above would keep the rollup short for good
+        with self.db_manager.bulk_session([HISTORY_TABLE, ROLLUP_TABLE]):
+            if not self.db_manager.execute_batches(query, rows, HISTORY_TABLE):
+                raise RuntimeError("Appending VSWR history failed")
+            self._update_rollups(history)
+        return len(rows)
+
+    def _report_dropped(self, dropped: pd.DataFrame, errors: np.ndarray):
+        """Count rows that cannot be stored and report them per site / NE / reason"""
+        self.rows_dropped += len(dropped)
+        self.logger.warning(f"Dropped {len(dropped)} DSP VSWR rows without a VSWR value or export time")
+        if self.error_index is None:
+            return
+        site_column = next((c for c in SITE_ID_COLUMNS if c in dropped.columns), None)
+        keys = pd.DataFrame({
+            'site': dropped[site_column].to_numpy() if site_column else None,
+            'ne': dropped[NE_COLUMN].to_numpy() if NE_COLUMN in dropped.columns else None,
+            'error': errors,
+        }).fillna('')
+        for key, count in keys.groupby(['site', 'ne', 'error'], sort=False).size().items():
+            self.error_index.add_count(*key, int(count))
+
+    def _drop_loaded_exports(self, history: pd.DataFrame) -> pd.DataFrame:
+        """Remove rows of (NE, export time) pairs already stored in history"""
+        if history.empty:
+            # No days to look up (an empty IN () is a SQL error)
+            return history
+        q = self.db_manager._quote_identifier
+        days = history[DATE_COLUMN].unique().tolist()
+        params = {f"d{i}": day for i, day in enumerate(days)}
+        placeholders = ", ".join(f"%({name})s" for name in params)
+        loaded = {(str(ne), str(ts)) for ne, ts in self.db_manager.iter_query(
+            f"SELECT DISTINCT {q(NE_COLUMN)}, {q(EXPORT_TIME_COLUMN)} FROM {q(HISTORY_TABLE)} "
+            f"WHERE {q(DATE_COLUMN)} IN ({placeholders})", params)}
+        if not loaded:
+            return history
+        pairs = list(zip(history[NE_COLUMN], history[EXPORT_TIME_COLUMN]))
+        keep = [pair not in loaded for pair in pairs]
+        skipped = len(keep) - sum(keep)
+        if skipped:
+            self.logger.info(f"Skipped {skipped} VSWR rows from exports already in history")
+        return history[keep]
+
+    def _update_rollups(self, history: pd.DataFrame):
+        """Merge per-port daily max/sum/count of a chunk into the rollup table"""
+        q = self.db_manager._quote_identifier
+        grouped = (history.groupby(PORT_COLUMNS + [DATE_COLUMN], sort=False)[VALUE_COLUMN]
+                   .agg(['max', 'sum', 'count']).reset_index())
+        columns = PORT_COLUMNS + [DATE_COLUMN, 'max_vswr', 'sum_vswr', 'sample_count']
+        query = (f"INSERT INTO {q(ROLLUP_TABLE)} ({', '.join(q(c) for c in columns)}) "
+                 f"VALUES ({', '.join(['%s'] * len(columns))}) ON DUPLICATE KEY UPDATE "
+                 f"max_vswr = GREATEST(max_vswr, VALUES(max_vswr)), "
+                 f"sum_vswr = sum_vswr + VALUES(sum_vswr), "
+                 f"sample_count = sample_count + VALUES(sample_count)")
+        rows = [tuple(row[:-3]) + (float(row[-3]), float(row[-2]), int(row[-1]))
+                for row in grouped.itertuples(index=False, name=None)]
+        if not self.db_manager.execute_batches(query, rows, ROLLUP_TABLE):
+            raise RuntimeError("Updating VSWR rollups failed")
+
+    def get_trend(self, ne: str, days: int = 30) -> Optional[List[Tuple]]:
+        """
+        Get the daily VSWR trend of an NE from the rollup table
+
+        Args:
+            ne: NE name
+            days: Number of days back from today
+
+        Returns:
+            List of (port..., date, max, avg, samples) tuples, or None if failed
+        """
+        q = self.db_manager._quote_identifier
+        ports = ", ".join(q(c) for c in PORT_COLUMNS)
+        return self.db_manager.execute_query(
+            f"SELECT {ports}, {q(DATE_COLUMN)}, max_vswr, avg_vswr, sample_count "
+            f"FROM {q(ROLLUP_TABLE)} WHERE {q(NE_COLUMN)} = %(ne)s "
+            f"AND {q(DATE_COLUMN)} >= CURDATE() - INTERVAL %(days)s DAY "
+            f"ORDER BY {ports}, {q(DATE_COLUMN)}",
+            {'ne': ne, 'days': int(days)})
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Folder Watcher for MML to DB Uploader
+Daemon mode: watches drop folders and feeds new exports to the upload pipeline
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import sqlite3
+import logging
+import threading
+import ctypes
+import ctypes.util
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+from core.commands import iter_specs, spec_for_file
+from core.enrichment import ENRICHED_TABLE
+from core.file_reader import detect_files
+from core.pipeline import UploadPipeline, command_for_file
+
+# Import configuration
+try:
+    from config import (WATCH_QUEUE_PATH, WATCH_POLL_INTERVAL, WATCH_SETTLE_SECONDS,
+                        MAX_RETRY_ATTEMPTS, ENRICHMENT_ENABLED)
+except ImportError:
+    WATCH_QUEUE_PATH = "watch_queue.sqlite3"
+    WATCH_POLL_INTERVAL = 5.0
+    WATCH_SETTLE_SECONDS = 10.0
+    MAX_RETRY_ATTEMPTS = 3
+    ENRICHMENT_ENABLED = True
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o0004000
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class WorkQueue:
+    """
+    Persistent work queue of files to upload, stored in SQLite
+
+    Each file version (path, size, mtime) is queued once. Jobs left
+    'running' by a crashed daemon are re-queued on startup; failed jobs are
+    retried up to MAX_RETRY_ATTEMPTS times.
+    """
+
+    def __init__(self, path: str = WATCH_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                enqueued_at REAL NOT NULL,
+                finished_at REAL,
+                UNIQUE (path, size, mtime)
+            )""")
+        self.connection.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+
+    def put(self, path: str, size: int, mtime: float) -> bool:
+        """
+        Queue a file version
+
+        Returns:
+            bool: True if newly queued (False if this version was seen before)
+        """
+        with self._lock:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO jobs (path, size, mtime, enqueued_at) VALUES (?, ?, ?, ?)",
+                (path, size, mtime, time.time()))
+            return cursor.rowcount == 1
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Take the oldest pending job and mark it running
+
+        Returns:
+            Dict with job id and path, or None if the queue is empty
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT id, path, attempts FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?", (row[0],))
+            return {'id': row[0], 'path': row[1], 'attempts': row[2] + 1}
+
+    def complete(self, job_id: int):
+        """Mark a job done"""
+        with self._lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = 'done', error = NULL, finished_at = ? WHERE id = ?",
+                (time.time(), job_id))
+
+    def fail(self, job_id: int, error: str):
+        """Mark a job failed; it is re-queued until MAX_RETRY_ATTEMPTS is reached"""
+        with self._lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts > ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, finished_at = ? WHERE id = ?",
+                (MAX_RETRY_ATTEMPTS, error[:1000], time.time(), job_id))
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Get number of jobs per status
+
+        Returns:
+            Dict mapping status to job count
+        """
+        with self._lock:
+            return dict(self.connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        """Close the queue database"""
+        with self._lock:
+            self.connection.close()
+
+
+class _InotifyBackend:
+    """Change notifications through Linux inotify (via ctypes)"""
+
+    def __init__(self, folders: List[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders: Dict[int, str] = {}
+        for folder in folders:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(folder),
+                                        IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+            self.folders[wd] = folder
+
+    def wait(self, timeout: float) -> List[str]:
+        """Wait for events and return the changed file paths"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            wd, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name and wd in self.folders:
+                paths.append(os.path.join(self.folders[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    """Change detection by periodic directory scans"""
+
+    def __init__(self, folders: List[str], interval: float = WATCH_POLL_INTERVAL):
+        self.folders = folders
+        self.interval = interval
+        self.seen: Dict[str, Tuple[int, float]] = {}
+
+    def wait(self, timeout: float) -> List[str]:
+        """Sleep for one poll interval and return new or changed file paths"""
+        time.sleep(min(timeout, self.interval))
+        paths = []
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime)
+                if self.seen.get(entry.path) != signature:
+                    self.seen[entry.path] = signature
+                    paths.append(entry.path)
+        return paths
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    Watches drop folders and reports files once they are fully written
+
+    A matching file is considered complete when its size and mtime have not
+    changed for WATCH_SETTLE_SECONDS (exports are often copied over SFTP/SMB
+    in several writes). inotify is used on Linux, polling elsewhere or when
+    inotify is unavailable.
+    """
+
+    def __init__(self, folders: List[str], on_ready: Callable[[str, int, float], None],
+                 settle_seconds: float = WATCH_SETTLE_SECONDS, use_inotify: bool = True):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.on_ready = on_ready
+        self.settle_seconds = settle_seconds
+        self.pending: Dict[str, Tuple[int, float, float]] = {}
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+        self.backend = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self.backend = _InotifyBackend(self.folders)
+                self.logger.info("Watching with inotify")
+            except (OSError, AttributeError) as e:
+                self.logger.warning(f"inotify unavailable ({e}), falling back to polling")
+        if self.backend is None:
+            self.backend = _PollingBackend(self.folders)
+            self.logger.info("Watching with polling")
+
+    def scan_existing(self):
+        """Queue files already present in the folders when the watcher starts"""
+        for folder in self.folders:
+            for name in sorted(os.listdir(folder)):
+                self._track(os.path.join(folder, name))
+
+    def run(self):
+        """Watch until stop() is called"""
+        self.scan_existing()
+        while not self.stop_event.is_set():
+            for path in self.backend.wait(timeout=1.0):
+                self._track(path)
+            self._check_settled()
+        self.backend.close()
+
+    def stop(self):
+        """Stop watching"""
+        self.stop_event.set()
+
+    def _track(self, path: str):
+        """Start (or restart) the settle timer of a matching file"""
+        if command_for_file(path) is None:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        previous = self.pending.get(path)
+        if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+            self.pending[path] = (stat.st_size, stat.st_mtime, time.monotonic())
+
+    def _check_settled(self):
+        """Hand over files whose size and mtime stayed unchanged long enough"""
+        now = time.monotonic()
+        for path, (size, mtime, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime, now)
+            elif now - since >= self.settle_seconds:
+                del self.pending[path]
+                self.on_ready(path, size, mtime)
+
+
+class WatchDaemon:
+    """
+    Continuous ingestion: watcher -> persistent queue -> upload pipeline
+
+    Files are upserted one by one with the 'newest' load mode, so a late
+    older export never overwrites rows of a newer one. Once an uploaded
+    batch has settled (queue drained, no file still being written), the
+    enriched cell table is rebuilt from the exports in the watched folders
+    if any of its source commands was uploaded.
+    """
+
+    def __init__(self, folders: List[str], db_manager, error_index=None,
+                 queue_path: str = WATCH_QUEUE_PATH, use_inotify: bool = True):
+        self.queue = WorkQueue(queue_path)
+        self.pipeline = UploadPipeline(db_manager, error_index)
+        self.watcher = FolderWatcher(folders, self._enqueue, use_inotify=use_inotify)
+        self.enrichment_due = False
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+    def _enqueue(self, path: str, size: int, mtime: float):
+        """Queue a settled file"""
+        if self.queue.put(path, size, mtime):
+            self.logger.info(f"Queued {os.path.basename(path)}")
+
+    def run(self):
+        """Run watcher and worker until stop() is called or Ctrl+C"""
+        watcher_thread = threading.Thread(target=self.watcher.run, daemon=True)
+        watcher_thread.start()
+        self.logger.info(f"Daemon started, watching: {', '.join(self.watcher.folders)}")
+        try:
+            while not self.stop_event.is_set():
+                job = self.queue.claim()
+                if job is None:
+                    if self.enrichment_due and not self.watcher.pending:
+                        self._enrich()
+                    self.stop_event.wait(1.0)
+                    continue
+                self._process(job)
+        except KeyboardInterrupt:
+            self.logger.info("Daemon interrupted")
+        finally:
+            self.watcher.stop()
+            watcher_thread.join(timeout=5.0)
+            self.queue.close()
+
+    def _process(self, job: Dict[str, Any]):
+        """Upload one queued file"""
+        try:
+            rows = self.pipeline.process_path(job['path'])
+            self.queue.complete(job['id'])
+            self.logger.info(f"Uploaded {os.path.basename(job['path'])}: {rows} rows")
+        except Exception as e:
+            self.queue.fail(job['id'], str(e))
+            self.logger.error(f"Upload of {job['path']} failed (attempt {job['attempts']}): {e}")
+            return
+        spec = spec_for_file(job['path'])
+        if ENRICHMENT_ENABLED and spec is not None and spec.join_role:
+            self.enrichment_due = True
+
+    def _enrich(self):
+        """Rebuild the enriched cell table from the base and auxiliary exports of all folders"""
+        self.enrichment_due = False
+        specs = [spec for spec in iter_specs() if spec.join_role]
+        detected: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            for folder in self.watcher.folders:
+                for command, files in detect_files(folder, specs).items():
+                    detected.setdefault(command, []).extend(files)
+            rows = self.pipeline.process_enrichment(detected)
+            self.logger.info(f"Refreshed {ENRICHED_TABLE}: {rows} rows")
+        except Exception as e:
+            self.logger.error(f"Refreshing {ENRICHED_TABLE} failed: {e}")
+
+    def stop(self):
+        """Stop the daemon"""
+        self.stop_event.set()
@@ -37,7 +37,7 @@ def main():
         print("✅ Application started successfully!")
         print("💡 Features available in demo mode:")
         print("   • File folder selection")
-        print("   • Simulated file detection")
+        print("   • File detection with per-file encoding")
         print("   • Simulated upload process")
         print("   • Professional GUI interface")
         print("   • About tab with scrolling")
@@ -15,8 +15,7 @@ with advanced batch processing capabilities and a modern GUI interface.
 
 import os
 import sys
-import tkinter as tk
-from tkinter import ttk, messagebox
+import argparse
 import webbrowser
 
 # Add project root to path
@@ -29,10 +28,9 @@ except ImportError:
     print("Error: config.py not found. Please create config.py with your database settings.")
     sys.exit(1)
 
-# Import core modules
+# Import core modules (the GUI and Tk are imported only when the GUI starts,
+# so headless modes run on machines without a display)
 try:
-    from core.gui import MMLUploaderGUI
-    from core.auth import AuthenticationManager
     from core.database import DatabaseManager
 except ImportError:
     print("Error: Core modules not found. Please ensure all required files are present.")
@@ -63,15 +61,222 @@ https://saweria.co/HDfauzan
 © 2025 Hadi Fauzan Hanif. All rights reserved.
     """
     
+    from tkinter import messagebox
     messagebox.showinfo("About MML to DB Uploader", about_text.strip())
 
 def open_donation():
     """Open donation page"""
     webbrowser.open("https://saweria.co/HDfauzan")
 
-def main():
-    """Main application entry point"""
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description=f"MML to DB Uploader v{SCRIPT_VERSION}")
+    parser.add_argument("--watch", nargs="+", metavar="FOLDER",
+                        help="Run headless in daemon mode, uploading new exports dropped in FOLDER(s)")
+    parser.add_argument("--jobs", nargs="+", metavar="FOLDER[:PRIORITY]",
+                        help="Upload several source folders headless on one shared worker pool")
+    parser.add_argument("--export", choices=["parquet", "csv", "sqlite"],
+                        help="Parse FOLDER (--source) to offline files instead of uploading to the database")
+    parser.add_argument("--source", metavar="FOLDER", help="Source folder for --export")
+    parser.add_argument("--output", metavar="PATH", help="Output folder or .sqlite file for --export")
+    parser.add_argument("--load-exports", metavar="PATH",
+                        help="Bulk-load a previous --export output into the database")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the local job server that queues uploads from several users")
+    parser.add_argument("--submit", nargs="+", metavar="FOLDER[:PRIORITY]",
+                        help="Send source folder(s) to the job server and follow their progress")
+    parser.add_argument("--server", metavar="URL",
+                        help="Job server URL for --submit (default: JOB_SERVER_URL or local server)")
+    parser.add_argument("--user", metavar="NAME", help="User name for --submit")
+    args = parser.parse_args()
+    if args.export and not args.source:
+        parser.error("--export requires --source FOLDER")
+    for name in ("source", "output", "load_exports"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    if args.watch:
+        args.watch = [os.path.abspath(folder) for folder in args.watch]
+    if args.jobs:
+        args.jobs = parse_job_specs(args.jobs)
+    if args.submit:
+        args.submit = parse_job_specs(args.submit)
+    return args
+
+def parse_job_specs(specs):
+    """Split FOLDER[:PRIORITY] arguments into (absolute folder, priority) pairs"""
+    jobs = []
+    for spec in specs:
+        folder, _, priority = spec.rpartition(":")
+        if not folder or not priority.isdigit():
+            folder, priority = spec, "1"
+        jobs.append((os.path.abspath(folder), int(priority)))
+    return jobs
+
+def run_daemon(folders, db_manager):
+    """Run the watch-folder daemon until interrupted"""
+    from core.watcher import WatchDaemon
+    from core.error_report import SiteErrorIndex
+    
+    error_index = SiteErrorIndex()
+    daemon = WatchDaemon(folders, db_manager, error_index)
+    print(f"👀 Watching {', '.join(folders)} - press Ctrl+C to stop")
+    daemon.run()
+    if error_index.total_errors:
+        os.makedirs(ERROR_REPORT_DIR, exist_ok=True)
+        path = error_index.write_csv(os.path.join(ERROR_REPORT_DIR, "daemon_errors.csv"))
+        print(f"⚠️ {error_index.total_errors} rows rejected, see {path}")
+
+def run_jobs(jobs):
+    """Run several source folders on the shared scheduler with a CLI progress view"""
+    import time
+    from core.scheduler import UploadScheduler, format_progress
+    
+    scheduler = UploadScheduler()
+    for folder, priority in jobs:
+        scheduler.add_job(folder, priority)
+    try:
+        while not scheduler.wait(timeout=2.0):
+            print(format_progress(scheduler.get_progress()) + "\n")
+    except KeyboardInterrupt:
+        print("⏹️ Cancelling jobs...")
+        for job_id in list(scheduler.jobs):
+            scheduler.cancel_job(job_id)
+    finally:
+        scheduler.shutdown()
+    
+    progress = scheduler.get_progress()
+    print(format_progress(progress))
+    os.makedirs(ERROR_REPORT_DIR, exist_ok=True)
+    for job in scheduler.jobs.values():
+        if job.error_index.total_errors:
+            path = job.error_index.write_csv(os.path.join(ERROR_REPORT_DIR, f"{job.name}_errors.csv"))
+            print(f"⚠️ {job.name}: {job.error_index.total_errors} rows rejected, see {path}")
+
+def run_server():
+    """Run the local job server until interrupted"""
+    from core.job_server import JobServer
+    
+    server = JobServer()
+    print(f"🖧 Job server listening on {server.url} - press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("⏹️ Stopping job server...")
+    finally:
+        server.stop()
+
+def run_submit(args):
+    """
+    Submit folders to the job server and print streamed progress
+    
+    The user is authenticated by the server's /login, not by the GUI login.
+    
+    Returns:
+        int: Exit code (1 if a job did not finish successfully)
+    """
+    import getpass
+    from core.job_server import JobClient, FINISHED_STATUSES
+    
+    client = JobClient(args.server or JOB_SERVER_URL or f"http://{JOB_SERVER_HOST}:{JOB_SERVER_PORT}")
+    user = args.user or input("User: ")
+    client.login(user, getpass.getpass(f"Password for {user}: "))
+    jobs = [client.submit(folder, priority) for folder, priority in args.submit]
+    failed = 0
+    try:
+        for job in jobs:
+            progress = None
+            for progress in client.stream(job['id']):
+                print(f"[{progress['name']}] {progress['status']} {progress['percent']:.0f}% - "
+                      f"{progress['files_done']}/{progress['files_total']} files, {progress['rows']} rows")
+            if progress is None or progress['status'] not in FINISHED_STATUSES:
+                # The stream ended before the job did (server restarted or job forgotten)
+                print(f"❌ Lost track of job {job['id']} ({job['name']})")
+                failed += 1
+                continue
+            if progress['rejected_rows']:
+                print(f"⚠️ {progress['name']}: {progress['rejected_rows']} rows rejected")
+            if progress['status'] != 'done':
+                failed += 1
+    except KeyboardInterrupt:
+        print("⏹️ Cancelling jobs...")
+        for job in jobs:
+            client.cancel(job['id'])
+        return 1
+    finally:
+        client.logout()
+    return 1 if failed else 0
+
+def run_export(args):
+    """Parse a folder into offline Parquet/CSV/SQLite files (no database needed)"""
+    from core.file_reader import detect_files
+    from core.pipeline import UploadPipeline
+    from core.sinks import create_sink
+    
+    default_name = "mml_export.sqlite" if args.export == "sqlite" else f"mml_export_{args.export}"
+    output = args.output or os.path.abspath(os.path.join(EXPORT_DIR, default_name))
+    sink = create_sink(args.export, output)
+    try:
+        rows = UploadPipeline(sink, log_callback=print).process_detected(detect_files(args.source), 'upsert')
+    finally:
+        sink.close()
+    print(f"📦 Exported {rows} rows to {output}")
+
+def run_load_exports(path, db_manager):
+    """Bulk-load an offline export into the database"""
+    from core.sinks import load_exported
+    
+    for table_name, rows in load_exported(path, db_manager).items():
+        print(f"✅ {table_name}: {rows} rows loaded")
+
+def run_headless(args):
+    """
+    Run the requested headless mode, if any
+    
+    Headless modes never touch Tk: errors are printed to stderr and
+    reported through the exit code.
+    
+    Returns:
+        int: Exit code, or None if no headless mode was requested (start the GUI)
+    """
+    if not (args.export or args.submit or args.watch or args.jobs or args.load_exports or args.serve):
+        return None
     try:
+        # Offline export and job submission need no database connection
+        if args.export:
+            run_export(args)
+            return 0
+        if args.submit:
+            return run_submit(args)
+        
+        db_manager = DatabaseManager()
+        if not db_manager.test_connection():
+            print("Error: Unable to connect to database. Please check your configuration in config.py",
+                  file=sys.stderr)
+            return 1
+        
+        if args.watch:
+            run_daemon(args.watch, db_manager)
+        elif args.jobs:
+            run_jobs(args.jobs)
+        elif args.load_exports:
+            run_load_exports(args.load_exports, db_manager)
+        else:
+            run_server()
+        return 0
+        
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+def run_gui():
+    """Authenticate and run the GUI"""
+    import tkinter as tk
+    from tkinter import messagebox
+    
+    try:
+        from core.gui import MMLUploaderGUI
+        from core.auth import AuthenticationManager
+        
         # Initialize authentication
         auth_manager = AuthenticationManager()
         
@@ -101,7 +306,20 @@ def main():
         messagebox.showerror("Startup Error", error_msg)
         sys.exit(1)
 
+def main(args=None):
+    """Main application entry point"""
+    # Command line modes are dispatched before any GUI login or message box
+    if args is not None:
+        exit_code = run_headless(args)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    
+    run_gui()
+
 if __name__ == "__main__":
+    # Parse arguments before changing directory (relative folders)
+    args = parse_arguments()
+    
     # Set application properties
     if hasattr(sys, 'frozen'):
         # Running as compiled executable
@@ -114,4 +332,4 @@ if __name__ == "__main__":
     os.chdir(application_path)
     
     # Start application
-    main()
+    main(args)
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test configuration for MML to DB Uploader
+Makes the project root importable when running: python -m pytest -q
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test doubles for MML to DB Uploader
+A DatabaseManager that records statements instead of talking to a server
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+from typing import Optional, Dict, List, Tuple, Any, Callable
+
+from core.database import DatabaseManager
+
+# A small LST CELL report as exported by the OSS
+LST_CELL_EXPORT = """+++    NE1        2024-01-02 10:00:00
+O&M    #1
+%%LST CELL:;%%
+RETCODE = 0  Operation succeeded
+
+Cell
+----
+Local Cell ID  Cell Name  Cell ID  Cell active state
+
+0              C0         0        Active
+1              C1         1        Active
+(Number of results = 2)
+
+---    END
+"""
+
+
+class DriverError(Exception):
+    """Exception shaped like a pymysql error: args[0] is the MySQL error code"""
+
+    def __init__(self, code: int, message: str = "driver error"):
+        super().__init__(code, message)
+
+
+class RecordingManager(DatabaseManager):
+    """
+    DatabaseManager whose statements are recorded, never sent anywhere
+
+    Query results are scripted by substring: the first rule whose text
+    occurs in the statement answers it, either with a result (a list of
+    row tuples, or None for a failed query) or by raising an exception.
+    Batches succeed unless fail_batch(query, rows) returns an exception
+    to raise for them.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[str, Any]]] = None,
+                 fail_batch: Optional[Callable[[str, List[Tuple]], Optional[Exception]]] = None):
+        super().__init__()
+        self.is_connected = True
+        self.rules = list(rules or [])
+        self.fail_batch = fail_batch
+        self.queries: List[str] = []
+        self.params: List[Optional[Dict]] = []
+        self.batches: List[Tuple[str, List[Tuple]]] = []
+        self.rows_written: List[Tuple] = []
+
+    def execute_query(self, query: str, params: Optional[Dict] = None):
+        self.queries.append(query)
+        self.params.append(params)
+        return super().execute_query(query, params)
+
+    def _execute_query_once(self, query: str, params: Optional[Dict] = None):
+        for text, result in self.rules:
+            if text in query:
+                if isinstance(result, Exception):
+                    raise result
+                return result
+        return []
+
+    def _execute_batch_once(self, query: str, data: List[Tuple]) -> bool:
+        self.batches.append((query, list(data)))
+        error = self.fail_batch(query, data) if self.fail_batch else None
+        if error is not None:
+            raise error
+        self.rows_written.extend(data)
+        return True
+
+    def _refresh_connection(self):
+        pass
+
+    def statements(self, text: str) -> List[str]:
+        """Recorded statements containing text"""
+        return [query for query in self.queries if text in query]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for adaptive batch sizing
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pytest
+
+import core.database
+from core.batching import AdaptiveBatchSizer
+from fakes import RecordingManager, DriverError
+
+
+def sizer(**overrides):
+    options = dict(initial_size=1000, min_size=50, max_size=20000, target_seconds=2.0)
+    options.update(overrides)
+    return AdaptiveBatchSizer(**options)
+
+
+def test_full_fast_batches_grow_additively():
+    controller = sizer()
+    controller.record_success(1000, 0.5)
+    assert controller.batch_size == 1100
+    controller.record_success(1100, 0.5)
+    assert controller.batch_size == 1200
+    # A short tail batch says nothing about the limit
+    controller.record_success(10, 0.01)
+    assert controller.batch_size == 1200
+
+
+def test_slow_or_failed_batches_halve_down_to_the_minimum():
+    controller = sizer()
+    controller.record_success(1000, 3.0)
+    assert controller.batch_size == 500
+    assert controller.record_failure()
+    assert controller.batch_size == 250
+    for _ in range(3):
+        controller.record_failure()
+    assert controller.batch_size == 50
+    assert not controller.record_failure()
+    assert controller.get_stats()['failures'] == 5
+
+
+def test_batches_never_exceed_max_allowed_packet():
+    controller = sizer(max_allowed_packet=10000)
+    query = "INSERT INTO `t` (`a`) VALUES (%s)"
+    rows = [('x' * 95,)] * 10
+    controller.calibrate(query, rows)
+
+    assert controller.row_size == AdaptiveBatchSizer.estimate_row_size(rows[0]) == 100
+    assert controller.packet_limit == int((10000 * 0.8 - len(query)) // 100)
+    assert controller.batch_size == controller.packet_limit
+    controller.record_success(controller.batch_size, 0.1)
+    assert controller.batch_size == controller.packet_limit
+
+
+def test_row_size_estimate():
+    assert AdaptiveBatchSizer.estimate_row_size((None, b'ab', 'ü', 12)) == 2 + 5 + 8 + 5 + 5
+
+
+@pytest.mark.parametrize("adaptive", [True, False])
+def test_failed_batch_is_retried_smaller(monkeypatch, adaptive):
+    monkeypatch.setattr(core.database, 'ADAPTIVE_BATCH_SIZE', adaptive)
+    monkeypatch.setattr(core.database, 'BATCH_SIZE', 100)
+
+    def too_large(query, rows):
+        return DriverError(1153, "Got a packet bigger than 'max_allowed_packet'") if len(rows) > 60 else None
+
+    manager = RecordingManager(fail_batch=too_large)
+    manager.batch_sizers['t'] = sizer(initial_size=100, min_size=10)
+    rows = [(i,) for i in range(250)]
+    assert manager.execute_batches("INSERT INTO `t` (`a`) VALUES (%s)", rows, 't') == adaptive
+    if adaptive:
+        assert manager.rows_written == rows
+        # Only the oversized attempts failed; every retry went through smaller
+        assert [len(batch) for _, batch in manager.batches if len(batch) > 60] == [100, 70]
+        assert manager.batch_sizers['t'].get_stats()['failures'] == 2
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for bulk-load session tuning and constraint verification
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pytest
+
+from fakes import RecordingManager, DriverError
+
+# SHOW INDEX rows: Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+INDEXES = [
+    ('lst_cell', 0, 'PRIMARY', 1, 'NE', 'A', 0, None, None, '', 'BTREE'),
+    ('lst_cell', 0, 'PRIMARY', 2, 'LocalCellId', 'A', 0, None, None, '', 'BTREE'),
+    ('lst_cell', 0, 'uk_cell_name', 1, 'CellName', 'A', 0, None, None, 'YES', 'BTREE'),
+    ('lst_cell', 1, 'idx_site', 1, 'SiteId', 'A', 0, None, None, 'YES', 'BTREE'),
+]
+SETTINGS = ('SELECT @@SESSION.unique_checks', [(1, 1, 1)])
+COLUMNS = ['NE', 'LocalCellId', 'CellName']
+ROWS = [('NE1', 1, 'A'), ('NE1', 2, 'B')]
+
+
+def upload(manager):
+    return manager.upload_table('lst_cell', COLUMNS, ROWS, mode='upsert')
+
+
+def test_unique_check_skips_primary_key_and_nulls():
+    manager = RecordingManager([('SHOW INDEX', INDEXES)])
+    assert manager.verify_constraints(['lst_cell']) == []
+    checks = manager.statements('HAVING COUNT(*) > 1')
+    assert checks == ["SELECT COUNT(*) FROM (SELECT 1 FROM `lst_cell` WHERE `CellName` IS NOT NULL "
+                      "GROUP BY `CellName` HAVING COUNT(*) > 1) AS duplicates"]
+
+
+def test_duplicated_unique_key_is_reported():
+    manager = RecordingManager([('SHOW INDEX', INDEXES), ('AS duplicates', [(3,)])])
+    assert manager.verify_constraints(['lst_cell']) == ['lst_cell.uk_cell_name: 3 duplicated keys']
+
+
+def test_clean_session_commits_and_restores_settings():
+    manager = RecordingManager([SETTINGS])
+    with manager.bulk_session(['lst_cell']):
+        assert manager.in_bulk_session
+        assert upload(manager)
+    assert not manager.in_bulk_session
+    assert manager.statements('COMMIT') == ['COMMIT']
+    assert manager.statements('ROLLBACK') == []
+    assert manager.queries[-1].startswith('SET SESSION unique_checks = %(unique_checks)s')
+    assert manager.params[-1] == {'unique_checks': 1, 'foreign_key_checks': 1, 'autocommit': 1}
+
+
+def test_failed_batch_rolls_back_session():
+    manager = RecordingManager([SETTINGS], fail_batch=lambda query, rows: DriverError(1213, "deadlock"))
+    with pytest.raises(RuntimeError, match="inside bulk session"):
+        with manager.bulk_session(['lst_cell']):
+            upload(manager)
+    # No retry and no halving inside the session: one attempt, then rollback
+    assert len(manager.batches) == 1
+    assert manager.statements('ROLLBACK') == ['ROLLBACK']
+    assert manager.statements('COMMIT') == []
+    assert not manager.in_bulk_session
+
+
+def test_constraint_violation_rolls_back_session():
+    manager = RecordingManager([SETTINGS, ('SHOW INDEX', INDEXES), ('AS duplicates', [(1,)])])
+    with pytest.raises(RuntimeError, match="Constraint violations"):
+        with manager.bulk_session(['lst_cell']):
+            upload(manager)
+    assert manager.statements('ROLLBACK') == ['ROLLBACK']
+
+
+def test_failed_set_session_raises_before_loading():
+    manager = RecordingManager([SETTINGS, ('autocommit = 0', None)])
+    with pytest.raises(RuntimeError, match="SET SESSION failed"):
+        with manager.bulk_session(['lst_cell']):
+            pytest.fail("block must not run")
+    assert manager.statements('ROLLBACK') == ['ROLLBACK']
+
+
+def test_failed_commit_raises():
+    manager = RecordingManager([SETTINGS, ('COMMIT', None)])
+    with pytest.raises(RuntimeError, match="COMMIT failed"):
+        with manager.bulk_session(['lst_cell']):
+            upload(manager)
+    assert manager.statements('ROLLBACK') == ['ROLLBACK']
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the command spec registry
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pytest
+
+import core.commands
+import core.mml_parser
+from core.commands import CommandSpec, register, get_spec, spec_for_file, spec_for_table
+from core.file_reader import detect_files
+from core.pipeline import UploadPipeline
+from fakes import RecordingManager, LST_CELL_EXPORT
+
+NR_EXPORT = LST_CELL_EXPORT.replace("LST CELL", "LST NRCELL")
+
+
+@pytest.fixture
+def nr_spec(monkeypatch):
+    """Register LST NRCELL on a copy of the registry (removed again after the test)"""
+    monkeypatch.setattr(core.commands, '_REGISTRY', dict(core.commands._REGISTRY))
+    monkeypatch.setattr(core.mml_parser, 'PARSE_CACHE_ENABLED', False)
+    return register(CommandSpec('LST NRCELL', ['NE', 'LocalCellId'],
+                                columns={'CellActiveState': 'str', 'Bandwidth': 'float'},
+                                description='NR cell configuration data'))
+
+
+def test_registered_command_drives_detection(nr_spec, tmp_path):
+    (tmp_path / "LST NRCELL_a.txt").write_text(NR_EXPORT, encoding='ascii')
+    (tmp_path / "LST CELL_a.txt").write_text(LST_CELL_EXPORT, encoding='ascii')
+
+    assert get_spec('LST NRCELL') is nr_spec
+    assert spec_for_file("/drop/LST NRCELL_20240102.txt") is nr_spec
+    assert spec_for_file("LST NRCELLX_20240102.txt") is None
+    assert spec_for_table('lst_nrcell') is nr_spec
+    detected = detect_files(str(tmp_path))
+    assert [f['name'] for f in detected['LST NRCELL']] == ["LST NRCELL_a.txt"]
+    assert [f['name'] for f in detected['LST CELL']] == ["LST CELL_a.txt"]
+
+
+def test_registered_command_drives_types_and_schema(nr_spec, tmp_path):
+    path = tmp_path / "LST NRCELL_a.txt"
+    path.write_text(NR_EXPORT, encoding='ascii')
+    detected = detect_files(str(tmp_path), [nr_spec])
+
+    frame, = list(core.mml_parser.parse_file(detected['LST NRCELL'][0]))
+    assert str(frame['LocalCellId'].dtype) == 'Int64'
+    assert frame['CellActiveState'].tolist() == ['Active', 'Active']
+    assert nr_spec.sql_types(['NE', 'LocalCellId', 'ExportTime', 'CellActiveState', 'CellName', 'Bandwidth']) == {
+        'NE': 'VARCHAR(64)', 'LocalCellId': 'BIGINT', 'ExportTime': 'DATETIME',
+        'CellActiveState': 'VARCHAR(64)', 'CellName': 'TEXT', 'Bandwidth': 'DOUBLE'}
+
+    manager = RecordingManager()
+    assert UploadPipeline(manager).process_command('LST NRCELL', detected['LST NRCELL'], 'upsert') == 2
+    create, = manager.statements('CREATE TABLE')
+    assert "`lst_nrcell`" in create
+    assert "`LocalCellId` BIGINT" in create
+    assert "PRIMARY KEY (`NE`, `LocalCellId`)" in create
+
+
+def test_fingerprint_follows_types_and_keys(nr_spec):
+    fingerprint = nr_spec.fingerprint()
+    assert CommandSpec('LST NRCELL', ['NE', 'LocalCellId'],
+                       columns={'CellActiveState': 'str', 'Bandwidth': 'float'}).fingerprint() == fingerprint
+    assert CommandSpec('LST NRCELL', ['NE', 'LocalCellId'],
+                       columns={'Bandwidth': 'int'}).fingerprint() != fingerprint
+    assert CommandSpec('LST NRCELL', ['NE', 'CellName']).fingerprint() != fingerprint
+
+
+def test_invalid_registrations_are_rejected(nr_spec):
+    with pytest.raises(ValueError, match="already registered"):
+        register(CommandSpec('LST NRCELL', ['NE']))
+    with pytest.raises(ValueError, match="Only one base command"):
+        register(CommandSpec('LST NRCELL2', ['NE'], join_role='base'))
+    with pytest.raises(ValueError, match="Unknown column types"):
+        CommandSpec('LST X', ['NE'], columns={'A': 'decimal'})
+    with pytest.raises(ValueError, match="Unknown load mode"):
+        CommandSpec('LST X', ['NE'], load_mode='append')
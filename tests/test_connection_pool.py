@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the shared database connection pool
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+from core.database import ConnectionPool
+
+
+class FakeManager:
+    def __init__(self):
+        self.metrics = {'retries': 0, 'permanent_errors': 0}
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+        return True
+
+    def disconnect(self):
+        self.connected = False
+
+    def get_metrics(self):
+        return dict(self.metrics)
+
+
+def test_metrics_include_borrowed_connections():
+    pool = ConnectionPool(size=2, factory=FakeManager)
+    with pool.connection() as first:
+        first.metrics['retries'] = 3
+        with pool.connection() as second:
+            second.metrics['permanent_errors'] = 1
+            metrics = pool.get_metrics()
+            assert metrics['connections'] == 2
+            assert metrics['idle'] == 0
+            assert metrics['retries'] == 3
+            assert metrics['permanent_errors'] == 1
+    metrics = pool.get_metrics()
+    assert (metrics['idle'], metrics['retries'], metrics['permanent_errors']) == (2, 3, 1)
+
+
+def test_connections_are_reused_within_budget():
+    pool = ConnectionPool(size=1, factory=FakeManager)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    pool.close()
+    assert not first.connected
+    assert pool.get_metrics() == {'connections': 0, 'idle': 0}
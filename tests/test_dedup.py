@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for cross-file de-duplication
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from core.dedup import KeyDeduplicator, INDEX_BYTES_PER_KEY
+from core.spill import MemoryBudget
+
+KEY_COLUMNS = ['NE', 'LocalCellId']
+
+
+def make_frame(rows):
+    return pd.DataFrame(rows, columns=['NE', 'LocalCellId', 'ExportTime', 'CellName'])
+
+
+# Three overlapping exports in processing order
+FILES = [
+    make_frame([
+        ['NE1', '1', '2024-01-01 10:00:00', 'old'],
+        ['NE1', '2', '2024-01-03 10:00:00', 'newest'],
+        ['NE2', '1', None, 'no time'],
+    ]),
+    make_frame([
+        ['NE1', '1', '2024-01-02 10:00:00', 'newer'],
+        ['NE1', '2', '2024-01-01 10:00:00', 'stale'],
+        ['NE2', '1', '2023-12-31 10:00:00', 'timed'],
+        ['NE3', '5', '2024-01-02 10:00:00', 'tie file 1'],
+    ]),
+    make_frame([
+        ['NE3', '5', '2024-01-02 10:00:00', 'tie file 2 row 0'],
+        ['NE3', '5', '2024-01-02 10:00:00', 'tie file 2 row 1'],
+    ]),
+]
+
+EXPECTED = {0: [1], 1: [0, 2], 2: [1]}
+
+
+def observe_all(dedup: KeyDeduplicator, chunk_size: int = 2):
+    for file_index, frame in enumerate(FILES):
+        for first_row in range(0, len(frame), chunk_size):
+            dedup.observe(frame.iloc[first_row:first_row + chunk_size], file_index, first_row)
+
+
+@pytest.mark.parametrize("max_keys", [1000, 1])
+def test_newest_version_wins(max_keys):
+    dedup = KeyDeduplicator(KEY_COLUMNS, max_keys=max_keys)
+    try:
+        observe_all(dedup)
+        for file_index, rows in EXPECTED.items():
+            assert dedup.winning_rows(file_index).tolist() == rows
+        assert dedup.unique_keys == 4
+        assert dedup.duplicates_dropped == 5
+        assert (dedup.spill is not None) == (max_keys == 1)
+    finally:
+        dedup.close()
+
+
+def test_spill_indexes_winners_by_file():
+    dedup = KeyDeduplicator(KEY_COLUMNS, max_keys=1)
+    try:
+        observe_all(dedup)
+        dedup.winning_rows(0)
+        indexes = [name for (name,) in dedup.spill.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")]
+        assert 'winners_file' in indexes
+        spill_path = dedup.spill_path
+    finally:
+        dedup.close()
+    assert not os.path.exists(spill_path)
+
+
+def test_filter_keeps_winning_rows_per_chunk():
+    dedup = KeyDeduplicator(KEY_COLUMNS)
+    try:
+        observe_all(dedup)
+        winners = dedup.winning_rows(1)
+        frame = FILES[1]
+        kept = pd.concat([KeyDeduplicator.filter(frame.iloc[first:first + 2], first, winners)
+                          for first in range(0, len(frame), 2)])
+        assert kept['CellName'].tolist() == ['newer', 'timed']
+    finally:
+        dedup.close()
+
+
+def test_observe_filtered_chunk_with_row_positions():
+    frame = FILES[1]
+    valid = frame[frame['NE'] != 'NE1']
+    dedup = KeyDeduplicator(KEY_COLUMNS)
+    try:
+        dedup.observe(valid, 0, 0, frame.index.get_indexer(valid.index))
+        assert dedup.winning_rows(0).tolist() == [2, 3]
+        assert dedup.rows_seen == 2
+    finally:
+        dedup.close()
+
+
+def test_budget_accounts_index_bytes():
+    budget = MemoryBudget(limit_mb=1)
+    dedup = KeyDeduplicator(KEY_COLUMNS, budget=budget)
+    observe_all(dedup)
+    assert budget.used == 4 * INDEX_BYTES_PER_KEY
+    dedup.close()
+    assert budget.used == 0
+
+
+def test_exceeded_budget_spills_index():
+    budget = MemoryBudget(limit_mb=0)
+    dedup = KeyDeduplicator(KEY_COLUMNS, budget=budget)
+    try:
+        observe_all(dedup)
+        assert dedup.spill is not None
+        assert budget.used == 0
+        assert dedup.winning_rows(2).tolist() == [1]
+    finally:
+        dedup.close()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the SITE_ID error index and the row-by-row batch fallback
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import csv
+import os
+
+import pytest
+
+import core.database
+from core.error_report import SiteErrorIndex
+from fakes import RecordingManager, DriverError
+
+COLUMNS = ['NE', 'SITE_ID', 'LocalCellId', 'CellName']
+ROWS = [('NE1', 'S1', 1, 'ok'), ('NE1', 'S1', 2, 'bad'), ('NE2', 'S2', 1, 'ok')]
+
+
+def test_spilled_keys_merge_back_into_summary():
+    index = SiteErrorIndex(max_keys=2, sample_rows=2)
+    for number in range(3):
+        index.add('S1', 'NE1', 'invalid LocalCellId', {'row': number})
+    index.add('S2', 'NE2', 'empty NE')
+    index.add_count('S3', 'NE3', 'MySQL 1366', 5, [{'row': 'a'}])
+    index.add('S1', 'NE1', 'invalid LocalCellId', {'row': 3})
+    assert index.spill_files
+
+    summary = index.summary()
+    assert [(e['site_id'], e['error_class'], e['count']) for e in summary] == [
+        ('S3', 'MySQL 1366', 5), ('S1', 'invalid LocalCellId', 4), ('S2', 'empty NE', 1)]
+    # Samples stay capped across the spill (in-memory ones first)
+    assert summary[1]['samples'] == [{'row': 3}, {'row': 0}]
+    assert index.total_errors == 10
+
+    spill_files = list(index.spill_files)
+    index.clear()
+    assert index.summary() == []
+    assert not any(os.path.exists(path) for path in spill_files)
+
+
+def test_add_row_finds_site_column(tmp_path):
+    index = SiteErrorIndex()
+    index.add_row(COLUMNS, ROWS[1], 'MySQL 1366')
+    index.add_row(['NE', 'CellName'], ('NE9', 'x'), 'MySQL 1366')
+    path = index.write_csv(str(tmp_path / "errors.csv"))
+    with open(path, newline='', encoding='utf-8') as report:
+        lines = list(csv.reader(report))
+    assert lines[0] == ['SITE_ID', 'NE', 'Error Class', 'Count', 'Sample Row']
+    assert sorted(line[:4] for line in lines[1:]) == [['NE9', 'NE9', 'MySQL 1366', '1'],
+                                                      ['S1', 'NE1', 'MySQL 1366', '1']]
+
+
+@pytest.fixture(params=[True, False], ids=['adaptive', 'fixed'])
+def batching(request, monkeypatch):
+    monkeypatch.setattr(core.database, 'ADAPTIVE_BATCH_SIZE', request.param)
+    monkeypatch.setattr(core.database.time, 'sleep', lambda seconds: None)
+
+
+def fail_rows(error):
+    return lambda query, rows: error if any(row[3] == 'bad' for row in rows) else None
+
+
+def test_data_error_replays_rows_and_records_rejects(batching):
+    index = SiteErrorIndex()
+    manager = RecordingManager(fail_batch=fail_rows(DriverError(1366, "Incorrect integer value")))
+    assert manager.upload_table('lst_cell', COLUMNS, ROWS, mode='upsert', error_index=index)
+    assert manager.rows_written == [ROWS[0], ROWS[2]]
+    assert [(e['site_id'], e['ne'], e['error_class'], e['count']) for e in index.summary()] == [
+        ('S1', 'NE1', 'MySQL 1366', 1)]
+
+
+def test_connection_error_fails_upload_without_replay(batching):
+    index = SiteErrorIndex()
+    manager = RecordingManager(fail_batch=lambda query, rows: DriverError(2006, "server has gone away"))
+    assert not manager.upload_table('lst_cell', COLUMNS, ROWS, mode='upsert', error_index=index)
+    # One batch, retried MAX_RETRY_ATTEMPTS times, never halved or replayed row by row
+    assert len(manager.batches) == core.database.MAX_RETRY_ATTEMPTS + 1
+    assert {len(rows) for _, rows in manager.batches} == {len(ROWS)}
+    assert index.total_errors == 0
+
+
+def test_connection_lost_during_replay_fails_upload(batching):
+    def fail(query, rows):
+        if len(rows) > 1:
+            return DriverError(1366, "Incorrect integer value")
+        return DriverError(2013, "Lost connection")
+
+    index = SiteErrorIndex()
+    manager = RecordingManager(fail_batch=fail)
+    assert not manager.upload_table('lst_cell', COLUMNS, ROWS, mode='upsert', error_index=index)
+    assert index.total_errors == 0
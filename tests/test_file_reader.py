@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for chunked byte-line reading and encoding detection
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import codecs
+
+import pytest
+
+from core.file_reader import detect_encoding, iter_byte_lines, decode_field
+
+TEXT = "+++    NE1   2024-01-01 10:00:00\r\nCell Name  Id\r\n\r\nZürich 北  1\nlast\r\n\nno newline"
+LINES = TEXT.splitlines()
+CHUNK_SIZES = list(range(1, 9)) + [1024]
+
+
+def write(tmp_path, data: bytes):
+    path = tmp_path / "LST CELL_test.txt"
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("data, encoding", [
+    (TEXT.encode('utf-8'), 'utf-8'),
+    (codecs.BOM_UTF8 + TEXT.encode('utf-8'), 'utf-8-sig'),
+    (TEXT.encode('utf-16'), 'utf-16'),
+    (TEXT.encode('utf-16-le'), 'utf-16-le'),
+    (TEXT.encode('utf-16-be'), 'utf-16-be'),
+], ids=lambda value: value if isinstance(value, str) else '')
+def test_lines_do_not_depend_on_chunk_boundaries(tmp_path, data, encoding, chunk_size):
+    path = write(tmp_path, data)
+    assert detect_encoding(path) == encoding
+    lines = list(iter_byte_lines(path, encoding, chunk_size))
+    assert [decode_field(line, encoding) for line in lines] == LINES
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_utf16_is_transcoded_to_utf8(tmp_path, chunk_size):
+    path = write(tmp_path, TEXT.encode('utf-16'))
+    lines = list(iter_byte_lines(path, 'utf-16', chunk_size))
+    assert lines[3] == "Zürich 北  1".encode('utf-8')
+    assert b'\x00' not in b''.join(lines)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_trailing_newline_and_lone_cr(tmp_path, chunk_size):
+    path = write(tmp_path, b"a\rb\r\n\r\nc\n")
+    assert list(iter_byte_lines(path, 'ascii', chunk_size)) == [b'a', b'b', b'', b'c']
+
+
+def test_empty_file(tmp_path):
+    assert list(iter_byte_lines(write(tmp_path, b''), 'ascii', 4)) == []
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for streaming query results
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import numpy as np
+import pytest
+
+import core.database
+from fakes import RecordingManager, DriverError
+
+ROWS = [('NE1', 0, 1.5), ('NE1', 1, None), ('NE2', 0, 2.0), ('NE2', 1, 1.1), ('NE3', 0, 1.0)]
+
+
+class FakeCursor:
+    """Unbuffered cursor over a fixed result, optionally breaking after some rows"""
+
+    description = [('NE',), ('LocalCellId',), ('Vswr',)]
+
+    def __init__(self, rows, break_after=None):
+        self.rows = list(rows)
+        self.break_after = break_after
+        self.fetched = 0
+        self.closed = False
+
+    def _take(self, count):
+        if self.break_after is not None and self.fetched >= self.break_after:
+            raise DriverError(2013, "Lost connection to MySQL server during query")
+        rows = self.rows[self.fetched:self.fetched + count]
+        self.fetched += len(rows)
+        return rows
+
+    def fetchmany(self, size):
+        return self._take(size)
+
+    def fetchall_unbuffered(self):
+        while True:
+            rows = self._take(1)
+            if not rows:
+                return
+            yield rows[0]
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingManager(RecordingManager):
+    def __init__(self, cursor=None, open_errors=()):
+        super().__init__()
+        self.cursor = cursor
+        self.open_errors = list(open_errors)
+        self.opened = 0
+
+    def _open_stream(self, query, params=None):
+        self.opened += 1
+        if self.open_errors:
+            raise self.open_errors.pop(0)
+        return self.cursor
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(core.database.time, 'sleep', lambda seconds: None)
+
+
+def test_rows_are_streamed_one_by_one():
+    cursor = FakeCursor(ROWS)
+    assert list(StreamingManager(cursor).iter_query("SELECT ...")) == ROWS
+    assert cursor.closed
+
+
+def test_rows_are_chunked():
+    chunks = list(StreamingManager(FakeCursor(ROWS)).iter_query("SELECT ...", chunk_size=2))
+    assert chunks == [ROWS[0:2], ROWS[2:4], ROWS[4:]]
+
+
+def test_chunks_as_column_arrays():
+    chunks = list(StreamingManager(FakeCursor(ROWS)).iter_query(
+        "SELECT ...", chunk_size=3, as_arrays=True, dtypes={'Vswr': float, 'LocalCellId': np.int64}))
+    assert [len(chunk['NE']) for chunk in chunks] == [3, 2]
+    assert chunks[0]['NE'].dtype == object
+    assert chunks[0]['LocalCellId'].dtype == np.int64
+    assert np.isnan(chunks[0]['Vswr'][1])
+    np.testing.assert_array_equal(np.concatenate([chunk['LocalCellId'] for chunk in chunks]), [0, 1, 0, 1, 0])
+
+
+def test_broken_stream_raises_instead_of_ending_short():
+    cursor = FakeCursor(ROWS, break_after=2)
+    received = []
+    with pytest.raises(RuntimeError, match="broke off"):
+        for row in StreamingManager(cursor).iter_query("SELECT ..."):
+            received.append(row)
+    assert received == ROWS[:2]
+    assert cursor.closed
+
+
+def test_opening_is_retried_but_a_failed_query_raises():
+    manager = StreamingManager(FakeCursor(ROWS), open_errors=[DriverError(2006, "gone away")])
+    assert list(manager.iter_query("SELECT ...", chunk_size=10)) == [ROWS]
+    assert manager.opened == 2
+
+    manager = StreamingManager(FakeCursor(ROWS), open_errors=[DriverError(1146, "Table doesn't exist")])
+    with pytest.raises(RuntimeError, match="Streaming query failed"):
+        list(manager.iter_query("SELECT ..."))
+    assert manager.opened == 1
+
+
+def test_closing_early_releases_the_cursor():
+    cursor = FakeCursor(ROWS)
+    stream = StreamingManager(cursor).iter_query("SELECT ...", chunk_size=2)
+    assert next(stream) == ROWS[:2]
+    stream.close()
+    assert cursor.closed
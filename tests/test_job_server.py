@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the job server and its HTTP client
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import threading
+
+import pytest
+
+import core.mml_parser
+from core.job_server import JobServer, JobClient, JobServerError
+from core.scheduler import UploadScheduler
+from fakes import RecordingManager, LST_CELL_EXPORT
+
+
+@pytest.fixture
+def release():
+    """Batches block until this event is set, so jobs can be caught running"""
+    return threading.Event()
+
+
+@pytest.fixture
+def server(release, monkeypatch):
+    monkeypatch.setattr(core.mml_parser, 'PARSE_CACHE_ENABLED', False)
+    scheduler = UploadScheduler(max_workers=2, connection_budget=2, retention=3600,
+                                db_factory=lambda: RecordingManager(
+                                    fail_batch=lambda query, rows: release.wait(10) and None))
+    server = JobServer('127.0.0.1', 0, scheduler).start()
+    yield server
+    release.set()
+    server.stop()
+
+
+@pytest.fixture
+def folder(tmp_path):
+    (tmp_path / "LST CELL_a.txt").write_text(LST_CELL_EXPORT, encoding='ascii')
+    return str(tmp_path)
+
+
+def client_for(server, user='alice'):
+    client = JobClient(server.url, timeout=10)
+    client.login(user, 'secret')
+    return client
+
+
+def test_submit_and_stream_until_done(server, folder, release):
+    release.set()
+    client = client_for(server)
+    job = client.submit(folder, name='north')
+    assert job['user'] == 'alice'
+
+    events = list(client.stream(job['id']))
+    assert events[-1]['status'] == 'done'
+    assert events[-1]['files_done'] == 1
+    assert events[-1]['rows'] >= 2
+    assert client.get_errors(job['id']) == []
+    assert [j['name'] for j in client.list_jobs()] == ['north']
+
+
+def test_cancel_is_owner_only_and_ends_the_stream(server, folder):
+    client = client_for(server)
+    job = client.submit(folder)
+
+    with pytest.raises(JobServerError) as error:
+        client_for(server, 'bob').cancel(job['id'])
+    assert error.value.status == 403
+
+    assert client.cancel(job['id'])['status'] == 'cancelled'
+    assert list(client.stream(job['id']))[-1]['status'] == 'cancelled'
+
+
+def test_bad_requests_are_rejected(server, folder):
+    with pytest.raises(JobServerError) as error:
+        JobClient(server.url, token='forged').list_jobs()
+    assert error.value.status == 401
+    with pytest.raises(JobServerError) as error:
+        JobClient(server.url).login('alice', '')
+    assert error.value.status == 401
+
+    client = client_for(server)
+    with pytest.raises(JobServerError) as error:
+        client.submit(folder + "-missing")
+    assert error.value.status == 400
+    with pytest.raises(JobServerError) as error:
+        client.get_job(999)
+    assert error.value.status == 404
+
+    token = client.token
+    client.logout()
+    with pytest.raises(JobServerError) as error:
+        JobClient(server.url, token=token).list_jobs()
+    assert error.value.status == 401
+
+
+def test_finished_jobs_are_forgotten_after_retention(server, folder, release):
+    release.set()
+    server.scheduler.retention = 0
+    client = client_for(server)
+    first = client.submit(folder)
+    assert list(client.stream(first['id']))[-1]['status'] == 'done'
+
+    second = client.submit(folder)
+    with pytest.raises(JobServerError) as error:
+        client.get_job(first['id'])
+    assert error.value.status == 404
+    assert first['id'] not in server.owners
+    assert server.owners[second['id']] == 'alice'
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the on-disk parse cache
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import core.parse_cache
+import core.mml_parser
+from core.commands import get_spec
+from core.file_reader import describe_file
+from core.parse_cache import ParseCache, COMPLETE_MARKER
+
+EXPORT = """+++    NE1        2024-01-02 10:00:00
+O&M    #1
+%%LST CELL:;%%
+RETCODE = 0  Operation succeeded
+
+Cell
+----
+Local Cell ID  Cell Name  Cell ID  Cell active state
+
+0              C0         0        Active
+1              C1         1        Active
+(Number of results = 2)
+
+---    END
+"""
+
+
+def make_chunks():
+    return [
+        pd.DataFrame({'NE': ['NE1', None], 'LocalCellId': pd.array([1, None], dtype='Int64'),
+                      'CellName': ['Cell ü', 'x' * 300]}),
+        pd.DataFrame({'NE': ['NE2'], 'LocalCellId': pd.array([7], dtype='Int64'), 'CellName': ['']}),
+    ]
+
+
+def values(column: pd.Series):
+    return [None if pd.isna(value) else value for value in column.tolist()]
+
+
+def published_entries(cache: ParseCache):
+    return sorted(name for name in os.listdir(cache.directory) if not name.startswith('.'))
+
+
+def test_round_trip(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    chunks = make_chunks()
+    assert cache.get('key') is None
+
+    parsed = list(cache.parse_through('key', lambda: iter(chunks)))
+    assert len(parsed) == 2
+
+    cached = cache.get('key')
+    assert cached is not None
+    for original, restored in zip(chunks, cached):
+        assert list(restored.columns) == list(original.columns)
+        assert str(restored['LocalCellId'].dtype) == 'Int64'
+        for column in original.columns:
+            assert values(restored[column]) == values(original[column])
+    assert cache.get_stats() == {'hits': 1, 'misses': 1}
+
+
+def test_entry_key_follows_content_and_parser_version(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    path = tmp_path / "LST CELL_a.txt"
+    path.write_bytes(b"first")
+    key = cache.entry_key(str(path), '2', 'ascii', 100)
+    assert cache.entry_key(str(path), '3', 'ascii', 100) != key
+    assert cache.entry_key(str(path), '2', 'ascii', 200) != key
+
+    path.write_bytes(b"second version")
+    assert cache.entry_key(str(path), '2', 'ascii', 100) != key
+    key = cache.entry_key(str(path), '2', 'ascii', 100)
+    assert cache.entry_key(str(path), '2', 'ascii', 100, get_spec('LST CELL').fingerprint()) != key
+
+
+def test_spec_change_invalidates_cached_parse(tmp_path, monkeypatch):
+    cache = ParseCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(core.parse_cache, '_default_cache', cache)
+    monkeypatch.setattr(core.mml_parser, 'PARSE_CACHE_ENABLED', True)
+    path = tmp_path / "LST CELL_a.txt"
+    path.write_text(EXPORT, encoding='ascii')
+    file_info = describe_file(str(path))
+
+    first = pd.concat(list(core.mml_parser.parse_file(file_info)))
+    assert str(first['CellId'].dtype) == 'Int64'
+    assert len(list(core.mml_parser.parse_file(file_info))) == 1
+    assert cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    spec = get_spec('LST CELL')
+    fingerprint = spec.fingerprint()
+    monkeypatch.setattr(spec, 'columns', {'CellId': 'text'})
+    assert spec.fingerprint() != fingerprint
+    retyped = pd.concat(list(core.mml_parser.parse_file(file_info)))
+    assert retyped['CellId'].tolist() == ['0', '1']
+    assert cache.get_stats() == {'hits': 1, 'misses': 2}
+
+
+def test_consumer_stopping_early_publishes_nothing(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    stream = cache.parse_through('key', lambda: iter(make_chunks()))
+    next(stream)
+    stream.close()
+
+    assert cache.get('key') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_parse_publishes_nothing(tmp_path):
+    cache = ParseCache(str(tmp_path))
+
+    def parse():
+        yield make_chunks()[0]
+        raise ValueError("corrupt export")
+
+    with pytest.raises(ValueError):
+        list(cache.parse_through('key', parse))
+    assert cache.get('key') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_concurrent_duplicate_write_keeps_first_entry(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    first = cache.parse_through('key', lambda: iter(make_chunks()))
+    second = cache.parse_through('key', lambda: iter(make_chunks()[:1]))
+    next(first)
+    next(second)
+    list(first)
+    list(second)
+
+    assert published_entries(cache) == ['key']
+    with open(os.path.join(tmp_path, 'key', COMPLETE_MARKER), encoding='utf-8') as marker:
+        assert marker.read().split()[0] == '2'
+    assert len(list(cache.get('key'))) == 2
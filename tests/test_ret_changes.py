@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for RET change tracking
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from core.ret_changes import RetChangeTracker, SUBUNIT_COLUMNS
+
+
+def make_frame(export_time, tilts, extra=None):
+    frame = pd.DataFrame({
+        'NE': ['NE1', 'NE1'],
+        'DeviceNo': ['0', '1'],
+        'SubunitNo': ['1', '1'],
+        'ExportTime': [export_time, export_time],
+        'ActualTilt': tilts,
+        'Sector': ['A', 'B'],
+    })
+    for column, values in (extra or {}).items():
+        frame.insert(4, column, values)
+    return frame
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = RetChangeTracker(str(tmp_path / "ret_state.sqlite3"))
+    rows, changes, states = tracker.diff(make_frame('2024-01-01 10:00:00', ['20', '30']))
+    tracker.commit(states)
+    return tracker, rows, changes
+
+
+def test_first_export_writes_all_rows_without_log(tracker):
+    _, rows, changes = tracker
+    assert len(rows) == 2
+    assert changes.empty
+    assert '_key' not in rows.columns
+
+
+def test_unchanged_export_writes_nothing(tracker):
+    tracker, _, _ = tracker
+    rows, changes, states = tracker.diff(make_frame('2024-01-02 10:00:00', ['20', '30']))
+    assert rows.empty
+    assert changes.empty
+    assert states == []
+
+
+def test_changed_value_is_logged(tracker):
+    tracker, _, _ = tracker
+    rows, changes, states = tracker.diff(make_frame('2024-01-02 10:00:00', ['20', '45']))
+    assert rows['DeviceNo'].tolist() == ['1']
+    assert len(changes) == 1
+    change = changes.iloc[0]
+    assert change[SUBUNIT_COLUMNS].tolist() == ['NE1', '1', '1']
+    assert (change['ColumnName'], change['OldValue'], change['NewValue']) == ('ActualTilt', '30', '45')
+    assert change['PreviousExportTime'] == '2024-01-01 10:00:00'
+    assert json.loads(states[0][3]) == {'ActualTilt': '45', 'Sector': 'B'}
+
+
+def test_versions_within_one_chunk_are_compared_in_order(tmp_path):
+    tracker = RetChangeTracker(str(tmp_path / "ret_state.sqlite3"))
+    frame = pd.concat([make_frame('2024-01-02 10:00:00', ['21', '30']),
+                       make_frame('2024-01-01 10:00:00', ['20', '30'])])
+    rows, changes, states = tracker.diff(frame)
+    # Device 1 did not change, so its newer copy is not written again
+    assert sorted(rows[['DeviceNo', 'ExportTime']].values.tolist()) == [
+        ['0', '2024-01-02 10:00:00'], ['1', '2024-01-01 10:00:00']]
+    assert changes[['DeviceNo', 'OldValue', 'NewValue', 'PreviousExportTime']].values.tolist() == [
+        ['0', '20', '21', '2024-01-01 10:00:00']]
+    assert len(states) == 2
+
+
+def test_older_export_is_dropped(tracker):
+    tracker, _, _ = tracker
+    rows, changes, states = tracker.diff(make_frame('2023-12-31 10:00:00', ['99', '99']))
+    assert rows.empty
+    assert changes.empty
+    assert states == []
+
+
+def test_added_column_is_not_a_value_change(tracker):
+    tracker, _, _ = tracker
+    frame = make_frame('2024-01-02 10:00:00', ['20', '31'], extra={'MechTilt': ['2', '3']})
+    rows, changes, _ = tracker.diff(frame)
+    # Both rows differ by digest (new column) and are written with it
+    assert sorted(rows['DeviceNo']) == ['0', '1']
+    assert 'MechTilt' in rows.columns
+    # Only the shared column that really changed is logged, by name
+    assert changes[['DeviceNo', 'ColumnName', 'OldValue', 'NewValue']].values.tolist() == [
+        ['1', 'ActualTilt', '30', '31']]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for transient error retries
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pytest
+
+import core.database
+from core.database import DatabaseManager, MAX_RETRY_ATTEMPTS
+from fakes import RecordingManager, DriverError
+
+
+class FlakyManager(RecordingManager):
+    """Raises the scripted errors on the first attempts, then succeeds"""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = list(errors)
+        self.attempts = 0
+        self.refreshes = 0
+
+    def _execute_query_once(self, query, params=None):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return [(1,)]
+
+    def _refresh_connection(self):
+        self.refreshes += 1
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(core.database.time, 'sleep', delays.append)
+    return delays
+
+
+def test_transient_errors_are_retried_on_a_fresh_connection(no_backoff):
+    manager = FlakyManager([DriverError(1213, "Deadlock"), DriverError(2006, "gone away")])
+    assert manager.execute_query("SELECT 1") == [(1,)]
+
+    assert manager.attempts == 3
+    assert manager.refreshes == 2
+    assert len(no_backoff) == 2
+    assert all(0 <= delay <= core.database.RETRY_MAX_DELAY for delay in no_backoff)
+    metrics = manager.get_metrics()
+    assert metrics['retries'] == 2
+    assert metrics['retries_by_code'] == {1213: 1, 2006: 1}
+    assert metrics['transient_errors'] == 2
+    assert metrics['retries_exhausted'] == 0
+
+
+def test_permanent_errors_fail_fast():
+    manager = FlakyManager([DriverError(1064, "syntax error")])
+    assert manager.execute_query("SELEC 1") is None
+    assert manager.attempts == 1
+    assert manager.get_metrics()['permanent_errors'] == 1
+    assert manager.get_metrics()['retries'] == 0
+
+
+def test_retries_are_bounded():
+    manager = FlakyManager([DriverError(1205, "Lock wait timeout")] * (MAX_RETRY_ATTEMPTS + 5))
+    assert manager.execute_query("UPDATE t SET a = 1") is None
+    assert manager.attempts == MAX_RETRY_ATTEMPTS + 1
+    assert manager.get_metrics()['retries_exhausted'] == 1
+
+
+def test_nothing_is_retried_inside_a_bulk_session():
+    manager = FlakyManager([DriverError(1213, "Deadlock")])
+    manager.in_bulk_session = True
+    assert manager.execute_query("INSERT INTO t VALUES (1)") is None
+    assert manager.attempts == 1
+    assert manager.refreshes == 0
+
+
+def test_error_classification():
+    assert DatabaseManager.get_error_code(DriverError(1366, "Incorrect integer value")) == 1366
+    assert DatabaseManager.get_error_code(ValueError("not a driver error")) is None
+    assert DatabaseManager.is_data_error(DriverError(1366))
+    assert not DatabaseManager.is_data_error(DriverError(2013))
+    assert not DatabaseManager.is_data_error(OSError("timed out"))
+    assert not DatabaseManager.is_data_error(None)
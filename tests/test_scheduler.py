@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for stride scheduling of upload jobs
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pytest
+
+import core.scheduler
+from core.scheduler import UploadScheduler
+
+COMMANDS = ['LST CELL', 'LST PDSCHCFG', 'LST CELLDLPCPDSCHPA', 'LST SECTORSPLITCELL']
+
+
+def make_folder(root, name):
+    folder = root / name
+    folder.mkdir()
+    for command in COMMANDS:
+        # Same size everywhere, so every command costs the same virtual time
+        (folder / f"{command}_{name}.txt").write_bytes(b"x" * 1000)
+    return str(folder)
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(core.scheduler, 'ENRICHMENT_ENABLED', False)
+    scheduler = UploadScheduler(max_workers=1, connection_budget=1)
+    order = []
+
+    def run_command(job, command, files):
+        order.append(job.name)
+        with scheduler.condition:
+            job.files_done += len(files)
+            scheduler._finish_unit(job)
+
+    scheduler._run_command = run_command
+    scheduler.order = order
+    yield scheduler
+    scheduler.shutdown()
+
+
+def add_jobs(scheduler, *jobs):
+    """Queue jobs before the dispatcher starts, so none gets a head start"""
+    start = scheduler._ensure_dispatcher
+    scheduler._ensure_dispatcher = lambda: None
+    added = [scheduler.add_job(folder, priority) for folder, priority in jobs]
+    scheduler._ensure_dispatcher = start
+    start()
+    return added
+
+
+def test_workers_are_shared_in_proportion_to_priority(scheduler, tmp_path):
+    low, high = add_jobs(scheduler, (make_folder(tmp_path, 'low'), 1), (make_folder(tmp_path, 'high'), 2))
+    assert scheduler.wait(timeout=10)
+
+    assert scheduler.order == ['low', 'high', 'high', 'low', 'high', 'high', 'low', 'low']
+    assert low.status == high.status == 'done'
+    assert scheduler.get_progress()['files_done'] == 8
+
+
+def test_equal_priorities_alternate(scheduler, tmp_path):
+    add_jobs(scheduler, (make_folder(tmp_path, 'a'), 1), (make_folder(tmp_path, 'b'), 1))
+    assert scheduler.wait(timeout=10)
+    assert scheduler.order == ['a', 'b'] * 4
+
+
+def test_new_jobs_start_at_the_current_minimum_clock(scheduler, tmp_path):
+    scheduler._ensure_dispatcher = lambda: None
+    old = scheduler.add_job(make_folder(tmp_path, 'old'))
+    old.virtual_time = 5000.0
+    new = scheduler.add_job(make_folder(tmp_path, 'new'))
+    # A newcomer at 0 would take every worker until it caught up
+    assert new.virtual_time == 5000.0
+
+
+def test_cancelled_job_drops_its_queued_commands(scheduler, tmp_path):
+    scheduler._ensure_dispatcher = lambda: None
+    job = scheduler.add_job(make_folder(tmp_path, 'job'))
+    assert scheduler.cancel_job(job.id)
+    assert not scheduler.cancel_job(job.id)
+    assert job.pending == [] and job.status == 'cancelled'
+    assert scheduler.wait(timeout=1)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for offline export sinks and their bulk reload
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pandas as pd
+import pytest
+
+import core.sinks
+from core.sinks import create_sink, iter_exported, exported_columns, load_exported
+from fakes import RecordingManager
+
+FIRST = pd.DataFrame({'NE': ['NE1', 'NE1'], 'LocalCellId': pd.array([0, 1], dtype='Int64'),
+                      'CellName': ['C0', None], 'ExportTime': ['2024-01-02 10:00:00'] * 2})
+# A newer NE version adds a column in a later chunk
+SECOND = pd.DataFrame({'NE': ['NE2'], 'LocalCellId': pd.array([5], dtype='Int64'),
+                       'CellName': ['Zürich'], 'ExportTime': ['2024-01-03 10:00:00'],
+                       'CellRadius': ['1500']})
+
+
+def values(column: pd.Series):
+    return [None if pd.isna(value) else value for value in column.tolist()]
+
+
+def export(tmp_path, format_name):
+    path = str(tmp_path / ("export.sqlite" if format_name == 'sqlite' else "export"))
+    sink = create_sink(format_name, path)
+    assert sink.write_frame('lst_cell', FIRST)
+    assert sink.write_frame('lst_cell', SECOND)
+    assert sink.write_frame('lst_cell', FIRST.iloc[:0])
+    sink.close()
+    assert sink.rows_written == {'lst_cell': 3}
+    return path
+
+
+@pytest.fixture(params=['csv', 'sqlite', 'parquet'])
+def exported(request, tmp_path):
+    if request.param == 'parquet':
+        pytest.importorskip('pyarrow')
+    return export(tmp_path, request.param)
+
+
+def test_round_trip(exported):
+    chunks = list(iter_exported(exported))
+    assert {table for table, _ in chunks} == {'lst_cell'}
+    frame = pd.concat([chunk for _, chunk in chunks], ignore_index=True)
+    assert frame['NE'].tolist() == ['NE1', 'NE1', 'NE2']
+    assert [str(value) for value in frame['LocalCellId']] == ['0', '1', '5']
+    assert values(frame['CellName']) == ['C0', None, 'Zürich']
+    assert exported_columns(exported) == {
+        'lst_cell': ['NE', 'LocalCellId', 'CellName', 'ExportTime', 'CellRadius']}
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown export format"):
+        create_sink('xlsx', str(tmp_path))
+
+
+def session_start(manager):
+    return manager.queries.index(next(q for q in manager.queries if 'autocommit = 0' in q))
+
+
+@pytest.mark.parametrize("format_name", ['csv', 'sqlite'])
+def test_reload_creates_all_columns_before_bulk_session(tmp_path, format_name):
+    path = export(tmp_path, format_name)
+    manager = RecordingManager([('SELECT @@SESSION.unique_checks', [(1, 1, 1)])])
+    assert load_exported(path, manager) == {'lst_cell': 3}
+
+    start = session_start(manager)
+    ddl = [i for i, q in enumerate(manager.queries) if q.startswith(('CREATE TABLE', 'ALTER TABLE'))]
+    assert ddl and max(ddl) < start
+    assert 'CellRadius' in manager.statements('CREATE TABLE')[0] + ''.join(manager.statements('ALTER TABLE'))
+    assert manager.statements('COMMIT') == ['COMMIT']
+    assert len(manager.rows_written) == 3
+
+
+def test_new_column_inside_session_rolls_back(tmp_path, monkeypatch):
+    path = export(tmp_path, 'csv')
+    monkeypatch.setattr(core.sinks, 'exported_columns',
+                        lambda path: {'lst_cell': list(FIRST.columns)})
+    manager = RecordingManager([('SELECT @@SESSION.unique_checks', [(1, 1, 1)])])
+    with pytest.raises(RuntimeError, match="new columns inside the bulk session: CellRadius"):
+        load_exported(path, manager)
+    assert manager.statements('ROLLBACK') == ['ROLLBACK']
+    assert not any(q.startswith('ALTER TABLE') for q in manager.queries[session_start(manager):])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for snapshot loads (staging table + atomic RENAME swap)
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import core.mml_parser
+from core.file_reader import describe_file
+from core.pipeline import UploadPipeline
+from fakes import RecordingManager, DriverError, LST_CELL_EXPORT
+
+# SHOW INDEX rows: Table, Non_unique, Key_name, Seq_in_index, Column_name, Collation,
+# Cardinality, Sub_part, Packed, Null, Index_type
+INDEXES = ('SHOW INDEX FROM `lst_cell_staging`', [
+    ('lst_cell_staging', 0, 'PRIMARY', 1, 'NE', 'A', 0, None, None, '', 'BTREE'),
+    ('lst_cell_staging', 1, 'idx_name', 2, 'CellName', 'A', 0, 16, None, 'YES', 'BTREE'),
+    ('lst_cell_staging', 1, 'idx_name', 1, 'NE', 'A', 0, None, None, '', 'BTREE'),
+])
+ROWS = [('NE1', 0, 'C0'), ('NE1', 1, 'C1')]
+COLUMNS = ['NE', 'LocalCellId', 'CellName']
+
+
+def ddl(manager):
+    return [query for query in manager.queries if query.startswith(('DROP', 'CREATE', 'ALTER', 'RENAME'))]
+
+
+def test_snapshot_loads_staging_without_indexes_and_swaps():
+    manager = RecordingManager([INDEXES])
+    assert manager.load_snapshot('lst_cell', COLUMNS, ROWS)
+
+    assert ddl(manager) == [
+        "DROP TABLE IF EXISTS `lst_cell_staging`",
+        "DROP TABLE IF EXISTS `lst_cell_old`",
+        "CREATE TABLE `lst_cell_staging` LIKE `lst_cell`",
+        "ALTER TABLE `lst_cell_staging` DROP INDEX `idx_name`",
+        "ALTER TABLE `lst_cell_staging` ADD INDEX `idx_name` (`NE`, `CellName`(16))",
+        "RENAME TABLE `lst_cell` TO `lst_cell_old`, `lst_cell_staging` TO `lst_cell`",
+        "DROP TABLE IF EXISTS `lst_cell_old`",
+    ]
+    (query, rows), = manager.batches
+    assert query.startswith("INSERT INTO `lst_cell_staging`")
+    assert "ON DUPLICATE KEY" not in query
+    assert rows == ROWS
+
+
+def test_failed_load_drops_staging_and_keeps_live_table():
+    manager = RecordingManager([INDEXES], fail_batch=lambda query, rows: DriverError(1064, "syntax"))
+    assert not manager.load_snapshot('lst_cell', COLUMNS, ROWS)
+
+    assert ddl(manager)[-1] == "DROP TABLE IF EXISTS `lst_cell_staging`"
+    assert not manager.statements('RENAME TABLE')
+    assert not manager.statements('ADD INDEX')
+
+
+def test_failed_swap_aborts():
+    manager = RecordingManager([INDEXES, ('RENAME TABLE', None)])
+    assert not manager.load_snapshot('lst_cell', COLUMNS, ROWS)
+    assert ddl(manager)[-1] == "DROP TABLE IF EXISTS `lst_cell_staging`"
+    assert not manager.statements('DROP TABLE IF EXISTS `lst_cell_old`')[1:]
+
+
+def test_failed_staging_setup_returns_none():
+    manager = RecordingManager([('CREATE TABLE `lst_cell_staging` LIKE', None)])
+    assert manager.begin_snapshot('lst_cell') is None
+    assert manager.queries[-1] == "DROP TABLE IF EXISTS `lst_cell_staging`"
+
+
+def test_pipeline_streams_all_files_into_one_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.mml_parser, 'PARSE_CACHE_ENABLED', False)
+    files = []
+    for name, ne in (("LST CELL_a.txt", "NE1"), ("LST CELL_b.txt", "NE2")):
+        path = tmp_path / name
+        path.write_text(LST_CELL_EXPORT.replace("NE1", ne), encoding='ascii')
+        files.append(describe_file(str(path)))
+    manager = RecordingManager()
+
+    assert UploadPipeline(manager).process_command('LST CELL', files, 'snapshot') == 4
+    assert len(manager.statements('RENAME TABLE `lst_cell` TO')) == 1
+    assert len(manager.statements('CREATE TABLE `lst_cell_staging`')) == 1
+    assert len(manager.rows_written) == 4
+    assert {'NE1', 'NE2'} <= {value for row in manager.rows_written for value in row}
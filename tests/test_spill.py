@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for memory-budgeted storage and on-disk spill
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+import core.pipeline
+import core.mml_parser
+from core.file_reader import describe_file
+from core.spill import MemoryBudget, SpilledFrame, PartitionedTable, get_memory_budget, frame_bytes
+from core.dedup import KeyDeduplicator
+from core.enrichment import CellEnricher
+from core.pipeline import UploadPipeline
+from core.scheduler import UploadScheduler, UploadJob
+from fakes import RecordingManager, LST_CELL_EXPORT as EXPORT
+
+
+def sample_frame():
+    return pd.DataFrame({
+        'NE': ['NE1', None, 'Zürich 北', ''],
+        'LocalCellId': pd.array([1, None, 3, 255], dtype='Int64'),
+        'Count': np.array([10, 20, 30, 40], dtype=np.int64),
+        'Vswr': [1.2, np.nan, 1.5, 9.9],
+    })
+
+
+def test_spilled_frame_round_trip(tmp_path):
+    frame = sample_frame()
+    restored = SpilledFrame.write(frame, str(tmp_path / "part")).read()
+
+    assert list(restored.columns) == list(frame.columns)
+    assert restored['NE'].tolist() == ['NE1', None, 'Zürich 北', '']
+    assert str(restored['LocalCellId'].dtype) == 'Int64'
+    assert restored['LocalCellId'].isna().tolist() == [False, True, False, False]
+    assert restored['LocalCellId'].dropna().tolist() == [1, 3, 255]
+    assert restored['Count'].dtype == np.int64
+    np.testing.assert_array_equal(restored['Vswr'].to_numpy(), frame['Vswr'].to_numpy())
+
+
+def test_strings_are_stored_as_utf8_buffer(tmp_path):
+    path = tmp_path / "part"
+    SpilledFrame.write(pd.DataFrame({'Name': ['ab', 'x' * 1000, 'é']}), str(path))
+    # Actual bytes only, not rows x longest value x 4
+    assert np.load(path / "0.npy").nbytes == 2 + 1000 + 2
+    assert np.load(path / "0.offsets.npy").tolist() == [0, 2, 1002, 1004]
+
+
+def test_legacy_string_columns_still_read(tmp_path):
+    path = tmp_path / "legacy"
+    os.makedirs(path)
+    np.save(path / "0.npy", np.array(['a', 'bc', ''], dtype='<U2'))
+    np.save(path / "0.mask.npy", np.array([False, False, True]))
+    with open(path / "meta.json", 'w', encoding='utf-8') as meta:
+        json.dump({'columns': [{'name': 'Name', 'kind': 'string'}], 'rows': 3}, meta)
+    assert SpilledFrame(str(path)).read()['Name'].tolist() == ['a', 'bc', None]
+
+
+def test_partitioned_table_spills_over_budget(tmp_path):
+    budget = MemoryBudget(limit_mb=0)
+    table = PartitionedTable('cell', ['NE'], budget, partitions=4, spill_dir=str(tmp_path / "spill"))
+    frame = pd.DataFrame({'NE': [f"NE{i % 7}" for i in range(100)], 'Value': range(100)})
+    table.append(frame.iloc[:50])
+    table.append(frame.iloc[50:])
+
+    assert budget.used == 0
+    assert table.spill_count > 0
+    rows = pd.concat([table.get_partition(p) for p in range(4)])
+    assert sorted(rows['Value'].tolist()) == list(range(100))
+    table.close()
+    assert not os.path.exists(tmp_path / "spill")
+
+
+def test_tables_share_one_budget(tmp_path):
+    frame = pd.DataFrame({'NE': ['NE1'] * 1000, 'Value': range(1000)})
+    budget = MemoryBudget(limit_mb=1)
+    budget.limit = int(frame_bytes(frame) * 1.5)
+    first = PartitionedTable('a', ['NE'], budget, partitions=1, spill_dir=str(tmp_path / "a"))
+    second = PartitionedTable('b', ['NE'], budget, partitions=1, spill_dir=str(tmp_path / "b"))
+    first.append(frame)
+    assert first.spill_count == 0
+    # Alone the second table fits, but together they exceed the shared budget
+    second.append(frame)
+    assert second.spill_count == 1
+    assert budget.used == frame_bytes(frame)
+    first.close()
+    second.close()
+    assert budget.used == 0
+
+
+def test_components_default_to_process_budget():
+    budget = get_memory_budget()
+    assert get_memory_budget() is budget
+    assert KeyDeduplicator(['NE']).budget is budget
+    assert CellEnricher().budget is budget
+    assert UploadPipeline(None).budget is budget
+
+
+def test_pipeline_passes_its_budget_to_dedup(tmp_path, monkeypatch):
+    budgets = []
+
+    class RecordingDeduplicator(KeyDeduplicator):
+        def __init__(self, key_columns, max_keys=100, budget=None):
+            budgets.append(budget)
+            super().__init__(key_columns, max_keys, budget)
+
+    monkeypatch.setattr(core.pipeline, 'KeyDeduplicator', RecordingDeduplicator)
+    monkeypatch.setattr(core.mml_parser, 'PARSE_CACHE_ENABLED', False)
+    path = tmp_path / "LST CELL_a.txt"
+    path.write_text(EXPORT, encoding='ascii')
+
+    budget = MemoryBudget(limit_mb=1)
+    manager = RecordingManager()
+    pipeline = UploadPipeline(manager, budget=budget)
+    assert pipeline.process_command('LST CELL', [describe_file(str(path))], 'upsert') == 2
+    assert budgets == [budget]
+    assert len(manager.rows_written) == 2
+    assert budget.used == 0
+
+
+def test_scheduler_pipelines_share_the_scheduler_budget(tmp_path):
+    budget = MemoryBudget(limit_mb=1)
+    scheduler = UploadScheduler(max_workers=1, budget=budget)
+    try:
+        first = scheduler._pipeline(UploadJob(str(tmp_path), 1, 'a'))
+        second = scheduler._pipeline(UploadJob(str(tmp_path), 1, 'b'))
+        assert first.budget is budget and second.budget is budget
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for vectorized frame validation
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pandas as pd
+
+from core.validation import FrameValidator
+from core.error_report import SiteErrorIndex
+
+
+def cell_frame():
+    return pd.DataFrame({
+        'NE': ['NE1', '', None, 'NE1', 'NE1', 'NE1', 'NE1', 'NE2'],
+        'LocalCellId': ['1', '2', '3', '256', '007', '3.0', 'x', None],
+        'CellActiveState': ['Active', 'Active', 'Active', 'Active', 'Active', None, 'Active', 'Bogus'],
+    })
+
+
+def vswr_frame(column='VSWR(0.1)'):
+    return pd.DataFrame({
+        'NE': ['NE1'] * 4,
+        'CabinetNo': ['0'] * 4, 'SubrackNo': ['0'] * 4, 'SlotNo': ['3'] * 4,
+        'TxBranchNo': ['0', '1', '2', '3'],
+        column: ['1.2', '11', 'n/a', '10'],
+    })
+
+
+def test_check_returns_first_failed_rule_per_row():
+    errors = FrameValidator().check('LST CELL', cell_frame())
+    assert errors.tolist() == [
+        None, 'empty NE', 'empty NE', 'invalid LocalCellId',
+        None, None, 'invalid LocalCellId', 'invalid LocalCellId',
+    ]
+
+
+def test_enum_rule_ignores_empty_values():
+    frame = cell_frame().iloc[[0, 5]].assign(CellActiveState=['Bogus', None])
+    assert FrameValidator().check('LST CELL', frame).tolist() == ['invalid CellActiveState', None]
+
+
+def test_typed_id_columns_use_numeric_range():
+    frame = pd.DataFrame({'NE': ['NE1'] * 4,
+                          'LocalCellId': pd.array([0, 255, 256, None], dtype='Int64')})
+    assert FrameValidator().check('LST CELL', frame).tolist() == [
+        None, None, 'invalid LocalCellId', 'invalid LocalCellId']
+
+
+def test_missing_key_column_rejects_chunk():
+    frame = cell_frame().drop(columns=['LocalCellId'])
+    assert set(FrameValidator().check('LST CELL', frame)) == {'missing column LocalCellId'}
+
+
+def test_vswr_range_and_value_column():
+    validator = FrameValidator()
+    assert validator.check('DSP VSWR', vswr_frame()).tolist() == [
+        None, 'VSWR out of range', 'VSWR out of range', None]
+    assert set(validator.check('DSP VSWR', vswr_frame('Return Loss'))) == {'missing column VSWR'}
+
+
+def test_unknown_command_only_checks_ne():
+    frame = pd.DataFrame({'NE': ['NE1', ''], 'Whatever': ['1', '2']})
+    assert FrameValidator().check('LST UNKNOWN', frame).tolist() == [None, 'empty NE']
+
+
+def test_validate_drops_and_reports_rejected_rows():
+    error_index = SiteErrorIndex()
+    validator = FrameValidator(error_index)
+    valid = validator.validate('LST CELL', cell_frame())
+
+    assert valid['LocalCellId'].tolist() == ['1', '007', '3.0']
+    assert validator.get_stats()['rows_checked'] == 8
+    assert validator.get_stats()['rows_rejected'] == 5
+    assert error_index.total_errors == 5
+    counts = {(row['ne'], row['error_class']): row['count'] for row in error_index.summary()}
+    assert counts == {('', 'empty NE'): 2, ('NE1', 'invalid LocalCellId'): 2,
+                      ('NE2', 'invalid LocalCellId'): 1}
+
+
+def test_check_does_not_count_or_report():
+    error_index = SiteErrorIndex()
+    validator = FrameValidator(error_index)
+    validator.check('LST CELL', cell_frame())
+    assert validator.get_stats()['rows_checked'] == 0
+    assert error_index.total_errors == 0
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the date-partitioned VSWR history store
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import pandas as pd
+import pytest
+
+from core.error_report import SiteErrorIndex
+from core.vswr_history import VswrHistoryStore, HISTORY_TABLE, ROLLUP_TABLE
+from fakes import RecordingManager, DriverError
+
+SESSION = ('SELECT @@SESSION.unique_checks', [(1, 1, 1)])
+
+
+def vswr_frame():
+    return pd.DataFrame({
+        'NE': ['NE1', 'NE1', 'NE1', 'NE2', 'NE2'],
+        'CabinetNo': ['0'] * 5, 'SubrackNo': ['60'] * 5, 'SlotNo': ['0'] * 5,
+        'TxBranchNo': ['0', '0', '1', '0', '0'],
+        'ExportTime': ['2024-01-02 10:00:00', '2024-01-03 10:00:00', '2024-01-03 10:00:00',
+                       None, '2024-01-03 11:00:00'],
+        'VSWR(0.1)': ['1.2', '1.4', None, '1.3', '1.6'],
+    })
+
+
+def test_new_days_are_split_off_the_future_partition():
+    manager = RecordingManager([SESSION, ('information_schema.PARTITIONS', [('p20240102',), ('p_future',)])])
+    store = VswrHistoryStore(manager)
+    assert store.append(vswr_frame()) == 3
+
+    reorganize = manager.statements('REORGANIZE PARTITION')
+    assert reorganize == [
+        f"ALTER TABLE `{HISTORY_TABLE}` REORGANIZE PARTITION p_future INTO ("
+        "PARTITION p20240103 VALUES LESS THAN (TO_DAYS('2024-01-04')), "
+        "PARTITION p_future VALUES LESS THAN MAXVALUE)"]
+    assert store.partition_days == {'20240102', '20240103'}
+
+    # Known days need no DDL
+    store.append(vswr_frame())
+    assert len(manager.statements('REORGANIZE PARTITION')) == 1
+
+
+def test_history_and_rollups_share_one_transaction():
+    manager = RecordingManager([SESSION])
+    VswrHistoryStore(manager).append(vswr_frame())
+
+    (history, rows), (rollup, sums) = manager.batches
+    assert history.startswith(f"INSERT IGNORE INTO `{HISTORY_TABLE}`")
+    assert len(rows) == 3
+    assert rollup.startswith(f"INSERT INTO `{ROLLUP_TABLE}`")
+    assert "sum_vswr = sum_vswr + VALUES(sum_vswr)" in rollup
+    assert sorted(sums) == [('NE1', '0', '60', '0', '0', '2024-01-02', 1.2, 1.2, 1),
+                            ('NE1', '0', '60', '0', '0', '2024-01-03', 1.4, 1.4, 1),
+                            ('NE2', '0', '60', '0', '0', '2024-01-03', 1.6, 1.6, 1)]
+
+    start = manager.queries.index(manager.statements('autocommit = 0')[0])
+    assert manager.statements('COMMIT') == ['COMMIT']
+    assert manager.queries.index('COMMIT') > start
+    # Partition DDL would implicitly commit, so it runs before the transaction
+    assert manager.queries.index(manager.statements('REORGANIZE')[0]) < start
+
+
+def test_failed_rollup_rolls_back_history_rows():
+    def fail_rollup(query, rows):
+        return DriverError(1205, "Lock wait timeout") if ROLLUP_TABLE in query else None
+
+    manager = RecordingManager([SESSION], fail_batch=fail_rollup)
+    with pytest.raises(RuntimeError):
+        VswrHistoryStore(manager).append(vswr_frame())
+    assert manager.statements('ROLLBACK') == ['ROLLBACK']
+    assert not manager.statements('COMMIT')
+
+
+def test_rows_without_value_or_export_time_are_reported():
+    error_index = SiteErrorIndex()
+    store = VswrHistoryStore(RecordingManager([SESSION]), error_index)
+    store.append(vswr_frame())
+
+    assert store.rows_dropped == 2
+    assert sorted((row['ne'], row['error_class'], row['count']) for row in error_index.summary()) == [
+        ('NE1', 'missing VSWR value', 1), ('NE2', 'missing ExportTime', 1)]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the watch daemon, its persistent work queue and settle detection
+
+Author: Hadi Fauzan Hanif
+Version: 2.1.1
+"""
+
+import os
+import time
+
+import pytest
+
+import core.mml_parser
+import core.watcher
+from core.watcher import WorkQueue, FolderWatcher, WatchDaemon
+from fakes import RecordingManager, LST_CELL_EXPORT
+
+
+def test_queue_keeps_each_file_version_once(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"))
+    assert queue.put("/drop/a.txt", 10, 1.0)
+    assert not queue.put("/drop/a.txt", 10, 1.0)
+    assert queue.put("/drop/a.txt", 12, 2.0)
+    assert queue.counts() == {'pending': 2}
+    queue.close()
+
+
+def test_running_jobs_are_requeued_after_a_crash(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    queue = WorkQueue(path)
+    queue.put("/drop/a.txt", 10, 1.0)
+    queue.put("/drop/b.txt", 10, 1.0)
+    first = queue.claim()
+    assert first == {'id': first['id'], 'path': "/drop/a.txt", 'attempts': 1}
+    queue.complete(queue.claim()['id'])
+    # The daemon dies while uploading a.txt
+    queue.connection.close()
+
+    queue = WorkQueue(path)
+    assert queue.counts() == {'pending': 1, 'done': 1}
+    assert queue.claim() == {'id': first['id'], 'path': "/drop/a.txt", 'attempts': 2}
+    queue.close()
+
+
+def test_failed_jobs_are_retried_until_attempts_run_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.watcher, 'MAX_RETRY_ATTEMPTS', 2)
+    queue = WorkQueue(str(tmp_path / "queue.sqlite3"))
+    queue.put("/drop/a.txt", 10, 1.0)
+    for attempt in (1, 2):
+        job = queue.claim()
+        assert job['attempts'] == attempt
+        queue.fail(job['id'], "server has gone away")
+        assert queue.counts() == {'pending': 1}
+    queue.fail(queue.claim()['id'], "server has gone away")
+    assert queue.counts() == {'failed': 1}
+    assert queue.claim() is None
+    queue.close()
+
+
+def test_files_are_handed_over_once_settled(tmp_path):
+    ready = []
+    watcher = FolderWatcher([str(tmp_path)], lambda *args: ready.append(args),
+                            settle_seconds=0.2, use_inotify=False)
+    export = tmp_path / "LST CELL_a.txt"
+    export.write_text("partial", encoding='ascii')
+    (tmp_path / "notes.txt").write_text("not an export", encoding='ascii')
+    watcher.scan_existing()
+    assert list(watcher.pending) == [str(export)]
+
+    watcher._check_settled()
+    assert ready == []
+    # Still being copied: the settle timer restarts
+    time.sleep(0.1)
+    export.write_text(LST_CELL_EXPORT, encoding='ascii')
+    os.utime(export, (time.time() + 5, time.time() + 5))
+    time.sleep(0.15)
+    watcher._check_settled()
+    assert ready == []
+
+    time.sleep(0.25)
+    watcher._check_settled()
+    stat = export.stat()
+    assert ready == [(str(export), stat.st_size, stat.st_mtime)]
+    assert watcher.pending == {}
+    watcher.backend.close()
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.mml_parser, 'PARSE_CACHE_ENABLED', False)
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    manager = RecordingManager()
+    daemon = WatchDaemon([str(drop)], manager, queue_path=str(tmp_path / "queue.sqlite3"),
+                         use_inotify=False)
+    yield daemon, manager, drop
+    daemon.queue.close()
+
+
+def test_daemon_upserts_keep_the_newest_export(daemon):
+    daemon, manager, drop = daemon
+    export = drop / "LST CELL_a.txt"
+    export.write_text(LST_CELL_EXPORT, encoding='ascii')
+    daemon._enqueue(str(export), export.stat().st_size, export.stat().st_mtime)
+    daemon._process(daemon.queue.claim())
+
+    assert daemon.queue.counts() == {'done': 1}
+    query = next(query for query, _ in manager.batches if '`lst_cell`' in query)
+    assert ("`CellName` = IF(`ExportTime` IS NULL OR VALUES(`ExportTime`) >= `ExportTime`, "
+            "VALUES(`CellName`), `CellName`)") in query
+    assert query.endswith("`ExportTime` = IF(`ExportTime` IS NULL OR VALUES(`ExportTime`) >= `ExportTime`, "
+                          "VALUES(`ExportTime`), `ExportTime`)")
+    assert daemon.enrichment_due
+
+
+def test_daemon_refreshes_enrichment_after_a_settled_batch(daemon):
+    daemon, manager, drop = daemon
+    export = drop / "LST CELL_a.txt"
+    export.write_text(LST_CELL_EXPORT, encoding='ascii')
+    daemon._enqueue(str(export), export.stat().st_size, export.stat().st_mtime)
+    daemon._process(daemon.queue.claim())
+
+    daemon._enrich()
+    assert not daemon.enrichment_due
+    enriched = [rows for query, rows in manager.batches if '`lst_cell_enriched`' in query]
+    assert sum(len(rows) for rows in enriched) == 2